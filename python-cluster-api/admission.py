@@ -0,0 +1,145 @@
+"""
+Admission Control
+=================
+Concurrency governor for CPU-bound clustering. Each KMeans run already
+uses several BLAS/OpenMP threads, so running every request of a burst at
+once oversubscribes the cores and makes all of them slow; admitting a few at
+a time keeps most of them fast.
+
+A clustering run needs one of CLUSTER_MAX_CONCURRENT slots. When all are
+taken the request waits in a queue of at most CLUSTER_QUEUE_SIZE for up to
+CLUSTER_QUEUE_TIMEOUT_SECONDS; a request that finds the queue full or waits
+too long is answered 429 with Retry-After (estimated from the recent run
+time and the queue ahead). Background jobs wait without these limits: their
+own pool already queues them.
+
+Cheap requests go ahead of term-wide ones: cache hits and coalesced
+requests never need a slot, and with CLUSTER_PRIORITIZE_SMALL queued requests
+of at most CLUSTER_SMALL_STUDENTS students get freed slots before larger ones
+(first come, first served within each group).
+
+Limits are per worker process (with gunicorn's sync workers, per thread
+count: a single-threaded worker runs one request at a time anyway).
+
+Metrics: cluster_admission_in_flight, cluster_admission_queue_depth,
+cluster_admission_wait_seconds and cluster_admission_rejected_total{reason}.
+
+Environment variables:
+- CLUSTER_MAX_CONCURRENT: clustering runs at a time per worker (default: CPU count)
+- CLUSTER_QUEUE_SIZE: requests that may wait for a slot (default 8)
+- CLUSTER_QUEUE_TIMEOUT_SECONDS: longest wait for a slot before 429 (default 5)
+- CLUSTER_PRIORITIZE_SMALL: 1 (default) or 0
+- CLUSTER_SMALL_STUDENTS: largest request that counts as small (default 1000)
+"""
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+
+CLUSTER_MAX_CONCURRENT = max(1, int(os.environ.get('CLUSTER_MAX_CONCURRENT', str(os.cpu_count() or 1))))
+CLUSTER_QUEUE_SIZE = int(os.environ.get('CLUSTER_QUEUE_SIZE', '8'))
+CLUSTER_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('CLUSTER_QUEUE_TIMEOUT_SECONDS', '5'))
+CLUSTER_PRIORITIZE_SMALL = os.environ.get('CLUSTER_PRIORITIZE_SMALL', '1') not in ('0', 'false')
+CLUSTER_SMALL_STUDENTS = int(os.environ.get('CLUSTER_SMALL_STUDENTS', '1000'))
+
+# Retry-After bounds in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+_running = 0
+_waiting = []  # heap of (priority, arrival, threading.Event)
+_arrivals = itertools.count()
+_run_seconds = 1.0  # moving average of how long a slot is held
+_lock = threading.Lock()
+
+
+class Saturated(Exception):
+    """No slot within the limits; `retry_after` is the suggested wait in seconds."""
+
+    def __init__(self, retry_after, reason):
+        super().__init__(f'Clustering capacity saturated ({reason}), retry in {retry_after}s')
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def _priority(n_students):
+    return 0 if CLUSTER_PRIORITIZE_SMALL and n_students <= CLUSTER_SMALL_STUDENTS else 1
+
+
+def _retry_after():
+    # Runs ahead of a new request: the queue plus one, served CLUSTER_MAX_CONCURRENT at a time
+    estimate = _run_seconds * (len(_waiting) + 1) / CLUSTER_MAX_CONCURRENT
+    return int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(estimate))))
+
+
+def _update_gauges():
+    metrics.set_gauge(metrics.ADMISSION_IN_FLIGHT, _running)
+    metrics.set_gauge(metrics.ADMISSION_QUEUE_DEPTH, len(_waiting))
+
+
+def _reject(reason):
+    metrics.inc(metrics.ADMISSION_REJECTED, reason=reason)
+    return Saturated(_retry_after(), reason)
+
+
+def acquire(n_students, bounded=True):
+    """
+    Take a clustering slot, waiting in the queue when all are busy. With
+    bounded=False (background jobs) the queue size and timeout do not apply.
+    Raises Saturated when the request should be answered 429.
+    """
+    global _running
+    start = time.perf_counter()
+    with _lock:
+        if _running < CLUSTER_MAX_CONCURRENT and not _waiting:
+            _running += 1
+            _update_gauges()
+            metrics.observe(metrics.ADMISSION_WAIT_SECONDS, 0.0)
+            return
+        if bounded and len(_waiting) >= CLUSTER_QUEUE_SIZE:
+            raise _reject('queue_full')
+        entry = (_priority(n_students), next(_arrivals), threading.Event())
+        heapq.heappush(_waiting, entry)
+        _update_gauges()
+
+    granted = entry[2].wait(CLUSTER_QUEUE_TIMEOUT_SECONDS if bounded else None)
+    if not granted:
+        with _lock:
+            # release() may have handed over the slot just as the wait timed out
+            if not entry[2].is_set():
+                _waiting.remove(entry)
+                heapq.heapify(_waiting)
+                _update_gauges()
+                raise _reject('timeout')
+    metrics.observe(metrics.ADMISSION_WAIT_SECONDS, time.perf_counter() - start)
+
+
+def release(held_seconds=None):
+    """Give the slot back: to the first queued request, or to the pool of free slots."""
+    global _running, _run_seconds
+    with _lock:
+        if held_seconds is not None:
+            _run_seconds = 0.8 * _run_seconds + 0.2 * held_seconds
+        if _waiting:
+            # The slot passes straight to the next request, so _running stays the same
+            heapq.heappop(_waiting)[2].set()
+        else:
+            _running -= 1
+        _update_gauges()
+
+
+@contextmanager
+def slot(n_students, bounded=True):
+    """Hold a clustering slot for the with-block (see acquire)."""
+    acquire(n_students, bounded=bounded)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        release(time.perf_counter() - start)
@@ -1,288 +1,244 @@
-﻿from flask import Flask, request, jsonify
+﻿from flask import Flask, request, jsonify, g, send_file
 from flask_cors import CORS
 import pandas as pd
-from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import silhouette_score
 from sklearn.decomposition import PCA
 import numpy as np
 import os
 import sys
+import functools
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from features import compute_features
+from silhouette import compute_silhouette
+from kmeans_engine import build_kmeans, choose_engine
+import admission
+import jobs
+import metrics
+import model_store
+import profiling
+import response_cache
+import single_flight
+import thread_budget
+import request_formats
+from serialization import FastJSONProvider, decode_json, encode_json, encoder_name, frame_to_records
+from logging_config import configure_logging
+from startup import health_routes
 
 app = Flask(__name__)
+# jsonify through orjson when installed (NumPy/NA aware, NaN/inf as null), stdlib json otherwise
+app.json = FastJSONProvider(app)
 CORS(app)
+# GET /, /health and /ready (shared with the startup.create_app front app)
+app.register_blueprint(health_routes)
+
+# Leveled logging (LOG_LEVEL, LOG_FORMAT), see logging_config.py
+logger = configure_logging()
 
 # Log startup
-print("[Python API] Starting Enhanced KMeans Clustering API...")
-print(f"[Python API] Python version: {sys.version}")
-print(f"[Python API] Port: {os.environ.get('PORT', '10000')}")
+logger.info('Starting Enhanced KMeans Clustering API...')
+logger.info('Python version: %s', sys.version)
+logger.info('Port: %s', os.environ.get('PORT', '10000'))
+logger.info('JSON encoder: %s', encoder_name())
 
+# Warm start falls back to the full sweep when quality degrades beyond these limits
+WARM_START_MAX_SILHOUETTE_DROP = float(os.environ.get('WARM_START_MAX_SILHOUETTE_DROP', '0.05'))
+WARM_START_MAX_INERTIA_INCREASE = float(os.environ.get('WARM_START_MAX_INERTIA_INCREASE', '0.25'))
 
-def calculate_attendance_features(row):
-    """
-    Calculate attendance features from detailed attendance data.
-    Falls back to percentage if detailed counts are not available.
-    """
-    # If detailed attendance data is available
-    if pd.notna(row.get('attendance_present_count')) and pd.notna(row.get('attendance_total_sessions')):
-        present = float(row.get('attendance_present_count', 0))
-        absent = float(row.get('attendance_absent_count', 0))
-        late = float(row.get('attendance_late_count', 0))
-        total = float(row.get('attendance_total_sessions', 1))
-        
-        if total > 0:
-            present_rate = present / total
-            absent_rate = absent / total
-            late_rate = late / total
-            attendance_percentage = (present + late * 0.5) / total * 100  # Late counts as half present
-        else:
-            present_rate = 0.0
-            absent_rate = 0.0
-            late_rate = 0.0
-            attendance_percentage = 0.0
-    else:
-        # Fallback to percentage if detailed data not available
-        attendance_percentage = float(row.get('attendance_percentage', 75.0))
-        # Estimate counts from percentage (rough approximation)
-        present_rate = attendance_percentage / 100 * 0.85  # Assume 85% of attendance is present, 15% is late
-        absent_rate = (100 - attendance_percentage) / 100
-        late_rate = attendance_percentage / 100 * 0.15
-    
-    return {
-        'attendance_percentage': attendance_percentage,
-        'attendance_present_rate': present_rate,
-        'attendance_absent_rate': absent_rate,
-        'attendance_late_rate': late_rate
-    }
+# Process pool for /api/cluster/batch
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Longest a batch waits for its scopes; scopes still running then fail with a timeout error
+BATCH_TIMEOUT_SECONDS = float(os.environ.get('BATCH_TIMEOUT_SECONDS', '100'))
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+# Streaming NDJSON responses for /api/cluster (?stream=1 or Accept: application/x-ndjson)
+NDJSON_MIMETYPE = 'application/x-ndjson'
+NDJSON_CHUNK_ROWS = int(os.environ.get('NDJSON_CHUNK_ROWS', '500'))
+
+# Response profiles for /api/cluster (?fields=...): 'all' echoes every input column,
+# 'assignments' returns only these columns plus a per-cluster section
+RESPONSE_PROFILES = ('all', 'assignments')
+ASSIGNMENT_COLUMNS = ('student_id', 'cluster', 'cluster_label', 'pca_x', 'pca_y')
+
+# Input validation: (column, min, max) range checks and examples kept per issue type
+VALIDATION_RANGES = (('attendance_percentage', 0, 100), ('average_score', 0, 100))
+VALIDATION_MAX_EXAMPLES = int(os.environ.get('VALIDATION_MAX_EXAMPLES', '5'))
+VALIDATION_HEADER = 'X-Validation-Report'
+
+
+# Reasonable defaults for missing feature values
+FEATURE_DEFAULTS = {
+    'attendance_percentage': 75.0,
+    'attendance_present_rate': 0.75,
+    'attendance_late_rate': 0.10,
+    'final_score': 50.0,
+    # Submission defaults - prioritizing ontime submissions
+    'submission_ontime_rate': 0.6,
+    'submission_ontime_priority_score': 60.0,
+    'submission_quality_score': 1.2,  # Moderate: mix of ontime/late (0.0-2.0 scale)
+    'submission_rate': 0.8,
+    'submission_late_rate': 0.2,
+    'submission_missing_rate': 0.0,
+    'submission_status_score': 1.2  # Moderate score (0.0-2.0 scale, same as quality_score)
+}
 
 
-def calculate_submission_features(row):
+def fill_feature_defaults(df):
+    """Return a copy of df with missing feature values replaced by FEATURE_DEFAULTS."""
+    df_clean = df.copy()
+    for col, default in FEATURE_DEFAULTS.items():
+        df_clean[col] = df_clean[col].fillna(default)
+    return df_clean
+
+
+def validate_clustering_data(df, max_examples=None):
     """
-    Calculate submission features based on status counts (ontime, late, missing).
-    Uses numerical values derived directly from submission status counts.
-    No deadline calculations - purely status-based.
+    Validate data quality before clustering (vectorized over the input DataFrame).
+    
+    Checks: missing student_id, duplicate student_id (hashed), and the
+    VALIDATION_RANGES of attendance_percentage and average_score.
+    
+    Returns a report:
+        record_count: Number of records
+        issue_count: Total number of issues
+        counts: {issue_type: count}, only types that occurred
+        examples: {issue_type: first max_examples examples}
     """
-    # Get submission status counts (these are the core numerical values)
-    ontime_count = float(row.get('submission_ontime_count', 0)) if pd.notna(row.get('submission_ontime_count')) else 0.0
-    late_count = float(row.get('submission_late_count', 0)) if pd.notna(row.get('submission_late_count')) else 0.0
-    missing_count = float(row.get('submission_missing_count', 0)) if pd.notna(row.get('submission_missing_count')) else 0.0
-    total_assessments = float(row.get('submission_total_assessments', 0)) if pd.notna(row.get('submission_total_assessments')) else 0.0
-    
-    # Calculate total submissions (ontime + late, excluding missing)
-    total_submissions = ontime_count + late_count
-    
-    # Calculate rates (proportions) from status counts
-    if total_assessments > 0:
-        ontime_rate = ontime_count / total_assessments
-        late_rate = late_count / total_assessments
-        missing_rate = missing_count / total_assessments
-        submission_rate = total_submissions / total_assessments  # Overall submission rate
-    else:
-        # Default values if no assessments
-        ontime_rate = 0.0
-        late_rate = 0.0
-        missing_rate = 1.0
-        submission_rate = 0.0
-    
-    # Calculate numerical status score based on status distribution
-    # Score range: 0.0-2.0, HIGHER IS BETTER (normalized to match quality_score direction)
-    # Formula: (ontime Ã— 2 + late Ã— 1 + missing Ã— 0) / total
-    # This gives a weighted average where:
-    # - ontime = 2 (best)
-    # - late = 1 (moderate)
-    # - missing = 0 (worst)
-    # NOTE: Same as quality_score for consistency - both use 0, 1, 2 weights with higher=better
-    if total_assessments > 0:
-        submission_status_score = (ontime_count * 2.0 + late_count * 1.0 + missing_count * 0.0) / total_assessments
-    else:
-        submission_status_score = 0.0  # Worst case if no data
-    
-    # Calculate submission quality score (0.0-2.0 scale, HIGHER IS BETTER)
-    # Uses weighted scoring: ontime=2, late=1, missing=0
-    # Formula: (ontime_count Ã— 2 + late_count Ã— 1 + missing_count Ã— 0) / total_assessments
-    # - 2.0 = all ontime (BEST)
-    # - 1.0 = all late (moderate)
-    # - 0.0 = all missing (WORST)
-    if total_assessments > 0:
-        # Quality score using 0, 1, 2 weights (same as status_score for consistency)
-        # Higher value = better (same as status_score)
-        quality_score = ((ontime_count * 2.0) + (late_count * 1.0) + (missing_count * 0.0)) / total_assessments
-    else:
-        quality_score = 0.0
+    max_examples = VALIDATION_MAX_EXAMPLES if max_examples is None else max_examples
+    counts = {}
+    examples = {}
     
-    # Calculate ontime priority score (0-100 scale, higher is better)
-    # Specifically measures how much of student's work is submitted on time
-    # This is a direct measure of timeliness priority
-    if total_assessments > 0:
-        ontime_priority_score = (ontime_count / total_assessments) * 100.0
+    def add_issue(issue_type, count, sample):
+        if count:
+            counts[issue_type] = int(count)
+            examples[issue_type] = sample
+    
+    if len(df) == 0:
+        add_issue('no_records', 1, ['No records provided for clustering'])
+        return {'record_count': 0, 'issue_count': 1, 'counts': counts, 'examples': examples}
+    
+    # Check for required fields
+    if 'student_id' in df.columns:
+        student_ids = df['student_id'].reset_index(drop=True)
     else:
-        ontime_priority_score = 0.0
+        student_ids = pd.Series([None] * len(df), dtype=object)
+    if student_ids.dtype.kind == 'f' and (student_ids.dropna() % 1 == 0).all():
+        student_ids = student_ids.astype('Int64')  # integer IDs that became float because of a null
+    missing = student_ids.isna().to_numpy()
+    add_issue('missing_student_id', missing.sum(),
+              [{'record': int(idx)} for idx in np.flatnonzero(missing)[:max_examples]])
+    
+    # Check for duplicate student IDs (hash-based, counts IDs that occur more than once)
+    present = student_ids[~missing]
+    duplicates = present[present.duplicated(keep=False)].drop_duplicates()
+    add_issue('duplicate_student_id', len(duplicates),
+              [record['student_id'] for record in frame_to_records(duplicates.head(max_examples).to_frame('student_id'))])
     
-    return {
-        # Raw counts (numerical values from status)
-        'submission_ontime_count': ontime_count,
-        'submission_late_count': late_count,
-        'submission_missing_count': missing_count,
-        'submission_total_assessments': total_assessments,
-        # Rates (proportions 0.0-1.0)
-        'submission_rate': submission_rate,
-        'submission_ontime_rate': ontime_rate,  # PRIORITIZED: Higher weight in clustering
-        'submission_late_rate': late_rate,
-        'submission_missing_rate': missing_rate,
-        # Computed scores
-        'submission_status_score': submission_status_score,  # 0.0-2.0, higher is better (ontime=2, late=1, missing=0)
-        'submission_quality_score': quality_score,  # 0.0-2.0, higher is better (ontime=2, late=1, missing=0)
-        'submission_ontime_priority_score': ontime_priority_score  # 0.0-100.0, direct ontime percentage
-    }
+    # Check for unrealistic values
+    for column, low, high in VALIDATION_RANGES:
+        if column not in df.columns:
+            continue
+        values = pd.to_numeric(df[column], errors='coerce').reset_index(drop=True)
+        invalid = ((values < low) | (values > high)).to_numpy()
+        idx = np.flatnonzero(invalid)[:max_examples]
+        add_issue(f'invalid_{column}', invalid.sum(), frame_to_records(pd.DataFrame({
+            'student_id': student_ids.iloc[idx].to_numpy(),
+            'value': values.iloc[idx].to_numpy()
+        })))
+    
+    return {'record_count': len(df), 'issue_count': sum(counts.values()), 'counts': counts, 'examples': examples}
 
 
-def calculate_score_features(row):
+def get_k_range(n_samples, max_clusters=5, min_clusters=3):
     """
-    Calculate score features using new grading computation system.
-    Uses pre-calculated transmuted scores from database which follow:
-
-    
-    1. Raw Score â†’ Adjusted Score (raw - penalty)
-    2. Adjusted Score â†’ Actual Score: (adjusted / max) Ã— 62.5 + 37.5 (non-zero based, min 37.5)
-    3. Actual Score â†’ Transmuted Score: actual Ã— (weight_percentage / 100)
-    4. Final Grade = SUM(transmuted_score) per course, then averaged across courses
-    
-    NEW: Also processes assessment-level transmuted scores grouped by ILO mapping.
-    This allows for ILO-specific performance analysis.
+    Range of k values to test for a dataset of n_samples (3-5 clusters,
+    at least 2 samples per cluster when the data allows it).
     """
-    # Use pre-calculated average_score from database (sum of transmuted scores per course, averaged)
-    # This follows the new grading computation: Raw â†’ Adjusted â†’ Actual â†’ Transmuted
-    syllabus_weighted_score = float(row.get('average_score', 50.0)) if pd.notna(row.get('average_score')) else 50.0
-    
-    # Process assessment-level transmuted scores grouped by ILO (NEW)
-    assessment_scores_by_ilo = row.get('assessment_scores_by_ilo')
-    ilo_specific_scores = {}
-    ilo_average_scores = {}
-    
-    if assessment_scores_by_ilo and isinstance(assessment_scores_by_ilo, (list, dict)):
-        # Handle both JSON array and dict formats
-        ilo_data_list = assessment_scores_by_ilo if isinstance(assessment_scores_by_ilo, list) else [assessment_scores_by_ilo]
-        
-        for ilo_data in ilo_data_list:
-            if isinstance(ilo_data, dict):
-                ilo_id = ilo_data.get('ilo_id')
-                ilo_code = ilo_data.get('ilo_code', f'ILO_{ilo_id}')
-                assessments = ilo_data.get('assessments', [])
-                
-                if ilo_id and assessments:
-                    # Calculate average transmuted score for this ILO
-                    transmuted_scores = []
-                    total_weight = 0.0
-                    
-                    for assessment in assessments:
-                        if isinstance(assessment, dict):
-                            transmuted = assessment.get('transmuted_score')
-                            weight = assessment.get('weight_percentage', 0) or 0
-                            
-                            if transmuted is not None and not (isinstance(transmuted, float) and (transmuted != transmuted)):  # Check for NaN
-                                try:
-                                    transmuted_float = float(transmuted)
-                                    if transmuted_float >= 0:
-                                        transmuted_scores.append(transmuted_float)
-                                        total_weight += float(weight) if weight else 0
-                                except (ValueError, TypeError):
-                                    pass
-                    
-                    if transmuted_scores:
-                        # Calculate weighted average for this ILO
-                        if total_weight > 0:
-                            weighted_sum = sum(transmuted_scores)
-                            ilo_average = weighted_sum / len(transmuted_scores)  # Simple average for now
-                        else:
-                            ilo_average = sum(transmuted_scores) / len(transmuted_scores)
-                        
-                        ilo_specific_scores[f'ilo_{ilo_id}_score'] = ilo_average
-                        ilo_average_scores[ilo_id] = {
-                            'ilo_code': ilo_code,
-                            'average_score': ilo_average,
-                            'assessment_count': len(transmuted_scores),
-                            'total_weight': total_weight
-                        }
-    
-    # Calculate overall ILO-based score (average of all ILO scores if available)
-    ilo_based_final_score = syllabus_weighted_score
-    if ilo_specific_scores:
-        ilo_scores_list = [score for score in ilo_specific_scores.values() if score > 0]
-        if ilo_scores_list:
-            # Use weighted average of ILO scores, or simple average
-            ilo_based_final_score = sum(ilo_scores_list) / len(ilo_scores_list)
-            # Prefer ILO-based score if available
-            final_score = ilo_based_final_score
-        else:
-            final_score = syllabus_weighted_score
-    else:
-        # Use syllabus-weighted score as final_score
-        final_score = syllabus_weighted_score
-    
-    result = {
-        'average_score': syllabus_weighted_score,  # Final grade using new computation (transmuted scores)
-        'final_score': final_score,  # Primary score for clustering (syllabus or ILO-based)
-        'ilo_based_score': ilo_based_final_score  # Score calculated from ILO-specific assessments
-    }
+    # Adjust max_clusters based on data size
+    max_clusters = min(max_clusters, n_samples // 2)
+    max_clusters = max(max_clusters, min_clusters)
     
-    # Add ILO-specific scores to result
-    result.update(ilo_specific_scores)
+    # Ensure we stay within 3-5 range
+    max_clusters = min(max_clusters, 5)
+    max_clusters = max(max_clusters, min_clusters)
     
-    return result
+    return range(min_clusters, max_clusters + 1)
 
 
-def validate_clustering_data(records):
+def run_k_sweep(X_scaled, max_clusters=5, min_clusters=3, engine='kmeans'):
     """
-    Validate data quality before clustering
-    Returns list of validation issues (empty if all valid)
-    """
-    issues = []
+    Fit KMeans exactly once for every candidate k.
     
-    if not records or len(records) == 0:
-        issues.append("No records provided for clustering")
-        return issues
+    Both the Silhouette and Elbow selectors read from the returned sweep, and
+    cluster_frame reuses the winning model instead of fitting it again.
     
-    # Check for required fields
-    required_fields = ['student_id']
-    for idx, record in enumerate(records):
-        for field in required_fields:
-            if field not in record or record[field] is None:
-                issues.append(f"Record {idx}: Missing required field '{field}'")
-    
-    # Check for duplicate student IDs
-    student_ids = [r.get('student_id') for r in records if r.get('student_id') is not None]
-    if len(student_ids) != len(set(student_ids)):
-        duplicates = [sid for sid in set(student_ids) if student_ids.count(sid) > 1]
-        issues.append(f"Duplicate student IDs found: {duplicates[:5]}")
+    Args:
+        X_scaled: Scaled feature matrix
+        max_clusters: Maximum number of clusters to test (default: 5)
+        min_clusters: Minimum number of clusters to test (default: 3)
+        engine: 'kmeans' or 'minibatch' (see kmeans_engine.py)
     
-    # Check for unrealistic values
-    for idx, record in enumerate(records):
-        student_id = record.get('student_id', f'Record {idx}')
+    Returns:
+        dict with:
+        - engine: Engine used for every fit
+        - k_range: List of k values tested
+        - models: k -> fitted KMeans model
+        - labels: k -> cluster labels
+        - centers: k -> cluster centers
+        - inertia: k -> WCSS (within-cluster sum of squares)
+        - silhouette: k -> Silhouette score (None if not computable)
+        - silhouette_info: k -> {'strategy', 'sample_size'} used for the score
+    """
+    k_range = list(get_k_range(len(X_scaled), max_clusters, min_clusters))
+    sweep = {
+        'engine': engine,
+        'k_range': k_range,
+        'models': {},
+        'labels': {},
+        'centers': {},
+        'inertia': {},
+        'silhouette': {},
+        'silhouette_info': {}
+    }
+    
+    logger.debug('K sweep: Fitting %s to %s clusters with %s (one fit per k)...', k_range[0], k_range[-1], engine)
+    sweep_start = time.perf_counter()
+    
+    for k in k_range:
+        # Use k-means++ initialization for better results
+        fit_start = time.perf_counter()
+        kmeans = build_kmeans(k, engine)
+        labels = kmeans.fit_predict(X_scaled)
+        metrics.observe(metrics.K_FIT_SECONDS, time.perf_counter() - fit_start, k=k)
         
-        # Attendance validation
-        attendance = record.get('attendance_percentage')
-        if attendance is not None:
-            try:
-                attendance = float(attendance)
-                if attendance < 0 or attendance > 100:
-                    issues.append(f"Student {student_id}: Invalid attendance_percentage ({attendance})")
-            except (ValueError, TypeError):
-                pass
+        sweep['models'][k] = kmeans
+        sweep['labels'][k] = labels
+        sweep['centers'][k] = kmeans.cluster_centers_
+        sweep['inertia'][k] = kmeans.inertia_
+        sweep['silhouette'][k] = None
+        sweep['silhouette_info'][k] = None
         
-        # Score validation
-        score = record.get('average_score')
-        if score is not None:
+        # Calculate silhouette score (exact, sampled or simplified depending on size);
+        # part of the k_sweep stage, the silhouette stage only times a score computed after the sweep
+        if len(X_scaled) >= k * 2:  # Need at least 2 samples per cluster
             try:
-                score = float(score)
-                if score < 0 or score > 100:
-                    issues.append(f"Student {student_id}: Invalid average_score ({score})")
-            except (ValueError, TypeError):
-                pass
-    
-    return issues
+                sweep['silhouette'][k], sweep['silhouette_info'][k] = compute_silhouette(
+                    X_scaled, labels, kmeans.cluster_centers_
+                )
+            except Exception as e:
+                logger.warning('k=%s: Silhouette error - %s', k, e)
+    
+    metrics.record_stage('k_sweep', time.perf_counter() - sweep_start)
+    return sweep
 
 
-def find_optimal_k_silhouette(X_scaled, max_clusters=5, min_clusters=3):
+def find_optimal_k_silhouette(X_scaled, max_clusters=5, min_clusters=3, sweep=None):
     """
     Find optimal number of clusters using Silhouette score (better for achieving 0.5-0.7 scores).
     
@@ -293,64 +249,45 @@ def find_optimal_k_silhouette(X_scaled, max_clusters=5, min_clusters=3):
         X_scaled: Scaled feature matrix
         max_clusters: Maximum number of clusters to test (default: 5)
         min_clusters: Minimum number of clusters to test (default: 3)
+        sweep: Result of run_k_sweep to read from (fitted here if not given)
     
     Returns:
         optimal_k: Optimal number of clusters with highest Silhouette score
         best_score: The best Silhouette score achieved
         scores: Dictionary of k -> silhouette_score for all tested k values
     """
-    n_samples = len(X_scaled)
-    
-    # Adjust max_clusters based on data size
-    max_clusters = min(max_clusters, n_samples // 2)
-    max_clusters = max(max_clusters, min_clusters)
-    max_clusters = min(max_clusters, 5)
-    max_clusters = max(max_clusters, min_clusters)
-    
-    if max_clusters < min_clusters:
-        return min_clusters, -1, {}
+    if sweep is None:
+        sweep = run_k_sweep(X_scaled, max_clusters=max_clusters, min_clusters=min_clusters)
     
-    k_range = range(min_clusters, max_clusters + 1)
+    k_range = sweep['k_range']
     scores = {}
     best_k = min_clusters
     best_score = -1
     
-    print(f'\n[*] [Python API] Silhouette Method: Testing {min_clusters} to {max_clusters} clusters...')
+    logger.debug('Silhouette Method: Testing %s to %s clusters...', k_range[0], k_range[-1])
     
     for k in k_range:
-        try:
-            # Use k-means++ initialization for better results
-            kmeans = KMeans(n_clusters=k, init='k-means++', n_init=10, max_iter=300, random_state=42)
-            labels = kmeans.fit_predict(X_scaled)
-            
-            # Calculate silhouette score
-            if len(X_scaled) >= k * 2:  # Need at least 2 samples per cluster
-                score = silhouette_score(X_scaled, labels)
-                scores[k] = score
-                print(f'   k={k}: Silhouette Score={score:.4f}')
-                
-                if score > best_score:
-                    best_score = score
-                    best_k = k
-            else:
-                print(f'   k={k}: Insufficient data (need at least {k*2} samples)')
-        except Exception as e:
-            print(f'   k={k}: Error - {e}')
+        score = sweep['silhouette'].get(k)
+        if score is None:
+            logger.debug('k=%s: Insufficient data (need at least %s samples)', k, k * 2)
             continue
+        
+        scores[k] = score
+        logger.debug('k=%s: Silhouette Score=%.4f', k, score)
+        
+        if score > best_score:
+            best_score = score
+            best_k = k
     
     if best_score > 0:
-        print(f'\n[OK] [Python API] Silhouette Method: Optimal k={best_k} (score={best_score:.4f})')
-        if best_score >= 0.5:
-            print('   [*] Excellent clustering quality (score >= 0.5)')
-        elif best_score >= 0.3:
-            print('   [OK] Good clustering quality (score >= 0.3)')
+        logger.debug('Silhouette Method: Optimal k=%s (score=%.4f)', best_k, best_score)
     else:
-        print(f'\n[!] [Python API] Silhouette Method: Could not find optimal k, using k={best_k}')
+        logger.warning('Silhouette Method: Could not find optimal k, using k=%s', best_k)
     
     return best_k, best_score, scores
 
 
-def find_optimal_clusters_elbow_method(X_scaled, max_clusters=5, min_clusters=3):
+def find_optimal_clusters_elbow_method(X_scaled, max_clusters=5, min_clusters=3, sweep=None):
     """
     Determine optimal number of clusters using the elbow method.
     
@@ -363,37 +300,26 @@ def find_optimal_clusters_elbow_method(X_scaled, max_clusters=5, min_clusters=3)
         X_scaled: Scaled feature matrix
         max_clusters: Maximum number of clusters to test (default: 5)
         min_clusters: Minimum number of clusters to test (default: 3)
+        sweep: Result of run_k_sweep to read from (fitted here if not given)
     
     Returns:
         optimal_k: Optimal number of clusters determined by elbow method (3-5)
         wcss_values: List of WCSS values for each k
         k_range: Range of k values tested
     """
-    n_samples = len(X_scaled)
-    
-    # Adjust max_clusters based on data size
-    # Need at least 2 samples per cluster for valid clustering
-    max_clusters = min(max_clusters, n_samples // 2)
-    max_clusters = max(max_clusters, min_clusters)
+    if sweep is None:
+        sweep = run_k_sweep(X_scaled, max_clusters=max_clusters, min_clusters=min_clusters)
     
-    # Ensure we stay within 3-5 range
-    max_clusters = min(max_clusters, 5)
-    max_clusters = max(max_clusters, min_clusters)
-    
-    if max_clusters < min_clusters:
-        return min_clusters, [], []
-    
-    k_range = range(min_clusters, max_clusters + 1)
+    k_range = sweep['k_range']
+    max_clusters = k_range[-1]
     wcss_values = []
     
-    print(f'\n[*] [Python API] Elbow Method: Testing {min_clusters} to {max_clusters} clusters (min=3, max=5)...')
+    logger.debug('Elbow Method: Testing %s to %s clusters (min=3, max=5)...', min_clusters, max_clusters)
     
     for k in k_range:
-        kmeans = KMeans(n_clusters=k, init='k-means++', n_init=10, random_state=42, max_iter=300)
-        kmeans.fit(X_scaled)
-        wcss = kmeans.inertia_  # WCSS = within-cluster sum of squares
+        wcss = sweep['inertia'][k]  # WCSS = within-cluster sum of squares
         wcss_values.append(wcss)
-        print(f'   k={k}: WCSS={wcss:.2f}')
+        logger.debug('k=%s: WCSS=%.2f', k, wcss)
     
     # Find elbow point using the method of finding the maximum rate of change
     # Calculate the rate of decrease (negative derivative)
@@ -419,13 +345,13 @@ def find_optimal_clusters_elbow_method(X_scaled, max_clusters=5, min_clusters=3)
                 optimal_k = k_range[max_accel_idx + 1]  # +1 because acceleration calculation
                 # Ensure optimal_k is within 3-5 range
                 optimal_k = max(min(optimal_k, 5), 3)
-                print(f'\n[OK] [Python API] Elbow Method: Optimal k={optimal_k} (sharpest bend at k={optimal_k})')
+                logger.debug('Elbow Method: Optimal k=%s (sharpest bend at k=%s)', optimal_k, optimal_k)
                 return optimal_k, wcss_values, list(k_range)
     
     # Fallback: use middle value if we can't find a clear elbow
     optimal_k = min_clusters + (max_clusters - min_clusters) // 2
     optimal_k = max(min(optimal_k, 5), 3)  # Ensure 3-5 range
-    print(f'\n[!] [Python API] Elbow Method: Could not find clear elbow, using k={optimal_k} (middle value)')
+    logger.debug('Elbow Method: Could not find clear elbow, using k=%s (middle value)', optimal_k)
     return optimal_k, wcss_values, list(k_range)
 
 
@@ -478,270 +404,418 @@ def validate_cluster_quality(cluster_stats, labels, total_students, silhouette_s
     return issues
 
 
-def cluster_records(records):
+def select_clustering_features(df_clean, features):
     """
-    Enhanced clustering function with validation.
+    Drop features with too little variance to separate students.
+    Keeps all available features if fewer than 3 pass the variance threshold.
     
-    Clustering is based on THREE primary data sources:
-    1. TRANSMUTED SCORES: Pre-calculated transmuted scores from assessments
-       - Formula: Raw â†’ Adjusted â†’ Actual â†’ Transmuted
-       - Uses: average_score, assessment_scores_by_ilo
-    2. SUBMISSION DATA: Submission behavior patterns
-       - Counts: ontime, late, missing submissions
-       - Rates: submission_rate, submission_ontime_rate, etc.
-    3. ATTENDANCE DATA: Attendance patterns
-       - Counts: present, absent, late attendance
-       - Rates: attendance_percentage, attendance_present_rate, etc.
-    
-    Features:
-    - Data quality validation before clustering
-    - Cluster quality validation after clustering
+    Returns:
+        features: Feature list to cluster on
     """
-    # Validate input data
-    validation_issues = validate_clustering_data(records)
-    if validation_issues:
-        print(f'\n[!] [Python API] Data validation issues found:')
-        for issue in validation_issues[:10]:  # Show first 10 issues
-            print(f'  {issue}')
-        if len(validation_issues) > 10:
-            print(f'  ... and {len(validation_issues) - 10} more issues')
-        # Continue with clustering but log warnings
-    
-    df = pd.DataFrame(records)
-    
-    # Ensure student_id is integer for consistent merging
-    if 'student_id' in df.columns:
-        df['student_id'] = pd.to_numeric(df['student_id'], errors='coerce').astype('Int64')
-    
-    print(f'[*] [Python API] Processing {len(df)} students')
-    
-    # Calculate enhanced features
-    attendance_features = df.apply(calculate_attendance_features, axis=1)
-    submission_features = df.apply(calculate_submission_features, axis=1)
-    score_features = df.apply(calculate_score_features, axis=1)
-    
-    # Add features to dataframe
-    # Convert Series of dicts to DataFrame columns
-    if len(attendance_features) > 0:
-        attendance_df = pd.DataFrame(attendance_features.tolist())
-        for col in attendance_df.columns:
-            df[col] = attendance_df[col].values
-    
-    if len(submission_features) > 0:
-        submission_df = pd.DataFrame(submission_features.tolist())
-        for col in submission_df.columns:
-            df[col] = submission_df[col].values
-    
-    if len(score_features) > 0:
-        score_df = pd.DataFrame(score_features.tolist())
-        for col in score_df.columns:
-            df[col] = score_df[col].values
-    
-    # OPTIMIZED FEATURE SET for better Silhouette scores (0.5-0.7)
-    # Reduced from 11 to 6-7 features to reduce redundancy and improve cluster separation
-    # Features are derived from THREE primary data sources:
-    # 1. TRANSMUTED SCORES: final_score (calculated from transmuted scores)
-    # 2. SUBMISSION DATA: submission rates and quality scores
-    # 3. ATTENDANCE DATA: attendance percentages and rates
-    # 
-    # PRIORITIZES ONTIME SUBMISSIONS: ontime_rate and ontime_priority_score have higher influence
-    # REMOVED REDUNDANT FEATURES: submission_status_score (duplicates quality_score)
-    features = [
-        # CORE PERFORMANCE METRICS (most discriminative)
-        'final_score',                     # Academic performance (0-100) - PRIMARY
-        'attendance_percentage',           # Engagement metric (0-100) - PRIMARY
-        'submission_ontime_priority_score', # Timeliness (0-100) - PRIMARY
-        
-        # BEHAVIOR PATTERNS (complementary, high variance)
-        'submission_quality_score',        # Submission behavior (0.0-2.0) - HIGH WEIGHT
-        'attendance_present_rate',         # Attendance pattern (0-1) - MODERATE WEIGHT
-        
-        # OVERALL METRICS (if they add unique information)
-        'submission_rate',                 # Overall submission rate (0-1) - MODERATE WEIGHT
-    ]
-    
-    # Optional: Add attendance_late_rate only if it has sufficient variance
-    # This will be checked later in variance filtering
-    
-    # Ensure numeric types
-    for col in features:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Fill missing values with reasonable defaults
-    df_clean = df.copy()
-    df_clean['attendance_percentage'] = df_clean['attendance_percentage'].fillna(75.0)
-    df_clean['attendance_present_rate'] = df_clean['attendance_present_rate'].fillna(0.75)
-    df_clean['attendance_late_rate'] = df_clean['attendance_late_rate'].fillna(0.10)
-    df_clean['final_score'] = df_clean['final_score'].fillna(50.0)
-    # Submission defaults - prioritizing ontime submissions
-    df_clean['submission_ontime_rate'] = df_clean['submission_ontime_rate'].fillna(0.6)
-    df_clean['submission_ontime_priority_score'] = df_clean['submission_ontime_priority_score'].fillna(60.0)
-    df_clean['submission_quality_score'] = df_clean['submission_quality_score'].fillna(1.2)  # Moderate: mix of ontime/late (0.0-2.0 scale)
-    df_clean['submission_rate'] = df_clean['submission_rate'].fillna(0.8)
-    df_clean['submission_late_rate'] = df_clean['submission_late_rate'].fillna(0.2)
-    df_clean['submission_missing_rate'] = df_clean['submission_missing_rate'].fillna(0.0)
-    df_clean['submission_status_score'] = df_clean['submission_status_score'].fillna(1.2)  # Moderate score (0.0-2.0 scale, same as quality_score)
-    
-    if len(df_clean) == 0:
-        output = df.copy()
-        output['cluster'] = None
-        output['cluster_label'] = None
-        output['silhouette_score'] = None
-        output['clustering_explanation'] = None
-        return output.to_dict(orient='records')
-    
     # Check data variation and filter low-variance features
-    print(f'\n[*] [Python API] Data variation check:')
     variance_threshold = 0.01  # Minimum variance required
     valid_features = []
+    debug = logger.isEnabledFor(logging.DEBUG)
     
     for feature in features:
         if feature in df_clean.columns:
-            feature_range = df_clean[feature].max() - df_clean[feature].min()
-            feature_mean = df_clean[feature].mean()
             feature_variance = df_clean[feature].var()
-            print(f'  {feature}: range={feature_range:.3f}, mean={feature_mean:.3f}, variance={feature_variance:.6f}')
-            
-            if feature_range < 0.01:
-                print(f'    [!] WARNING: Very low variation in {feature}. Clustering may not distinguish students well.')
+            if debug:
+                # Range and mean are only needed for the diagnostics
+                feature_range = df_clean[feature].max() - df_clean[feature].min()
+                logger.debug('Data variation: %s range=%.3f, mean=%.3f, variance=%.6f',
+                             feature, feature_range, df_clean[feature].mean(), feature_variance)
+                if feature_range < 0.01:
+                    logger.debug('Very low variation in %s. Clustering may not distinguish students well.', feature)
             
             # Filter out features with very low variance
             if feature_variance >= variance_threshold:
                 valid_features.append(feature)
             else:
-                print(f'    [!] REMOVED: {feature} has variance {feature_variance:.6f} < {variance_threshold} (too low)')
+                logger.info('Removed feature %s: variance %.6f < %s (too low)', feature, feature_variance, variance_threshold)
     
     # Update features list to only include valid features
     if len(valid_features) < 3:
-        print(f'\n[!] [Python API] Warning: Only {len(valid_features)} features have sufficient variance. Using all features anyway.')
+        logger.warning('Only %s features have sufficient variance. Using all features anyway.', len(valid_features))
         valid_features = [f for f in features if f in df_clean.columns]
     else:
         features = valid_features
-        print(f'\n[OK] [Python API] Using {len(features)} features with sufficient variance: {features}')
+        logger.debug('Using %s features with sufficient variance: %s', len(features), features)
     
-    # Scale features for clustering
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(df_clean[features])
+    return features
+
 
-    # Compute PCA (2 components) for visualization
-    pca = None
-    X_pca = None
-    pca_variance = None
+def compute_pca(X_scaled):
+    """
+    Compute PCA (2 components) for visualization.
+    
+    Returns:
+        pca: Fitted PCA (None if not computable)
+        X_pca: (n, 2) projection (None if not computable)
+        pca_variance: Explained variance ratio per component (None if not computable)
+    """
     try:
-        if len(df_clean) >= 2:
+        if len(X_scaled) >= 2:
             pca = PCA(n_components=2, random_state=42)
             X_pca = pca.fit_transform(X_scaled)
-            pca_variance = pca.explained_variance_ratio_.tolist()
-            df_clean['pca_x'] = X_pca[:, 0]
-            df_clean['pca_y'] = X_pca[:, 1]
-            if pca_variance and len(pca_variance) == 2:
-                df_clean['pca_component_1_variance'] = pca_variance[0]
-                df_clean['pca_component_2_variance'] = pca_variance[1]
-            else:
-                df_clean['pca_component_1_variance'] = None
-                df_clean['pca_component_2_variance'] = None
-        else:
-            df_clean['pca_x'] = None
-            df_clean['pca_y'] = None
-            df_clean['pca_component_1_variance'] = None
-            df_clean['pca_component_2_variance'] = None
+            return pca, X_pca, pca.explained_variance_ratio_.tolist()
     except Exception as e:
-        print(f'[!] [Python API] PCA computation failed: {e}')
+        logger.warning('PCA computation failed: %s', e)
+    return None, None, None
+
+
+def add_pca_columns(df_clean, X_pca, pca_variance):
+    """Add pca_x/pca_y and the explained variance of both components to df_clean."""
+    if X_pca is None:
         df_clean['pca_x'] = None
         df_clean['pca_y'] = None
         df_clean['pca_component_1_variance'] = None
         df_clean['pca_component_2_variance'] = None
-        pca_variance = None
+        return
+    df_clean['pca_x'] = X_pca[:, 0]
+    df_clean['pca_y'] = X_pca[:, 1]
+    if pca_variance and len(pca_variance) == 2:
+        df_clean['pca_component_1_variance'] = pca_variance[0]
+        df_clean['pca_component_2_variance'] = pca_variance[1]
+    else:
+        df_clean['pca_component_1_variance'] = None
+        df_clean['pca_component_2_variance'] = None
+
+
+def fit_clusters(X_scaled, engine='kmeans'):
+    """
+    Choose k (3-5) with the shared k sweep and fit the final clustering.
+    
+    Args:
+        X_scaled: Scaled feature matrix
+        engine: 'kmeans' or 'minibatch' (see kmeans_engine.py)
+    
+    Returns:
+        dict with n_clusters, kmeans (None if k=1), clusters, silhouette_avg,
+        silhouette_info, sweep (None if no sweep was run) and k_tried
+    """
+    n_samples = len(X_scaled)
+    kmeans = None
     
     # Determine optimal number of clusters using elbow method
+    sweep = None
+    k_tried = []
     # Need at least 6 students for clustering (3 clusters * 2 samples per cluster)
-    if len(df_clean) < 6:
+    if n_samples < 6:
         # If less than 6 students, use minimum k=3 if possible
-        if len(df_clean) >= 6:
+        if n_samples >= 6:
             n_clusters = 3
-        elif len(df_clean) >= 4:
+        elif n_samples >= 4:
             n_clusters = 2  # Fallback: use 2 clusters if 4-5 students
         else:
             n_clusters = 1  # Not enough data
-        print(f'\n[!] [Python API] Insufficient data ({len(df_clean)} students), using k={n_clusters} (minimum 6 students recommended for k=3-5)')
+        logger.warning('Insufficient data (%s students), using k=%s (minimum 6 students recommended for k=3-5)',
+                       n_samples, n_clusters)
     else:
         # Use elbow method to find optimal k (3-5)
         # Need at least 2 samples per cluster, so max is limited by data size
-        max_clusters = min(5, len(df_clean) // 2)  # Maximum 5 clusters
+        max_clusters = min(5, n_samples // 2)  # Maximum 5 clusters
         max_clusters = max(max_clusters, 3)  # Minimum 3 clusters
         
         # Use Silhouette-based method for better cluster separation (target: 0.5-0.7)
         # Falls back to elbow method if Silhouette method fails
+        # Both selectors read from one shared sweep (one KMeans fit per k)
         try:
+            sweep = run_k_sweep(X_scaled, max_clusters=max_clusters, min_clusters=3, engine=engine)
+            k_tried = list(sweep['k_range'])
             optimal_k, silhouette_best, silhouette_scores = find_optimal_k_silhouette(
                 X_scaled,
                 max_clusters=max_clusters,
-                min_clusters=3
+                min_clusters=3,
+                sweep=sweep
             )
             
             # Also run elbow method for comparison
             elbow_k, wcss_values, k_range = find_optimal_clusters_elbow_method(
                 X_scaled,
                 max_clusters=max_clusters,
-                min_clusters=3
+                min_clusters=3,
+                sweep=sweep
             )
             
             # Prefer Silhouette-based k if it gives good score (>= 0.3)
             # Otherwise use elbow method
             if silhouette_best >= 0.3:
                 n_clusters = optimal_k
-                print(f'\n[*] [Python API] Using Silhouette-optimized k={n_clusters} (score={silhouette_best:.4f})')
+                logger.debug('Using Silhouette-optimized k=%s (score=%.4f)', n_clusters, silhouette_best)
             else:
                 n_clusters = elbow_k
-                print(f'\n[*] [Python API] Using Elbow-optimized k={n_clusters} (Silhouette score was {silhouette_best:.4f}, too low)')
+                logger.debug('Using Elbow-optimized k=%s (Silhouette score was %.4f, too low)', n_clusters, silhouette_best)
         except Exception as e:
-            print(f'\n[!] [Python API] Silhouette method failed: {e}, using elbow method')
+            logger.warning('Silhouette method failed: %s, using elbow method', e)
+            sweep = None
             optimal_k, wcss_values, k_range = find_optimal_clusters_elbow_method(
                 X_scaled,
                 max_clusters=max_clusters,
                 min_clusters=3
             )
+            k_tried = list(k_range)
             n_clusters = optimal_k
         
         # Ensure n_clusters is valid for the data size and within 3-5 range
-        n_clusters = min(n_clusters, min(5, len(df_clean) // 2))
+        n_clusters = min(n_clusters, min(5, n_samples // 2))
         n_clusters = max(n_clusters, 3)
         
-        print(f'\n[*] [Python API] Final k={n_clusters} clusters (range: 3-5)')
+        logger.info('Final k=%s clusters (range: 3-5)', n_clusters)
     
     # Perform KMeans clustering with optimized settings for better separation
+    silhouette_info = None
     if n_clusters > 1:
-        # Use k-means++ initialization and multiple runs for better results
-        kmeans = KMeans(
-            n_clusters=n_clusters,
-            init='k-means++',      # Better initialization than random
-            n_init=10,             # Run 10 times, pick best result
-            max_iter=300,
-            random_state=42
-        )
-        clusters = kmeans.fit_predict(X_scaled)
+        silhouette_avg = None
+        if sweep is not None and n_clusters in sweep['models']:
+            # Reuse the model already fitted by the k sweep (same settings, no refit)
+            kmeans = sweep['models'][n_clusters]
+            clusters = sweep['labels'][n_clusters]
+            silhouette_avg = sweep['silhouette'][n_clusters]
+            silhouette_info = sweep['silhouette_info'][n_clusters]
+        else:
+            # Use k-means++ initialization and multiple runs for better results
+            with metrics.timed('final_fit'):
+                kmeans = build_kmeans(n_clusters, engine)
+                clusters = kmeans.fit_predict(X_scaled)
         
         # Calculate silhouette score (only if we have at least 2 clusters and 2 samples per cluster)
-        silhouette_avg = None
         try:
-            if len(df_clean) >= n_clusters * 2:  # Need at least 2 samples per cluster
-                silhouette_avg = silhouette_score(X_scaled, clusters)
-                print(f'\n[OK] [Python API] Silhouette Score: {silhouette_avg:.4f}')
-                if silhouette_avg > 0.5:
-                    print('   [*] Excellent clustering quality (score > 0.5)')
-                elif silhouette_avg > 0.3:
-                    print('   [OK] Good clustering quality (score > 0.3)')
-                elif silhouette_avg > 0.1:
-                    print('   [!] Fair clustering quality (score > 0.1)')
-                else:
-                    print('   [!] Poor clustering quality (score < 0.1) - clusters may not be well-separated')
+            if silhouette_avg is None and n_samples >= n_clusters * 2:  # Need at least 2 samples per cluster
+                with metrics.timed('silhouette'):
+                    silhouette_avg, silhouette_info = compute_silhouette(X_scaled, clusters, kmeans.cluster_centers_)
+            if silhouette_avg is not None:
+                logger.info('Silhouette Score: %.4f (%s, %s students)',
+                            silhouette_avg, silhouette_info['strategy'], silhouette_info['sample_size'])
         except Exception as e:
-            print(f'[!] [Python API] Could not calculate silhouette score: {e}')
+            logger.warning('Could not calculate silhouette score: %s', e)
             silhouette_avg = None
+            silhouette_info = None
     else:
-        clusters = np.zeros(len(df_clean), dtype=int)
+        clusters = np.zeros(n_samples, dtype=int)
         silhouette_avg = None
-        print('[!] [Python API] Not enough data for clustering (need at least 2 students)')
+        logger.warning('Not enough data for clustering (need at least 2 students)')
+    
+    return {
+        'n_clusters': n_clusters,
+        'kmeans': kmeans,
+        'clusters': clusters,
+        'silhouette_avg': silhouette_avg,
+        'silhouette_info': silhouette_info,
+        'sweep': sweep,
+        'k_tried': k_tried
+    }
+
+
+def warm_start_clusters(df_clean, model, engine='kmeans'):
+    """
+    Re-cluster with a persisted model: the prior scaler, PCA and centroids are
+    reused and KMeans is seeded with the centroids (single restart).
+    
+    Returns None (caller runs the full sweep) when the model does not match
+    the data or quality degraded beyond WARM_START_MAX_SILHOUETTE_DROP /
+    WARM_START_MAX_INERTIA_INCREASE compared to the model's last full sweep.
+    
+    Returns:
+        dict with features, X_scaled, X_pca, pca_variance and the fit_clusters() keys
+    """
+    features = model.get('features') or []
+    n_clusters = int(model.get('n_clusters') or 0)
+    missing = [f for f in features if f not in df_clean.columns]
+    if not features or missing or n_clusters < 2 or len(df_clean) < n_clusters * 2:
+        logger.warning('Warm start skipped: model does not match data (k=%s, students=%s, missing features=%s)',
+                       n_clusters, len(df_clean), missing)
+        return None
+    
+    try:
+        X_scaled = model_store.transform(model, df_clean)
+        kmeans = build_kmeans(n_clusters, engine, init=np.asarray(model['centers'], dtype=float))
+        clusters = kmeans.fit_predict(X_scaled)
+        silhouette_avg, silhouette_info = compute_silhouette(X_scaled, clusters, kmeans.cluster_centers_)
+    except Exception as e:
+        logger.warning('Warm start failed: %s', e)
+        return None
+    
+    # Compare against the quality of the last full sweep
+    inertia_per_sample = kmeans.inertia_ / len(X_scaled)
+    baseline_silhouette = model.get('baseline_silhouette')
+    baseline_inertia = model.get('baseline_inertia_per_sample')
+    degraded = []
+    if len(np.unique(clusters)) < n_clusters:
+        degraded.append('empty cluster')
+    if baseline_silhouette is not None and silhouette_avg < baseline_silhouette - WARM_START_MAX_SILHOUETTE_DROP:
+        degraded.append(f'silhouette {silhouette_avg:.4f} vs baseline {baseline_silhouette:.4f}')
+    if baseline_inertia and inertia_per_sample > baseline_inertia * (1 + WARM_START_MAX_INERTIA_INCREASE):
+        degraded.append(f'inertia/student {inertia_per_sample:.4f} vs baseline {baseline_inertia:.4f}')
+    if degraded:
+        logger.warning('Warm start degraded (%s), running full sweep', '; '.join(degraded))
+        return None
+    
+    X_pca, pca_variance = model_store.project(model, X_scaled)
+    logger.info('Warm start: k=%s, Silhouette Score: %.4f', n_clusters, silhouette_avg)
+    return {
+        'features': features,
+        'X_scaled': X_scaled,
+        'X_pca': X_pca,
+        'pca_variance': pca_variance,
+        'n_clusters': n_clusters,
+        'kmeans': kmeans,
+        'clusters': clusters,
+        'silhouette_avg': silhouette_avg,
+        'silhouette_info': silhouette_info,
+        'sweep': None,
+        'k_tried': []
+    }
+
+
+def cluster_frame(records, engine=None, scope=None, warm_model=None, fields=None):
+    """
+    Enhanced clustering function with validation.
+    
+    Clustering is based on THREE primary data sources:
+    1. TRANSMUTED SCORES: Pre-calculated transmuted scores from assessments
+       - Formula: Raw â†’ Adjusted â†’ Actual â†’ Transmuted
+       - Uses: average_score, assessment_scores_by_ilo
+    2. SUBMISSION DATA: Submission behavior patterns
+       - Counts: ontime, late, missing submissions
+       - Rates: submission_rate, submission_ontime_rate, etc.
+    3. ATTENDANCE DATA: Attendance patterns
+       - Counts: present, absent, late attendance
+       - Rates: attendance_percentage, attendance_present_rate, etc.
+    
+    Features:
+    - Data quality validation before clustering
+    - Cluster quality validation after clustering
+    
+    Args:
+        records: List of student records
+        engine: Force 'kmeans' or 'minibatch' (default: KMEANS_ENGINE / row threshold)
+        scope: Model store scope; the fitted model is saved under it (see model_store.py)
+        warm_model: Persisted model to warm-start from (falls back to the full sweep)
+        fields: 'assignments' to return only ASSIGNMENT_COLUMNS (no merge onto the input columns)
+    
+    Returns:
+        DataFrame with one row per record: the input columns plus cluster,
+        cluster_label, silhouette_score, clustering_explanation and PCA columns.
+        output.attrs['clusters'] / output.attrs['clustering'] hold the per-cluster
+        summary and run metadata (see assignments_body), output.attrs['validation']
+        the input validation report (see validate_clustering_data) and
+        output.attrs['run'] the input size, features and k tried / chosen (see response_meta).
+    """
+    df = records.reset_index(drop=True) if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    stages = metrics.StageTimer()
+    
+    # Validate input data (on the raw input, before student_id is coerced)
+    validation = validate_clustering_data(df)
+    for issue_type, count in validation['counts'].items():
+        # Continue with clustering but log warnings
+        logger.warning('Data validation: %s: %s (e.g. %s)', issue_type, count, validation['examples'][issue_type],
+                       extra={'issue_type': issue_type, 'issue_count': count})
+    stages.lap('validation')
+    
+    # Ensure student_id is integer for consistent merging
+    if 'student_id' in df.columns:
+        df['student_id'] = pd.to_numeric(df['student_id'], errors='coerce').astype('Int64')
+    
+    logger.info('Processing %s students', len(df))
+    
+    # Calculate enhanced features (columnar engine, same values as the row-wise
+    # calculate_*_features functions kept in tests/rowwise_features.py)
+    if len(df) > 0:
+        feature_df = compute_features(df)
+        for col in feature_df.columns:
+            df[col] = feature_df[col].values
+    
+    # OPTIMIZED FEATURE SET for better Silhouette scores (0.5-0.7)
+    # Reduced from 11 to 6-7 features to reduce redundancy and improve cluster separation
+    # Features are derived from THREE primary data sources:
+    # 1. TRANSMUTED SCORES: final_score (calculated from transmuted scores)
+    # 2. SUBMISSION DATA: submission rates and quality scores
+    # 3. ATTENDANCE DATA: attendance percentages and rates
+    # 
+    # PRIORITIZES ONTIME SUBMISSIONS: ontime_rate and ontime_priority_score have higher influence
+    # REMOVED REDUNDANT FEATURES: submission_status_score (duplicates quality_score)
+    features = [
+        # CORE PERFORMANCE METRICS (most discriminative)
+        'final_score',                     # Academic performance (0-100) - PRIMARY
+        'attendance_percentage',           # Engagement metric (0-100) - PRIMARY
+        'submission_ontime_priority_score', # Timeliness (0-100) - PRIMARY
+        
+        # BEHAVIOR PATTERNS (complementary, high variance)
+        'submission_quality_score',        # Submission behavior (0.0-2.0) - HIGH WEIGHT
+        'attendance_present_rate',         # Attendance pattern (0-1) - MODERATE WEIGHT
+        
+        # OVERALL METRICS (if they add unique information)
+        'submission_rate',                 # Overall submission rate (0-1) - MODERATE WEIGHT
+    ]
+    
+    # Optional: Add attendance_late_rate only if it has sufficient variance
+    # This will be checked later in variance filtering
+    
+    # Ensure numeric types
+    for col in features:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    # Fill missing values with reasonable defaults
+    df_clean = fill_feature_defaults(df)
+    stages.lap('features')
+    
+    if len(df_clean) == 0:
+        output = df.copy()
+        output['cluster'] = None
+        output['cluster_label'] = None
+        output['silhouette_score'] = None
+        output['clustering_explanation'] = None
+        if fields == 'assignments':
+            output = output.reindex(columns=list(ASSIGNMENT_COLUMNS))
+        output.attrs['validation'] = validation
+        output.attrs['run'] = {'row_count': len(df), 'feature_count': 0, 'features': [], 'k_tried': [], 'chosen_k': None}
+        return output
+    
+    # Full-batch KMeans for sections, MiniBatchKMeans for term/program-wide runs
+    engine = choose_engine(len(df_clean), engine)
+    
+    # scikit-learn's native threads are capped for the run (see thread_budget.py)
+    with thread_budget.limit() as threads:
+        # Warm start from a persisted model; falls back to the full sweep when quality degrades
+        warm = warm_start_clusters(df_clean, warm_model, engine) if warm_model else None
+        if warm_model:
+            stages.lap('warm_start')
+        if warm is not None:
+            features = warm['features']
+            X_scaled = warm['X_scaled']
+            scaler_mean, scaler_scale = warm_model['scaler_mean'], warm_model['scaler_scale']
+            pca_mean, pca_components = warm_model.get('pca_mean'), warm_model.get('pca_components')
+            pca_variance = warm['pca_variance']
+            add_pca_columns(df_clean, warm['X_pca'], pca_variance)
+            fit = warm
+        else:
+            features = select_clustering_features(df_clean, features)
+            stages.lap('feature_selection')
+        
+            # Scale features for clustering
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(df_clean[features])
+            scaler_mean, scaler_scale = scaler.mean_, scaler.scale_
+            stages.lap('scaling')
+        
+            pca, X_pca, pca_variance = compute_pca(X_scaled)
+            pca_mean = pca.mean_ if pca is not None else None
+            pca_components = pca.components_ if pca is not None else None
+            add_pca_columns(df_clean, X_pca, pca_variance)
+            stages.lap('pca')
+        
+            # k_sweep, final_fit and silhouette are timed inside
+            fit = fit_clusters(X_scaled, engine)
+            stages.restart()
+    
+    n_clusters = fit['n_clusters']
+    kmeans = fit['kmeans']
+    clusters = fit['clusters']
+    silhouette_avg = fit['silhouette_avg']
+    silhouette_info = fit['silhouette_info']
+    clustering_mode = 'warm_start' if warm is not None else 'full_sweep'
+    metrics.inc(metrics.CHOSEN_K, k=n_clusters)
     
     df_clean.loc[:, 'cluster'] = clusters
     
@@ -817,7 +891,7 @@ def cluster_records(records):
     else:
         # Fallback: for k < 3 or k > 5 (should not happen in normal flow)
         # Use k=3 labels as default
-        print(f'\n[!] [Python API] Warning: Unexpected cluster count k={n_clusters}, using k=3 labels')
+        logger.warning('Unexpected cluster count k=%s, using k=3 labels', n_clusters)
         labels = {
             sorted_clusters[0][0]: "Excellent Performance",
             sorted_clusters[1][0]: "Average Performance",
@@ -886,133 +960,608 @@ def cluster_records(records):
     
     df_clean.loc[:, 'clustering_explanation'] = df_clean['cluster'].map(explanations).fillna('No explanation available')
     
-    # Add silhouette score to all records
+    # Add silhouette score (and how it was computed) to all records
     df_clean.loc[:, 'silhouette_score'] = silhouette_avg
+    df_clean['silhouette_strategy'] = silhouette_info['strategy'] if silhouette_info else None
+    df_clean['silhouette_sample_size'] = silhouette_info['sample_size'] if silhouette_info else None
+    df_clean['clustering_engine'] = engine
+    df_clean['clustering_mode'] = clustering_mode
+    stages.lap('labeling')
     
-    # Print cluster distribution
-    print(f'\n[*] [Python API] Cluster distribution:')
+    # Log cluster distribution
     cluster_counts = df_clean['cluster_label'].value_counts()
     total_students = len(df_clean)
-    for label, count in cluster_counts.items():
-        percentage = (count / total_students) * 100
-        print(f'  {label}: {count} students ({percentage:.1f}%)')
-        cluster_id = df_clean[df_clean['cluster_label'] == label]['cluster'].iloc[0]
-        if cluster_id in explanations:
-            print(f'    Explanation: {explanations[cluster_id]}')
+    if logger.isEnabledFor(logging.DEBUG):
+        # One row lookup per label, only for the diagnostics
+        for label, count in cluster_counts.items():
+            percentage = (count / total_students) * 100
+            cluster_id = df_clean[df_clean['cluster_label'] == label]['cluster'].iloc[0]
+            logger.debug('Cluster distribution: %s: %s students (%.1f%%) - %s',
+                         label, count, percentage, explanations.get(cluster_id, 'No explanation available'))
     
     # Validate cluster quality
     quality_issues = validate_cluster_quality(cluster_stats, labels, len(df_clean), silhouette_avg)
-    if quality_issues:
-        print(f'\n[!] [Python API] Cluster quality issues:')
-        for issue in quality_issues:
-            print(f'  {issue}')
+    for issue in quality_issues:
+        logger.warning('Cluster quality: %s', issue.replace('[!] ', '', 1))
     
     # Legacy validation (keep for backward compatibility)
     max_cluster_ratio = cluster_counts.max() / total_students if total_students > 0 else 0
     if max_cluster_ratio > 0.8:
-        print(f'[!] WARNING: One cluster contains {max_cluster_ratio*100:.1f}% of students.')
+        logger.warning('One cluster contains %.1f%% of students.', max_cluster_ratio * 100)
     if len(cluster_counts) == 1:
-        print(f'[!] WARNING: All students are in the same cluster.')
+        logger.warning('All students are in the same cluster.')
+    stages.lap('cluster_quality')
+    
+    # Save the fitted model so the next refresh can warm-start from it
+    if scope and kmeans is not None:
+        model_store.save_model(scope, model_store.build_model(
+            scope, features, scaler_mean, scaler_scale, pca_mean, pca_components, pca_variance,
+            kmeans, labels, explanations, silhouette_avg, len(df_clean), engine,
+            baseline_silhouette=warm_model.get('baseline_silhouette') if warm is not None else None,
+            baseline_inertia_per_sample=warm_model.get('baseline_inertia_per_sample') if warm is not None else None
+        ))
+        logger.info('Saved clustering model for scope %s', scope)
+        stages.lap('model_save')
+    
+    clusters_summary = [
+        {
+            'cluster': int(cluster_id),
+            'cluster_label': labels.get(cluster_id, str(cluster_id)),
+            'clustering_explanation': explanations.get(cluster_id),
+            'student_count': int(stats['count'])
+        }
+        for cluster_id, stats in cluster_stats.items()
+    ]
+    clustering_info = {
+        'silhouette_score': None if silhouette_avg is None else float(silhouette_avg),
+        'silhouette_strategy': silhouette_info['strategy'] if silhouette_info else None,
+        'silhouette_sample_size': silhouette_info['sample_size'] if silhouette_info else None,
+        'clustering_engine': engine,
+        'clustering_mode': clustering_mode,
+        'pca_variance': [float(v) for v in pca_variance] if pca_variance else None
+    }
+    run_info = {
+        'row_count': len(df),
+        'feature_count': len(features),
+        'features': list(features),
+        'k_tried': fit['k_tried'],
+        'chosen_k': n_clusters,
+        'threads': threads
+    }
+    metrics.inc(metrics.STUDENTS_PROCESSED, len(df_clean))
+    stages.restart()
+    
+    # Compact profile: assignment columns straight from df_clean (same rows and order as df),
+    # skipping the merge onto the wide input frame
+    if fields == 'assignments':
+        output = df_clean[list(ASSIGNMENT_COLUMNS)].copy()
+        output['student_id'] = pd.to_numeric(output['student_id'], errors='coerce').astype('Int64')
+        output.attrs['clusters'] = clusters_summary
+        output.attrs['clustering'] = clustering_info
+        output.attrs['validation'] = validation
+        output.attrs['run'] = run_info
+        stages.lap('merge')
+        logger.info('Clustering summary: %s students clustered (assignments only)', len(output))
+        return output
     
     # Merge results back to original dataframe
     df['student_id'] = pd.to_numeric(df['student_id'], errors='coerce').astype('Int64')
     df_clean['student_id'] = pd.to_numeric(df_clean['student_id'], errors='coerce').astype('Int64')
     
     # Log merge diagnostics
-    print(f'\n[*] [Python API] Merge diagnostics:')
-    print(f'   Original df student_ids: {df["student_id"].tolist()[:5]}...')
-    print(f'   Clean df student_ids: {df_clean["student_id"].tolist()[:5]}...')
-    print(f'   Original df shape: {df.shape}')
-    print(f'   Clean df shape: {df_clean.shape}')
-    print(f'   Clean df has cluster_label: {"cluster_label" in df_clean.columns}')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Merge diagnostics: original student_ids %s..., clean student_ids %s..., '
+                     'original shape %s, clean shape %s, clean has cluster_label: %s',
+                     df['student_id'].head(5).tolist(), df_clean['student_id'].head(5).tolist(),
+                     df.shape, df_clean.shape, 'cluster_label' in df_clean.columns)
     
     output = df.merge(
-        df_clean[['student_id', 'cluster', 'cluster_label', 'silhouette_score', 'clustering_explanation',
+        df_clean[['student_id', 'cluster', 'cluster_label', 'silhouette_score', 'silhouette_strategy',
+                  'silhouette_sample_size', 'clustering_engine', 'clustering_mode', 'clustering_explanation',
                   'pca_x', 'pca_y', 'pca_component_1_variance', 'pca_component_2_variance']],
         on='student_id',
         how='left'
     )
     
+    output.attrs['clusters'] = clusters_summary
+    output.attrs['clustering'] = clustering_info
+    output.attrs['validation'] = validation
+    output.attrs['run'] = run_info
+    stages.lap('merge')
+    
     # Log merge results
-    print(f'   Output shape after merge: {output.shape}')
-    print(f'   Output has cluster_label: {"cluster_label" in output.columns}')
-    clustered_after_merge = output['cluster_label'].notna().sum()
-    print(f'   Students with cluster_label after merge: {clustered_after_merge}/{len(output)}')
-    
-    # Convert NaN to None for JSON serialization
-    result = output.to_dict(orient='records')
-    for record in result:
-        for key, value in record.items():
-            # Check if value is array-like first (pd.isna can't handle arrays)
-            # This must be done BEFORE calling pd.isna() to avoid ValueError
-            is_array_like = False
-            
-            # Check for common array types
-            if isinstance(value, (list, tuple, np.ndarray, pd.Series)):
-                is_array_like = True
-            # Check for array-like objects (has length and is iterable, but not string/bytes)
-            elif hasattr(value, '__len__') and hasattr(value, '__iter__'):
-                if not isinstance(value, (str, bytes)):
-                    # Additional check: try to get size/length to confirm it's array-like
-                    try:
-                        # Check if it's a numpy array or array-like
-                        if hasattr(value, 'size') or hasattr(value, '__array__') or isinstance(value, np.ndarray):
-                            is_array_like = True
-                        # Check if it's a list/array of complex types
-                        elif len(value) > 0:
-                            # If first element is array-like, the whole thing is array-like
-                            if isinstance(value[0], (list, dict, np.ndarray, tuple)):
-                                is_array_like = True
-                        # Empty arrays are also array-like
-                        elif len(value) == 0:
-                            is_array_like = True
-                    except (TypeError, IndexError, AttributeError):
-                        # Not array-like, continue with scalar check
-                        pass
-            
-            if is_array_like:
-                # Arrays are valid data, skip NaN check
-                # Convert to list for JSON serialization if needed
-                if isinstance(value, (np.ndarray, pd.Series)):
-                    try:
-                        record[key] = value.tolist() if hasattr(value, 'tolist') else list(value)
-                    except (ValueError, TypeError):
-                        # If conversion fails, keep original (might be complex array)
-                        pass
-                elif isinstance(value, tuple):
-                    record[key] = list(value)
-                # If it's already a list, keep it as-is
-                continue
-            
-            # For scalar values, check if NaN
-            # Only call pd.isna() on non-array values
-            try:
-                if pd.isna(value):
-                    record[key] = None
-            except (ValueError, TypeError) as e:
-                # If pd.isna fails, it might be an array-like object that slipped through
-                # In this case, treat it as valid data (don't convert to None)
-                error_msg = str(e).lower()
-                if 'array' in error_msg or 'ambiguous' in error_msg:
-                    # This is an array-like object, keep it as-is
-                    pass
-                else:
-                    # Some other error, log it but don't fail
-                    print(f'[!] [Python API] Warning: Could not check NaN for key "{key}": {e}')
-        if record.get('cluster_label') is not None:
-            record['cluster_label'] = str(record['cluster_label'])
-        if record.get('silhouette_score') is not None:
-            record['silhouette_score'] = float(record['silhouette_score'])
-    
-    clustered_count = sum(1 for r in result if r.get('cluster_label') is not None)
-    print(f'\n[*] [Python API] Clustering summary: {clustered_count} students clustered')
-    if silhouette_avg is not None:
-        print(f'[*] [Python API] Overall Silhouette Score: {silhouette_avg:.4f}')
-    
-    return result
+    clustered_count = int(output['cluster_label'].notna().sum())
+    logger.debug('Merge results: output shape %s, students with cluster_label %s/%s',
+                 output.shape, clustered_count, len(output))
+    logger.info('Clustering summary: %s students clustered', clustered_count,
+                extra={'student_count': len(output), 'clustered_count': clustered_count,
+                       'silhouette_score': clustering_info['silhouette_score']})
+    
+    return output
+
+
+def cluster_records(records, engine=None, scope=None, warm_model=None):
+    """
+    Cluster student records (see cluster_frame).
+    Returns one JSON-ready dict per record.
+    """
+    output = cluster_frame(records, engine=engine, scope=scope, warm_model=warm_model)
+    with metrics.timed('serialization'):
+        return frame_to_records(output)
+
+
+def assignments_body(output):
+    """
+    Response body for ?fields=assignments:
+    {"students": [{student_id, cluster, cluster_label, pca_x, pca_y}],
+     "clusters": [{cluster, cluster_label, clustering_explanation, student_count}],
+     "silhouette_score", "silhouette_strategy", "silhouette_sample_size",
+     "clustering_engine", "clustering_mode", "pca_variance", "validation"}
+    """
+    body = {
+        'students': frame_to_records(output.reindex(columns=list(ASSIGNMENT_COLUMNS))),
+        'clusters': output.attrs.get('clusters', []),
+        'validation': output.attrs.get('validation')
+    }
+    body.update(output.attrs.get('clustering', {}))
+    return body
+
+
+def response_meta(output, timings, row_count):
+    """
+    _meta block (?meta=1) for diagnosing a request from the caller's logs:
+    {"row_count", "feature_count", "features", "k_tried", "chosen_k", "silhouette_strategy",
+     "silhouette_sample_size", "clustering_engine", "clustering_mode", "threads", "timings_ms"}
+    
+    `output` is the cluster_frame output, or None when clustering failed.
+    timings_ms holds the stages recorded so far (the final JSON encoding is only in Server-Timing);
+    responses replayed from the cache or a shared run say so in "cache" (see replayed_body).
+    """
+    attrs = output.attrs if output is not None else {}
+    run = attrs.get('run', {})
+    clustering = attrs.get('clustering', {})
+    return {
+        'row_count': run.get('row_count', row_count),
+        'feature_count': run.get('feature_count'),
+        'features': run.get('features'),
+        'k_tried': run.get('k_tried'),
+        'chosen_k': run.get('chosen_k'),
+        'silhouette_strategy': clustering.get('silhouette_strategy'),
+        'silhouette_sample_size': clustering.get('silhouette_sample_size'),
+        'clustering_engine': clustering.get('clustering_engine'),
+        'clustering_mode': clustering.get('clustering_mode'),
+        'threads': run.get('threads'),
+        'timings_ms': {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
+    }
+
+
+def assign_records(records, model):
+    """
+    Assign students to the clusters of a persisted model without refitting.
+    
+    Runs only the feature engine, the model's scaler/PCA transform and a
+    nearest-centroid lookup.
+    
+    Args:
+        records: List of student records (same format as /api/cluster)
+        model: Model from model_store (see model_store.py)
+    
+    Returns:
+        List of {student_id, cluster, cluster_label, pca_x, pca_y, distance_to_centroid}
+    """
+    df = pd.DataFrame(records)
+    if 'student_id' in df.columns:
+        df['student_id'] = pd.to_numeric(df['student_id'], errors='coerce').astype('Int64')
+    if len(df) == 0:
+        return []
+    
+    feature_df = compute_features(df)
+    for col in feature_df.columns:
+        df[col] = feature_df[col].values
+    df_clean = fill_feature_defaults(df)
+    
+    missing = [f for f in model['features'] if f not in df_clean.columns]
+    if missing:
+        raise ValueError(f'Records are missing model features: {missing}')
+    
+    # Nearest centroid in the model's scaled feature space
+    X_scaled = model_store.transform(model, df_clean)
+    centers = np.asarray(model['centers'], dtype=float)
+    distances = np.empty((len(X_scaled), len(centers)))
+    for idx, center in enumerate(centers):
+        distances[:, idx] = np.sqrt(((X_scaled - center) ** 2).sum(axis=1))
+    clusters = distances.argmin(axis=1)
+    nearest = distances[np.arange(len(X_scaled)), clusters]
+    
+    X_pca, _ = model_store.project(model, X_scaled)
+    labels = model.get('labels', {})
+    student_ids = df['student_id'] if 'student_id' in df.columns else pd.Series([None] * len(df))
+    
+    return [
+        {
+            'student_id': None if pd.isna(student_id) else int(student_id),
+            'cluster': int(cluster),
+            'cluster_label': labels.get(str(cluster), str(cluster)),
+            'pca_x': None if X_pca is None else float(X_pca[idx, 0]),
+            'pca_y': None if X_pca is None else float(X_pca[idx, 1]),
+            'distance_to_centroid': float(nearest[idx])
+        }
+        for idx, (student_id, cluster) in enumerate(zip(student_ids, clusters))
+    ]
+
+
+def error_results(records, error):
+    """Fallback response: original student IDs with no clusters and the error as explanation."""
+    if isinstance(records, pd.DataFrame):
+        student_ids = frame_to_records(records.reindex(columns=['student_id']))
+    else:
+        student_ids = records
+    return [
+        {
+            'student_id': record.get('student_id'),
+            'cluster': None,
+            'cluster_label': None,
+            'silhouette_score': None,
+            'clustering_explanation': f'Error: {str(error)}'
+        }
+        for record in student_ids
+    ]
+
+
+def wants_ndjson(req):
+    """True when the request opts into the streaming NDJSON response."""
+    if req.args.get('stream') in ('1', 'true'):
+        return True
+    return NDJSON_MIMETYPE in req.headers.get('Accept', '')
+
+
+def ndjson_lines(output, timings=None):
+    """
+    Yield one JSON line per student from the cluster_frame output, converting
+    NDJSON_CHUNK_ROWS rows at a time, then a summary line:
+    {"summary": {"student_count", "clustered_count", "silhouette_score", "cluster_distribution",
+                 "clusters", "validation"}}
+    With `timings` (?meta=1) the summary line also carries "_meta" (see response_meta).
+    
+    `output` may also be a list of records (e.g. error_results).
+    """
+    total = len(output)
+    attrs = output.attrs if isinstance(output, pd.DataFrame) else {}
+    silhouette_avg = attrs.get('clustering', {}).get('silhouette_score')
+    cluster_counts = {}
+    encode_seconds = 0.0
+    for start in range(0, total, NDJSON_CHUNK_ROWS):
+        chunk_start = time.perf_counter()
+        if isinstance(output, pd.DataFrame):
+            chunk = frame_to_records(output.iloc[start:start + NDJSON_CHUNK_ROWS])
+        else:
+            chunk = output[start:start + NDJSON_CHUNK_ROWS]
+        lines = []
+        for record in chunk:
+            label = record.get('cluster_label') or 'Not Clustered'
+            cluster_counts[label] = cluster_counts.get(label, 0) + 1
+            if silhouette_avg is None:
+                silhouette_avg = record.get('silhouette_score')
+            lines.append(encode_json(record))
+        chunk = b'\n'.join(lines) + b'\n'
+        encode_seconds += time.perf_counter() - chunk_start
+        yield chunk
+    
+    metrics.observe(metrics.STAGE_SECONDS, encode_seconds, stage='serialization')
+    summary = {'summary': {
+        'student_count': total,
+        'clustered_count': total - cluster_counts.get('Not Clustered', 0),
+        'silhouette_score': silhouette_avg,
+        'cluster_distribution': cluster_counts,
+        'clusters': attrs.get('clusters', []),
+        'validation': attrs.get('validation')
+    }}
+    if timings is not None:
+        # The generator runs after the request's timing collection ended, so add the encoding here
+        timings['serialization'] = timings.get('serialization', 0.0) + encode_seconds
+        summary['_meta'] = response_meta(output if isinstance(output, pd.DataFrame) else None, timings, total)
+    yield encode_json(summary) + b'\n'
+
+
+def stream_cluster_response(records, timings, engine=None, scope=None, warm_model=None, fields=None, meta=False):
+    """
+    /api/cluster in NDJSON form: clusters up front (so errors still fall back
+    to error_results), then streams the rows without building the full result list.
+    `timings` is the request's metrics.start_timings() dict: Server-Timing covers the
+    stages up to the first row, the summary's _meta (meta=True) also the row encoding.
+    """
+    try:
+        output = cluster_frame(records, engine=engine, scope=scope, warm_model=warm_model, fields=fields)
+    except Exception as e:
+        logger.exception('Error during clustering: %s', e)
+        metrics.inc(metrics.ERRORS, endpoint='/api/cluster')
+        output = error_results(records, e)
+    logger.info('Streaming clustering results for %s students', len(output))
+    
+    response = app.response_class(ndjson_lines(output, dict(timings) if meta else None), mimetype=NDJSON_MIMETYPE)
+    response.headers['Server-Timing'] = metrics.server_timing(timings, time.perf_counter() - g.request_start)
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+
+def _cluster_scope(scope_id, records, engine=None, in_pool=False):
+    """
+    Batch worker: cluster one scope's records (runs in a pool process).
+    
+    Errors are caught here so one failing scope does not affect the others,
+    and the fitted model is returned so the parent process can store it.
+    In a pool process (in_pool) the metrics recorded for the scope are
+    returned too, for the parent to merge into its own.
+    """
+    start = time.perf_counter()
+    try:
+        output = cluster_frame(records, engine=engine, scope=scope_id)
+        results = frame_to_records(output)
+        validation = output.attrs.get('validation')
+        error = None
+    except Exception as e:
+        logger.exception('Error clustering scope %s: %s', scope_id, e)
+        metrics.inc(metrics.ERRORS, endpoint='/api/cluster/batch')
+        results = error_results(records, e)
+        validation = None
+        error = str(e)
+    return {
+        'results': results,
+        'model': model_store.load_model(scope_id) if error is None else None,
+        'metrics': metrics.drain() if in_pool else None,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+        'student_count': len(records),
+        'validation': validation,
+        'error': error
+    }
+
+
+def get_batch_pool():
+    """
+    Process pool for /api/cluster/batch (created on first use, recreated if broken).
+    Workers are spawned, not forked: a child forked after this process ran a KMeans
+    fit (e.g. the warm-up) inherits OpenMP's thread pool state and deadlocks in its own fit.
+    """
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None or getattr(_batch_pool, '_broken', False):
+            _batch_pool = ProcessPoolExecutor(max_workers=BATCH_MAX_WORKERS,
+                                              mp_context=multiprocessing.get_context('spawn'),
+                                              initializer=thread_budget.set_process_share,
+                                              initargs=(BATCH_MAX_WORKERS,))
+        return _batch_pool
+
+
+def discard_batch_pool(pool):
+    """Stop a pool with stuck workers so the next batch gets a fresh one."""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = None
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def unwrap_envelope(data):
+    """
+    Split an optional {"records": [...], "model": {...}} request body.
+    Returns (records, model); model is None for a plain list of records.
+    """
+    if isinstance(data, dict) and 'records' in data:
+        return data.get('records'), data.get('model')
+    return data, None
+
+
+class ClusterRequestError(ValueError):
+    """Invalid /api/cluster request; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_cluster_request(req):
+    """
+    Read an /api/cluster request into a dict: data (records or columnar frame),
+    fields, want_meta, engine, scope, warm_start, caller_model, warm_model,
+    stored_model_version and cache_payload. Raises ClusterRequestError for input that cannot be clustered.
+    """
+    # JSON rows/columns, MessagePack or Arrow IPC by Content-Type (see request_formats.py)
+    try:
+        data = request_formats.read_body(req)
+    except request_formats.UnsupportedFormat as e:
+        raise ClusterRequestError(str(e), 415)
+    except ValueError as e:
+        raise ClusterRequestError(str(e))
+    
+    # Response profile: ?fields=assignments (or "fields" in the envelope) returns assignments only
+    envelope_fields = data.get('fields') if isinstance(data, dict) and 'records' in data else None
+    fields = req.args.get('fields') or envelope_fields or 'all'
+    # ?meta=1 adds the _meta block (sizes, k, silhouette strategy, stage timings)
+    want_meta = req.args.get('meta') in ('1', 'true')
+    
+    # Optional envelope: {"records": [...], "model": {...}} supplies a model to warm-start from
+    data, caller_model = unwrap_envelope(data)
+    warm_model = caller_model
+    
+    # Scope (?section_course_id=&term_id=... or ?scope=) keys the local model store;
+    # ?warm_start=1 warm-starts from the model stored for that scope
+    scope = model_store.scope_key(req.args)
+    if warm_model is None and req.args.get('warm_start') in ('1', 'true'):
+        warm_model = model_store.load_model(scope)
+        if warm_model is None:
+            logger.warning('No stored model for scope %s, running full sweep', scope)
+    
+    # Cache key material: row JSON is canonicalized, other payloads are hashed as sent
+    cache_payload = data if isinstance(data, list) else request_formats.body_digest(req)
+    if request_formats.is_columnar(data):
+        data = request_formats.columns_frame(data)
+    
+    if (data.empty if isinstance(data, pd.DataFrame) else not data):
+        logger.error('No data received in request')
+        raise ClusterRequestError('No data provided')
+    
+    if not isinstance(data, (list, pd.DataFrame)):
+        logger.error('Invalid data format. Expected list, got: %s', type(data))
+        raise ClusterRequestError('Data must be a list of student records or {column: [values]}')
+    
+    if fields not in RESPONSE_PROFILES:
+        raise ClusterRequestError(f'Unsupported fields profile {fields!r}, expected one of {list(RESPONSE_PROFILES)}')
+    
+    return {
+        'data': data,
+        'fields': fields,
+        'want_meta': want_meta,
+        # Optional engine override: ?engine=kmeans|minibatch
+        'engine': req.args.get('engine'),
+        'scope': scope,
+        'warm_start': req.args.get('warm_start'),
+        'caller_model': caller_model,
+        'warm_model': warm_model,
+        # created_at of the stored model a ?warm_start=1 request seeds from (None otherwise): a newer model changes the result
+        'stored_model_version': warm_model.get('created_at') if caller_model is None and warm_model else None,
+        'cache_payload': cache_payload
+    }
+
+
+def cluster_cache_key(parsed):
+    """Response cache key of a parse_cluster_request result (including the version of a stored warm-start model)."""
+    return response_cache.cache_key(parsed['cache_payload'], {
+        'engine': parsed['engine'],
+        'scope': parsed['scope'],
+        'warm_start': parsed['warm_start'],
+        'model': parsed['caller_model'],
+        'stored_model': parsed['stored_model_version'],
+        'fields': parsed['fields'],
+        'meta': parsed['want_meta']
+    })
+
+
+def cluster_body(parsed, timings, endpoint='/api/cluster'):
+    """
+    Cluster a parse_cluster_request result and build the /api/cluster response
+    body: the records, the assignments profile and/or the _meta block.
+    Clustering errors fall back to error_results (counted under `endpoint`).
+    Returns (body, validation, clustering_failed).
+    """
+    data, fields = parsed['data'], parsed['fields']
+    stages = metrics.StageTimer()
+    
+    # Log sample input data
+    if len(data) > 0 and logger.isEnabledFor(logging.DEBUG):
+        sample = data[0] if isinstance(data, list) else data.iloc[0].to_dict()
+        logger.debug('Sample input: student_id=%s, attendance %s%% (present %s, absent %s, late %s), score %s, '
+                     'submissions rate=%s ontime=%s late=%s missing=%s',
+                     sample.get('student_id'), sample.get('attendance_percentage'),
+                     sample.get('attendance_present_count'), sample.get('attendance_absent_count'),
+                     sample.get('attendance_late_count'), sample.get('average_score'),
+                     sample.get('submission_rate'), sample.get('submission_ontime_count'),
+                     sample.get('submission_late_count'), sample.get('submission_missing_count'))
+    
+    clustering_failed = False
+    try:
+        output = cluster_frame(data, engine=parsed['engine'], scope=parsed['scope'],
+                               warm_model=parsed['warm_model'], fields=fields)
+        validation = output.attrs.get('validation')
+        stages.restart()
+        if fields == 'assignments':
+            body = assignments_body(output)
+            results = body['students']
+        else:
+            results = body = frame_to_records(output)
+        stages.lap('serialization')
+    except Exception as e:
+        clustering_failed = True
+        logger.exception('Error during clustering: %s', e)
+        metrics.inc(metrics.ERRORS, endpoint=endpoint)
+        # Return error response with original student IDs but no clusters
+        results = body = error_results(data, e)
+        output = None
+        validation = None
+        if fields == 'assignments':
+            body = {
+                'students': [{column: record.get(column) for column in ASSIGNMENT_COLUMNS} for record in results],
+                'clusters': [],
+                'validation': None,
+                'error': f'Error: {str(e)}'
+            }
+    
+    # Log results
+    clustered_count = sum(1 for r in results if r.get('cluster_label') and r.get('cluster_label') != 'Not Clustered')
+    logger.info('Successfully clustered %s out of %s students', clustered_count, len(results))
+    
+    # Log cluster distribution
+    if logger.isEnabledFor(logging.DEBUG):
+        cluster_counts = pd.Series([r.get('cluster_label') for r in results], dtype=object).fillna('Not Clustered').value_counts().to_dict()
+        logger.debug('Cluster distribution: %s', cluster_counts)
+    
+    # _meta goes next to the students; the default list response becomes {"students": [...], "_meta": {...}}
+    if parsed['want_meta']:
+        meta = response_meta(output, timings, len(results))
+        body = dict(body, _meta=meta) if isinstance(body, dict) else {'students': body, '_meta': meta}
+    return body, validation, clustering_failed
+
+
+def cluster_response_body(parsed, cache_key, timings, endpoint='/api/cluster', bounded=True):
+    """
+    Cluster a parse_cluster_request result into the /api/cluster response bytes
+    and headers (X-Validation-Report), stored in the response cache unless
+    clustering failed or warm-started from the stored model. Returns (body bytes, headers).
+    The clustering holds an admission slot (`bounded`: see admission.acquire).
+    """
+    with admission.slot(len(parsed['data']), bounded=bounded):
+        body, validation, clustering_failed = cluster_body(parsed, timings, endpoint=endpoint)
+    # NaN/inf and NumPy values are handled by the encoder; jsonify's bytes apart from raw UTF-8 with orjson (see serialization.py)
+    with metrics.timed('encode'):
+        response_body = encode_json(body) + b'\n'
+    headers = {VALIDATION_HEADER: json.dumps(validation)} if validation is not None else {}
+    # A ?warm_start=1 run saves a newer model for its scope, which changes the key of the next
+    # such request (see cluster_cache_key): only concurrent identical requests share the run
+    warm_from_store = parsed['caller_model'] is None and parsed['warm_start'] in ('1', 'true')
+    if not clustering_failed and not warm_from_store:
+        response_cache.put(cache_key, response_body, headers=headers)
+    return response_body, headers
+
+
+def replayed_body(response_body, cache_status, want_meta):
+    """
+    Response bytes from the cache or from another request's run. With
+    `want_meta` (?meta=1) the body is decoded and its _meta block gets
+    "cache": `cache_status` (HIT or COALESCED) before it is encoded again:
+    its timings_ms are those of the run that produced the body, this request's
+    own stages are in Server-Timing. Other bodies are returned as they are.
+    """
+    if not want_meta:
+        return response_body
+    body = decode_json(response_body)
+    if isinstance(body, dict) and isinstance(body.get('_meta'), dict):
+        body['_meta']['cache'] = cache_status
+    return encode_json(body) + b'\n'
+
+
+def run_cluster_job(parsed, cache_key, timings):
+    """Job body for POST /api/cluster/jobs (runs on the jobs pool); shares runs in flight like /api/cluster."""
+    # Jobs are queued by their own pool, so they wait for a slot without the 429 limits
+    (response_body, headers), coalesced = single_flight.run(cache_key, functools.partial(
+        cluster_response_body, parsed, cache_key, timings, endpoint='/api/cluster/jobs', bounded=False))
+    if coalesced:
+        response_body = replayed_body(response_body, 'COALESCED', parsed['want_meta'])
+    return response_body, headers
+
+
+def saturated_response(error):
+    """429 with Retry-After for a request admission control turned away (admission.Saturated)."""
+    logger.warning('Rejected clustering request: %s', error)
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
 
 
 @app.route("/api/cluster", methods=["POST", "OPTIONS"])
+@profiling.profiled
 def cluster_students():
     """Enhanced clustering endpoint with detailed student data."""
     # Handle CORS preflight
@@ -1023,126 +1572,297 @@ def cluster_students():
         response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
         return response
     
-    print('[*] [Python API] Received clustering request')
+    logger.debug('Received clustering request')
+    # Stage durations of this request, for Server-Timing and ?meta=1
+    timings = metrics.start_timings()
+    stages = metrics.StageTimer()
+    try:
+        parsed = parse_cluster_request(request)
+    except ClusterRequestError as e:
+        return jsonify({'error': str(e)}), e.status
+    stages.lap('parse')
+    data = parsed['data']
+    
+    logger.info('Received %s students', len(data))
+    
+    # Streaming responses are not cached: they are meant for payloads too large to hold twice
+    if wants_ndjson(request):
+        try:
+            with admission.slot(len(data)):
+                return stream_cluster_response(data, timings, engine=parsed['engine'], scope=parsed['scope'],
+                                               warm_model=parsed['warm_model'], fields=parsed['fields'],
+                                               meta=parsed['want_meta'])
+        except admission.Saturated as e:
+            return saturated_response(e)
+    
+    # Serve identical requests from the response cache (X-Cache-Bypass: 1 forces a refresh)
+    cache_key = cluster_cache_key(parsed)
+    cache_status = 'MISS'
+    if response_cache.should_bypass(request.headers):
+        response_cache.record_bypass()
+        cache_status = 'BYPASS'
+    else:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.info('Cache hit, returning cached clustering for %s students', len(data))
+            cached_body, cached_headers = cached
+            response = app.response_class(replayed_body(cached_body, 'HIT', parsed['want_meta']), mimetype='application/json')
+            response.headers.update(cached_headers)
+            response.headers['X-Cache'] = 'HIT'
+            response.headers['Server-Timing'] = metrics.server_timing(timings, time.perf_counter() - g.request_start)
+            response.headers.add('Access-Control-Allow-Origin', '*')
+            return response
+    
+    # Concurrent identical requests share one run (see single_flight.py); forced refreshes run their own
+    compute = functools.partial(cluster_response_body, parsed, cache_key, timings)
+    try:
+        if cache_status == 'BYPASS':
+            (response_body, headers), coalesced = compute(), False
+        else:
+            (response_body, headers), coalesced = single_flight.run(cache_key, compute)
+    except admission.Saturated as e:
+        return saturated_response(e)
+    if coalesced:
+        response_body = replayed_body(response_body, 'COALESCED', parsed['want_meta'])
+    response = app.response_class(response_body, mimetype='application/json')
+    # Validation report (also in the body of the assignments profile and the NDJSON summary)
+    response.headers.update(headers)
+    response.headers['Server-Timing'] = metrics.server_timing(timings, time.perf_counter() - g.request_start)
+    response.headers['X-Cache'] = 'COALESCED' if coalesced else cache_status
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+
+@app.route("/api/cluster/jobs", methods=["POST", "OPTIONS"])
+def submit_cluster_job():
+    """
+    Run /api/cluster in the background (same body, query args and response
+    profiles; no NDJSON streaming). Answers 202 with the job; poll
+    GET /api/cluster/jobs/<id> for its progress and result.
+    """
+    # Handle CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        return response
+    
+    try:
+        parsed = parse_cluster_request(request)
+    except ClusterRequestError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    # A cached result makes the job done right away
+    cache_key = cluster_cache_key(parsed)
+    cached = None
+    if response_cache.should_bypass(request.headers):
+        response_cache.record_bypass()
+    else:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            cached = (replayed_body(cached[0], 'HIT', parsed['want_meta']), cached[1])
+    job = jobs.submit(functools.partial(run_cluster_job, parsed, cache_key), len(parsed['data']), cached=cached)
+    logger.info('Clustering job %s %s for %s students', job['id'], job['status'], len(parsed['data']))
+    
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = f'/api/cluster/jobs/{job["id"]}'
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+
+@app.route("/api/cluster/jobs/<job_id>", methods=["GET"])
+def get_cluster_job(job_id):
+    """Status, progress stage and, once done, result (the /api/cluster body) of a clustering job."""
+    job, result = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown or expired job {job_id}'}), 404
+    if result is None:
+        response = jsonify(job)
+    else:
+        # {...job, "result": <body>}: the stored response bytes are spliced in, not re-encoded
+        result_body, result_headers = result
+        response = app.response_class(encode_json(job)[:-1] + b',"result":' + result_body.rstrip(b'\n') + b'}\n',
+                                      mimetype='application/json')
+        response.headers.update(result_headers)
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+
+@app.route("/api/cluster/batch", methods=["POST", "OPTIONS"])
+def cluster_batch():
+    """
+    Cluster many scopes in one request: {scope_id: [records...], ...}.
+    Scopes run in parallel on a process pool; each scope gets its own results,
+    timing and error (a failing scope falls back like /api/cluster does).
+    """
+    # Handle CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        return response
+    
     data = request.get_json()
+    if not data or not isinstance(data, dict):
+        return jsonify({'error': 'Data must be an object of {scope_id: [student records]}'}), 400
+    invalid = [scope_id for scope_id, records in data.items() if not isinstance(records, list) or not records]
+    if invalid:
+        return jsonify({'error': f'Scopes must map to non-empty lists of student records: {invalid[:5]}'}), 400
+    
+    engine = request.args.get('engine')
+    student_count = sum(len(records) for records in data.values())
+    logger.info('Received batch clustering request: %s scopes, %s students', len(data), student_count)
+    
+    start = time.perf_counter()
+    # The whole batch holds one admission slot (its scopes are bounded by BATCH_MAX_WORKERS)
+    try:
+        admission.acquire(student_count)
+    except admission.Saturated as e:
+        return saturated_response(e)
+    try:
+        if len(data) == 1 or BATCH_MAX_WORKERS <= 1:
+            outcomes = {scope_id: _cluster_scope(scope_id, records, engine) for scope_id, records in data.items()}
+        else:
+            pool = get_batch_pool()
+            futures = {scope_id: pool.submit(_cluster_scope, scope_id, records, engine, True)
+                       for scope_id, records in data.items()}
+            deadline = time.monotonic() + BATCH_TIMEOUT_SECONDS
+            outcomes = {}
+            timed_out = False
+            for scope_id, future in futures.items():
+                try:
+                    outcomes[scope_id] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except Exception as e:
+                    if isinstance(e, TimeoutError):
+                        e = TimeoutError(f'Scope not clustered within {BATCH_TIMEOUT_SECONDS:g}s')
+                        timed_out = True
+                    # Worker process died (e.g. out of memory) or is stuck: isolate the failure to this scope
+                    logger.error('Batch worker failed for scope %s: %s', scope_id, e)
+                    metrics.inc(metrics.ERRORS, endpoint='/api/cluster/batch')
+                    outcomes[scope_id] = {
+                        'results': error_results(data[scope_id], e),
+                        'model': None,
+                        'metrics': None,
+                        'elapsed_ms': None,
+                        'student_count': len(data[scope_id]),
+                        'validation': None,
+                        'error': str(e)
+                    }
+            if timed_out:
+                discard_batch_pool(pool)
+    finally:
+        admission.release(time.perf_counter() - start)
+    
+    # Models were fitted in worker processes; keep them (and their metrics) in this process too
+    for scope_id, outcome in outcomes.items():
+        model = outcome.pop('model')
+        if model is not None:
+            model_store.save_model(scope_id, model)
+        metrics.merge(outcome.pop('metrics'))
+    
+    total_ms = round((time.perf_counter() - start) * 1000, 1)
+    failed = sum(1 for outcome in outcomes.values() if outcome['error'])
+    logger.info('Batch clustered %s scopes in %sms (%s failed)', len(outcomes), total_ms, failed)
+    
+    response = jsonify({
+        'scopes': outcomes,
+        'total_elapsed_ms': total_ms,
+        'workers': min(BATCH_MAX_WORKERS, len(data))
+    })
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+
+@app.route("/api/cluster/assign", methods=["POST", "OPTIONS"])
+def assign_students():
+    """
+    Classify students against a saved model without refitting.
+    Uses the model stored for the request scope, or {"records": [...], "model": {...}}.
+    """
+    # Handle CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        return response
     
+    data, model = unwrap_envelope(request.get_json())
     if not data:
-        print('[ERROR] [Python API] No data received in request')
         return jsonify({'error': 'No data provided'}), 400
-    
     if not isinstance(data, list):
-        print('[ERROR] [Python API] Invalid data format. Expected list, got:', type(data))
         return jsonify({'error': 'Data must be a list of student records'}), 400
     
-    print(f'ðŸ“¦ [Python API] Received {len(data)} students')
-    
-    # Log sample input data
-    if len(data) > 0:
-        sample = data[0]
-        print(f'ðŸ“‹ [Python API] Sample input: student_id={sample.get("student_id")}')
-        print(f'   Attendance: {sample.get("attendance_percentage")}% '
-              f'(Present: {sample.get("attendance_present_count")}, '
-              f'Absent: {sample.get("attendance_absent_count")}, '
-              f'Late: {sample.get("attendance_late_count")})')
-        print(f'   Score: {sample.get("average_score")}')
-        print(f'   Submissions: Rate={sample.get("submission_rate")}, '
-              f'Ontime={sample.get("submission_ontime_count")}, '
-              f'Late={sample.get("submission_late_count")}, '
-              f'Missing={sample.get("submission_missing_count")}')
+    scope = model_store.scope_key(request.args)
+    if model is None:
+        model = model_store.load_model(scope)
+    if model is None:
+        return jsonify({'error': f'No model stored for scope {scope}'}), 404
     
     try:
-        results = cluster_records(data)
+        results = assign_records(data, model)
     except Exception as e:
-        print(f'[ERROR] [Python API] Error during clustering: {str(e)}')
-        import traceback
-        print(f'[ERROR] [Python API] Traceback:')
-        traceback.print_exc()
-        # Return error response with original student IDs but no clusters
-        error_results = []
-        for record in data:
-            error_results.append({
-                'student_id': record.get('student_id'),
-                'cluster': None,
-                'cluster_label': None,
-                'silhouette_score': None,
-                'clustering_explanation': f'Error: {str(e)}'
-            })
-        results = error_results
-    
-    # Log results
-    clustered_count = sum(1 for r in results if r.get('cluster_label') and r.get('cluster_label') != 'Not Clustered')
-    print(f'[OK] [Python API] Successfully clustered {clustered_count} out of {len(results)} students')
-    
-    # Extract silhouette score from results (should be same for all)
-    silhouette_avg = None
-    if results and results[0].get('silhouette_score') is not None:
-        silhouette_avg = results[0].get('silhouette_score')
-        print(f'[*] [Python API] Silhouette Score: {silhouette_avg:.4f}')
-    
-    # Log cluster distribution
-    df_results = pd.DataFrame(results)
-    if 'cluster_label' in df_results.columns:
-        cluster_counts = df_results['cluster_label'].fillna('Not Clustered').value_counts().to_dict()
-        print(f'[*] [Python API] Cluster distribution: {cluster_counts}')
-    
-    # Clean NaN values for JSON
-    import json
-    import math
-    
-    def clean_for_json(obj):
-        """Recursively clean NaN, Infinity values from dict/list for JSON serialization"""
-        if isinstance(obj, dict):
-            return {k: clean_for_json(v) for k, v in obj.items()}
-        elif isinstance(obj, (list, np.ndarray)):
-            return [clean_for_json(item) for item in obj]
-        elif isinstance(obj, float):
-            if math.isnan(obj) or math.isinf(obj):
-                return None
-            return obj
-        elif isinstance(obj, (int, str, bool)) or obj is None:
-            return obj
-        else:
-            # Try pd.isna for pandas types, but catch errors for arrays
-            try:
-                if pd.isna(obj):
-                    return None
-            except (ValueError, TypeError):
-                # pd.isna failed (likely an array), return as-is
-                pass
-            return obj
-    
-    cleaned_results = clean_for_json(results)
+        logger.error('Error during cluster assignment: %s', e)
+        metrics.inc(metrics.ERRORS, endpoint='/api/cluster/assign')
+        return jsonify({'error': f'Assignment failed: {str(e)}'}), 400
     
-    response = jsonify(cleaned_results)
+    logger.info('Assigned %s students using model for scope %s', len(results), model.get('scope'))
+    response = jsonify(results)
     response.headers.add('Access-Control-Allow-Origin', '*')
     return response
 
 
-@app.route("/", methods=["GET"])
-def health():
-    """Healthcheck endpoint for deployment platforms"""
-    return jsonify({
-        "status": "healthy",
-        "service": "Enhanced KMeans Clustering API",
-        "version": "2.0",
-        "features": [
-            "Detailed attendance analysis (present, absent, late)",
-            "ILO-weighted scoring",
-            "Submission behavior tracking",
-            "Silhouette score calculation",
-            "Cluster explanations"
-        ]
-    }), 200
-
-
-@app.route("/health", methods=["GET"])
-def health_check():
-    """Alternative healthcheck endpoint"""
-    return jsonify({
-        "status": "healthy",
-        "service": "Enhanced KMeans Clustering API",
-        "version": "2.0"
-    }), 200
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Request latency and status per endpoint; shares this worker's metrics through METRICS_DIR."""
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if 'request_start' in g:
+        metrics.observe(metrics.REQUEST_SECONDS, time.perf_counter() - g.request_start, endpoint=endpoint)
+    metrics.inc(metrics.REQUESTS, endpoint=endpoint, status=response.status_code)
+    metrics.stop_timings()
+    metrics.schedule_flush()
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Stage latency histograms and counters in Prometheus text format (all workers with METRICS_DIR)."""
+    return app.response_class(metrics.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/api/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """Folded stacks of a profiled request (X-Profile-Id); needs the same X-Profile header."""
+    path = profiling.profile_path(profile_id) if profiling.authorized(request) else None
+    if path is None or not os.path.exists(path):
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='text/plain')
+
+
+@app.route("/api/cluster/cache", methods=["GET"])
+def cluster_cache_stats():
+    """Response cache hit/miss counters and size."""
+    return jsonify(response_cache.stats()), 200
+
+
+@app.route("/api/cluster/model", methods=["GET"])
+def get_cluster_model():
+    """Return the stored clustering model for a scope (same scope args as /api/cluster)."""
+    scope = model_store.scope_key(request.args)
+    model = model_store.load_model(scope)
+    if model is None:
+        return jsonify({'error': f'No model stored for scope {scope}'}), 404
+    response = jsonify(model)
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Benchmarks for the clustering API (run from python-cluster-api/, e.g. python -m benchmarks.bench_serialization)."""
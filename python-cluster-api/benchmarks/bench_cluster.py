@@ -0,0 +1,169 @@
+"""
+Clustering benchmark: time, peak RSS and per-stage breakdown of
+app.cluster_records and of a full POST /api/cluster (Flask test client) on
+synthetic cohorts, with a regression gate against a stored baseline.
+
+Every (target, size) runs in its own subprocess so peak RSS is per run.
+Results are written as JSON; with a baseline file present, runs slower or
+bigger than the thresholds allow are listed and the exit status is 1.
+
+    cd python-cluster-api
+    python -m benchmarks.bench_cluster                      # 50, 500, 5k, 50k, 200k students
+    python -m benchmarks.bench_cluster --sizes 50,500,5000 --save-baseline
+    python -m benchmarks.bench_cluster --sizes 50,500,5000 --max-time-regression 0.15
+"""
+import argparse
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks import report
+
+
+TARGETS = ('cluster_records', 'api_cluster')
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Sizes from here on are timed once (a 200k-student run takes minutes)
+SINGLE_RUN_FROM = 50000
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def parse_server_timing(header):
+    """{stage: ms} from a Server-Timing header value."""
+    stages = {}
+    for entry in filter(None, (part.strip() for part in header.split(','))):
+        name, _, params = entry.partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur':
+                stages[name] = float(value)
+    return stages
+
+
+def run_worker(target, n_students, repeat, seed):
+    """Time `target` on one cohort in this process; returns the result dict."""
+    from benchmarks.synthetic import generate_records
+    import app
+    import metrics
+    from serialization import encode_json
+
+    records = generate_records(n_students, seed=seed)
+    body = encode_json(records) if target == 'api_cluster' else None
+    client = app.app.test_client()
+    rss_before = peak_rss_mb()
+
+    runs = []
+    for _ in range(repeat):
+        if target == 'cluster_records':
+            timings = metrics.start_timings()
+            start = time.perf_counter()
+            app.cluster_records(records)
+            elapsed = time.perf_counter() - start
+            metrics.stop_timings()
+            stages = {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
+        else:
+            start = time.perf_counter()
+            response = client.post('/api/cluster', data=body, content_type='application/json',
+                                   headers={'X-Cache-Bypass': '1'})
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise SystemExit(f'/api/cluster returned {response.status_code} for {n_students} students')
+            stages = parse_server_timing(response.headers.get('Server-Timing', ''))
+            stages.pop('total', None)
+        runs.append((elapsed, stages))
+
+    seconds = sorted(elapsed for elapsed, _ in runs)
+    best_seconds, best_stages = min(runs, key=lambda run: run[0])
+    return {
+        'target': target,
+        'students': n_students,
+        'repeat': repeat,
+        'seconds': round(best_seconds, 4),
+        'median_seconds': round(seconds[len(seconds) // 2], 4),
+        'us_per_student': round(best_seconds / n_students * 1e6, 1),
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages_ms': best_stages
+    }
+
+
+def run_isolated(target, n_students, repeat, seed):
+    """run_worker in a fresh interpreter (quiet logs, no shared metrics dir)."""
+    env = dict(os.environ, LOG_LEVEL='ERROR')
+    env.pop('METRICS_DIR', None)
+    command = [sys.executable, '-m', 'benchmarks.bench_cluster', '--worker', target,
+               '--sizes', str(n_students), '--repeat', str(repeat), '--seed', str(seed)]
+    proc = subprocess.run(command, cwd=PACKAGE_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f'{target} at {n_students} students failed:\n{proc.stderr[-2000:]}')
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, max_time_regression, max_rss_regression, min_time_delta):
+    """Regression messages for results slower / bigger than the matching baseline entries."""
+    reference = {(entry['target'], entry['students']): entry for entry in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = reference.get((result['target'], result['students']))
+        if base is None:
+            continue
+        label = f'{result["target"]} @ {result["students"]}'
+        slower = result['seconds'] - base['seconds']
+        if result['seconds'] > base['seconds'] * (1 + max_time_regression) and slower >= min_time_delta:
+            regressions.append(f'{label}: {result["seconds"]:.3f}s vs baseline {base["seconds"]:.3f}s '
+                               f'(+{slower / base["seconds"] * 100:.0f}%, limit {max_time_regression * 100:.0f}%)')
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + max_rss_regression):
+            regressions.append(f'{label}: peak RSS {result["peak_rss_mb"]} MB vs baseline {base["peak_rss_mb"]} MB '
+                               f'(limit {max_rss_regression * 100:.0f}%)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', default='50,500,5000,50000,200000', help='Comma-separated student counts')
+    parser.add_argument('--targets', default=','.join(TARGETS), help='cluster_records and/or api_cluster')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help=f'Timing repetitions, best is reported (sizes from {SINGLE_RUN_FROM} run once)')
+    parser.add_argument('--seed', type=int, default=42, help='Synthetic cohort seed')
+    report.add_arguments(parser, 'cluster')
+    parser.add_argument('--max-time-regression', type=float, default=0.20,
+                        help='Allowed slowdown vs baseline as a fraction (default 0.20)')
+    parser.add_argument('--max-rss-regression', type=float, default=0.20,
+                        help='Allowed peak RSS growth vs baseline as a fraction (default 0.20)')
+    parser.add_argument('--min-time-delta', type=float, default=0.02,
+                        help='Slowdowns below this many seconds are never regressions (timer noise on small cohorts)')
+    parser.add_argument('--worker', choices=TARGETS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, sizes[0], args.repeat, args.seed)))
+        return
+
+    results = []
+    print(f'{"target":>16} {"students":>9} {"seconds":>9} {"us/student":>11} {"peak MB":>9}  slowest stages (ms)')
+    for n_students in sizes:
+        for target in args.targets.split(','):
+            repeat = args.repeat if n_students < SINGLE_RUN_FROM else 1
+            result = run_isolated(target, n_students, repeat, args.seed)
+            results.append(result)
+            slowest = sorted(result['stages_ms'].items(), key=lambda item: item[1], reverse=True)[:4]
+            print(f'{target:>16} {n_students:>9} {result["seconds"]:>9.3f} {result["us_per_student"]:>11} '
+                  f'{result["peak_rss_mb"]:>9}  ' + ', '.join(f'{stage}={ms}' for stage, ms in slowest))
+
+    report.finish(args, results, functools.partial(
+        compare, max_time_regression=args.max_time_regression, max_rss_regression=args.max_rss_regression,
+        min_time_delta=args.min_time_delta), seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
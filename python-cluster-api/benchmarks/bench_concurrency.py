@@ -0,0 +1,150 @@
+"""
+Concurrency benchmark: throughput and latency of POST /api/cluster with 1, 2,
+4 and 8 requests in flight at once, with the thread budget (thread_budget.py)
+on and off.
+
+Each (budget, concurrency) pair runs in a fresh process: that many client
+threads each send --requests cache-bypassing requests to app.app through
+werkzeug's test client (admission control is opened up to the concurrency so
+every request clusters right away). Reported are requests per second, median
+and p95 latency and the thread budget the requests saw (from ?meta=1).
+Results are written as JSON; with a baseline file present, throughput lower
+than the threshold allows is listed and the exit status is 1.
+
+    cd python-cluster-api
+    python -m benchmarks.bench_concurrency
+    python -m benchmarks.bench_concurrency --concurrency 1,2,4,8 --students 2000 --workers 2 --save-baseline
+
+--workers sets WEB_CONCURRENCY, i.e. how many gunicorn workers the budget
+assumes share the cores.
+"""
+import argparse
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks import report
+
+
+BUDGETS = ('on', 'off')
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker(concurrency, n_students, requests_per_client, seed):
+    """Send the requests from `concurrency` threads in this (fresh) process; returns the timings dict."""
+    from benchmarks.synthetic import generate_records
+    from werkzeug.test import Client
+    import app
+
+    body = json.dumps(generate_records(n_students, seed=seed))
+    headers = {'X-Cache-Bypass': '1'}
+    # One untimed request so imports and thread pools are initialized for every run alike
+    Client(app.app).post('/api/cluster', data=body, content_type='application/json', headers=headers)
+
+    latencies, threads, errors = [], [], []
+    barrier = threading.Barrier(concurrency + 1)
+
+    def client_loop():
+        client = Client(app.app)
+        barrier.wait()
+        for _ in range(requests_per_client):
+            request_start = time.perf_counter()
+            response = client.post('/api/cluster?meta=1', data=body, content_type='application/json',
+                                   headers=headers)
+            latencies.append(time.perf_counter() - request_start)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+            threads.append((json.loads(response.get_data())['_meta'].get('threads') or {}).get('budget'))
+
+    clients = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    for client in clients:
+        client.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise SystemExit(f'/api/cluster returned {sorted(set(errors))} at concurrency {concurrency}')
+
+    latencies.sort()
+    budgets = sorted(budget for budget in threads if budget is not None)
+    return {
+        'requests': len(latencies),
+        'elapsed_seconds': elapsed,
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_seconds': latencies[len(latencies) // 2],
+        'p95_seconds': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        'thread_budget': budgets[len(budgets) // 2] if budgets else None
+    }
+
+
+def run_isolated(budget, concurrency, args):
+    """run_worker in a fresh interpreter (quiet logs, no shared metrics or coalescing files)."""
+    env = dict(os.environ, LOG_LEVEL='ERROR', THREAD_BUDGET_ENABLED='1' if budget == 'on' else '0',
+               WEB_CONCURRENCY=str(args.workers), CLUSTER_MAX_CONCURRENT=str(concurrency),
+               CLUSTER_QUEUE_SIZE=str(concurrency))
+    for name in ('METRICS_DIR', 'SINGLE_FLIGHT_DIR', 'JOBS_DIR'):
+        env.pop(name, None)
+    command = [sys.executable, '-m', 'benchmarks.bench_concurrency', '--worker', str(concurrency),
+               '--students', str(args.students), '--requests', str(args.requests), '--seed', str(args.seed)]
+    proc = subprocess.run(command, cwd=PACKAGE_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f'budget {budget}, concurrency {concurrency} failed:\n{proc.stderr[-2000:]}')
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, max_regression):
+    """Regression messages for throughput below the matching baseline entries."""
+    reference = {(entry['budget'], entry['concurrency']): entry for entry in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = reference.get((result['budget'], result['concurrency']))
+        if base is None:
+            continue
+        if result['throughput_rps'] < base['throughput_rps'] * (1 - max_regression):
+            regressions.append(f'budget {result["budget"]}, concurrency {result["concurrency"]}: '
+                               f'{result["throughput_rps"]:.2f} req/s vs baseline {base["throughput_rps"]:.2f} '
+                               f'(limit -{max_regression * 100:.0f}%)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--concurrency', default='1,2,4,8', help='Requests in flight at once, comma separated')
+    parser.add_argument('--budgets', default=','.join(BUDGETS), help='on and/or off')
+    parser.add_argument('--students', type=int, default=2000, help='Students per request')
+    parser.add_argument('--requests', type=int, default=4, help='Requests sent by each client thread')
+    parser.add_argument('--workers', type=int, default=1, help='WEB_CONCURRENCY assumed by the budget')
+    parser.add_argument('--seed', type=int, default=42, help='Synthetic cohort seed')
+    report.add_arguments(parser, 'concurrency')
+    parser.add_argument('--max-regression', type=float, default=0.20,
+                        help='Allowed throughput drop vs baseline as a fraction (default 0.20)')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.students, args.requests, args.seed)))
+        return
+
+    results = []
+    print(f'{"budget":>6} {"concurrency":>11} {"req/s":>8} {"p50 s":>8} {"p95 s":>8} {"threads":>7}')
+    for budget in args.budgets.split(','):
+        for concurrency in (int(value) for value in args.concurrency.split(',')):
+            result = {'budget': budget, 'concurrency': concurrency, 'students': args.students,
+                      'workers': args.workers}
+            result.update(run_isolated(budget, concurrency, args))
+            results.append(result)
+            print(f'{budget:>6} {concurrency:>11} {result["throughput_rps"]:>8.2f} {result["p50_seconds"]:>8.3f} '
+                  f'{result["p95_seconds"]:>8.3f} {result["thread_budget"] or "-":>7}')
+
+    report.finish(args, results, functools.partial(compare, max_regression=args.max_regression))
+
+
+if __name__ == '__main__':
+    main()
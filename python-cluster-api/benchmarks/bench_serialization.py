@@ -0,0 +1,146 @@
+"""
+Serialization benchmark: per-student cost of turning the clustering output
+into response bytes.
+
+Compares serialization.frame_to_records + encode_json (orjson, and the stdlib
+fallback) with the per-record, per-key cleanup loop, recursive clean_for_json
+and stdlib jsonify they replaced (reproduced below as the baseline).
+
+    cd python-cluster-api
+    python -m benchmarks.bench_serialization --sizes 1000,10000,50000
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_records
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+import serialization
+from serialization import encode_json, frame_to_records
+
+
+def legacy_records(output):
+    """Previous cleanup: pd.isna per key with array-like probing, then clean_for_json."""
+    result = output.to_dict(orient='records')
+    for record in result:
+        for key, value in record.items():
+            is_array_like = False
+            if isinstance(value, (list, tuple, np.ndarray, pd.Series)):
+                is_array_like = True
+            elif hasattr(value, '__len__') and hasattr(value, '__iter__'):
+                if not isinstance(value, (str, bytes)):
+                    try:
+                        if hasattr(value, 'size') or hasattr(value, '__array__') or isinstance(value, np.ndarray):
+                            is_array_like = True
+                        elif len(value) > 0:
+                            if isinstance(value[0], (list, dict, np.ndarray, tuple)):
+                                is_array_like = True
+                        elif len(value) == 0:
+                            is_array_like = True
+                    except (TypeError, IndexError, AttributeError):
+                        pass
+            if is_array_like:
+                if isinstance(value, (np.ndarray, pd.Series)):
+                    record[key] = value.tolist()
+                elif isinstance(value, tuple):
+                    record[key] = list(value)
+                continue
+            try:
+                if pd.isna(value):
+                    record[key] = None
+            except (ValueError, TypeError):
+                pass
+        if record.get('cluster_label') is not None:
+            record['cluster_label'] = str(record['cluster_label'])
+        if record.get('silhouette_score') is not None:
+            record['silhouette_score'] = float(record['silhouette_score'])
+    return legacy_clean_for_json(result)
+
+
+def legacy_clean_for_json(obj):
+    if isinstance(obj, dict):
+        return {k: legacy_clean_for_json(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, np.ndarray)):
+        return [legacy_clean_for_json(item) for item in obj]
+    elif isinstance(obj, float):
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+        return obj
+    elif isinstance(obj, (int, str, bool)) or obj is None:
+        return obj
+    try:
+        if pd.isna(obj):
+            return None
+    except (ValueError, TypeError):
+        pass
+    return obj
+
+
+def legacy_bytes(output):
+    """Baseline response body: cleaned records through stdlib json, as jsonify wrote them."""
+    return json.dumps(legacy_records(output), sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def encoded_with(encoder, output):
+    serialization.JSON_ENCODER = encoder
+    try:
+        return encode_json(frame_to_records(output))
+    finally:
+        serialization.JSON_ENCODER = 'auto'
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', default='1000,10000,50000', help='Comma-separated student counts')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions (best is reported)')
+    args = parser.parse_args()
+
+    rows = []
+    for n_students in [int(size) for size in args.sizes.split(',')]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = app.cluster_frame(generate_records(n_students))
+        # stdlib must match byte for byte; orjson may write tiny/huge floats in other exponent notation
+        expected = legacy_bytes(output)
+        if encoded_with('stdlib', output) != expected:
+            raise SystemExit(f'stdlib output differs from the baseline at n={n_students}')
+        if json.loads(encoded_with('orjson', output)) != json.loads(expected):
+            raise SystemExit(f'orjson output differs from the baseline at n={n_students}')
+
+        legacy = best_of(lambda: legacy_bytes(output), args.repeat)
+        timings = {encoder: best_of(lambda: encoded_with(encoder, output), args.repeat)
+                   for encoder in ('orjson', 'stdlib')}
+        rows.append({
+            'students': n_students,
+            'encoder': serialization.encoder_name(),
+            'legacy_us_per_student': round(legacy / n_students * 1e6, 2),
+            'orjson_us_per_student': round(timings['orjson'] / n_students * 1e6, 2),
+            'stdlib_us_per_student': round(timings['stdlib'] / n_students * 1e6, 2),
+            'speedup': round(legacy / timings['orjson'], 1)
+        })
+
+    print(f'{"students":>10} {"legacy us/student":>18} {"orjson us/student":>18} {"stdlib us/student":>18} {"speedup":>8}')
+    for row in rows:
+        print(f'{row["students"]:>10} {row["legacy_us_per_student"]:>18} {row["orjson_us_per_student"]:>18} '
+              f'{row["stdlib_us_per_student"]:>18} {row["speedup"]:>7}x')
+    print(json.dumps(rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Startup benchmark: import time, time to the first health check and latency
+of the first /api/cluster requests in a fresh interpreter, for each way the
+service can boot:
+
+- eager: gunicorn app:app (everything imported up front, no warm-up)
+- lazy: gunicorn 'startup:create_app()' with WARMUP=0 (app.py imported by the first request)
+- warm: gunicorn 'startup:create_app()' (warm-up at boot; the request is sent once /ready is 200)
+
+Every run is a new subprocess; the median over --runs is reported. Results
+are written as JSON; with a baseline file present, metrics slower than the
+threshold allows are listed and the exit status is 1.
+
+    cd python-cluster-api
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --students 500 --save-baseline
+"""
+import argparse
+import functools
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks import report
+
+
+MODES = ('eager', 'lazy', 'warm')
+METRICS = ('boot_seconds', 'first_health_seconds', 'ready_seconds', 'first_request_seconds', 'second_request_seconds')
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker(mode, n_students, seed):
+    """Boot the service in this (fresh) process the `mode` way; returns the timings dict."""
+    from benchmarks.synthetic import generate_records
+    from werkzeug.test import Client
+
+    body = json.dumps(generate_records(n_students, seed=seed))
+    start = time.perf_counter()
+    if mode == 'eager':
+        import app
+        client = Client(app.app)
+    else:
+        import startup
+        client = Client(startup.create_app())
+    boot = time.perf_counter() - start
+
+    client.get('/health')
+    first_health = time.perf_counter() - start
+    if mode == 'warm':
+        while client.get('/ready').status_code == 503:
+            time.sleep(0.01)
+    ready = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(2):
+        request_start = time.perf_counter()
+        response = client.post('/api/cluster', data=body, content_type='application/json',
+                               headers={'X-Cache-Bypass': '1'})
+        latencies.append(time.perf_counter() - request_start)
+        if response.status_code != 200:
+            raise SystemExit(f'/api/cluster returned {response.status_code} ({mode})')
+    return {
+        'boot_seconds': boot,
+        'first_health_seconds': first_health,
+        'ready_seconds': ready,
+        'first_request_seconds': latencies[0],
+        'second_request_seconds': latencies[1]
+    }
+
+
+def run_isolated(mode, n_students, seed):
+    """run_worker in a fresh interpreter (quiet logs, no shared metrics dir)."""
+    env = dict(os.environ, LOG_LEVEL='ERROR', WARMUP='0' if mode == 'lazy' else '1')
+    env.pop('METRICS_DIR', None)
+    command = [sys.executable, '-m', 'benchmarks.bench_startup', '--worker', mode,
+               '--students', str(n_students), '--seed', str(seed)]
+    proc = subprocess.run(command, cwd=PACKAGE_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f'{mode} startup failed:\n{proc.stderr[-2000:]}')
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, max_regression, min_delta):
+    """Regression messages for metrics slower than the matching baseline entries."""
+    reference = {entry['mode']: entry for entry in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = reference.get(result['mode'])
+        if base is None:
+            continue
+        for metric in METRICS:
+            slower = result[metric] - base[metric]
+            if result[metric] > base[metric] * (1 + max_regression) and slower >= min_delta:
+                regressions.append(f'{result["mode"]} {metric}: {result[metric]:.3f}s vs baseline '
+                                   f'{base[metric]:.3f}s (limit {max_regression * 100:.0f}%)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--modes', default=','.join(MODES), help='eager, lazy and/or warm')
+    parser.add_argument('--runs', type=int, default=3, help='Fresh processes per mode, median is reported')
+    parser.add_argument('--students', type=int, default=500, help='Students in the /api/cluster requests')
+    parser.add_argument('--seed', type=int, default=42, help='Synthetic cohort seed')
+    report.add_arguments(parser, 'startup')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='Allowed slowdown vs baseline as a fraction (default 0.25)')
+    parser.add_argument('--min-delta', type=float, default=0.1,
+                        help='Slowdowns below this many seconds are never regressions')
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.students, args.seed)))
+        return
+
+    results = []
+    print(f'{"mode":>6} ' + ' '.join(f'{metric.replace("_seconds", ""):>15}' for metric in METRICS))
+    for mode in args.modes.split(','):
+        runs = [run_isolated(mode, args.students, args.seed) for _ in range(args.runs)]
+        result = {'mode': mode, 'students': args.students, 'runs': args.runs}
+        for metric in METRICS:
+            result[metric] = round(sorted(run[metric] for run in runs)[len(runs) // 2], 4)
+        results.append(result)
+        print(f'{mode:>6} ' + ' '.join(f'{result[metric]:>15.3f}' for metric in METRICS))
+
+    report.finish(args, results, functools.partial(compare, max_regression=args.max_regression,
+                                                    min_delta=args.min_delta))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Results file and baseline gate shared by the benchmarks that keep one
+(bench_cluster, bench_startup, bench_concurrency): each adds the options
+with add_arguments and hands its results and its own compare() to finish.
+
+finish writes {"created_at", "python", "platform", "cpu_count", ..., "results"}
+to --output, compares with --baseline when that file exists (compare(results,
+baseline) returns one message per regression), writes the baseline with
+--save-baseline and exits with status 1 on regressions.
+"""
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+
+def add_arguments(parser, name):
+    """--output, --baseline and --save-baseline, defaulting to benchmarks/<name>_results.json / _baseline.json."""
+    parser.add_argument('--output', default=os.path.join('benchmarks', f'{name}_results.json'),
+                        help='Where to write the results JSON')
+    parser.add_argument('--baseline', default=os.path.join('benchmarks', f'{name}_baseline.json'),
+                        help='Baseline results JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Also write the results as the new baseline')
+
+
+def finish(args, results, compare, **fields):
+    """Write the report, gate it against the baseline and exit 1 on regressions (`fields` go before results)."""
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        **fields,
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline)
+        print(f'Compared with {args.baseline} ({baseline.get("created_at")}): '
+              f'{len(regressions) or "no"} regression(s)')
+        for regression in regressions:
+            print(f'  REGRESSION {regression}')
+    else:
+        print(f'No baseline at {args.baseline} (record one with --save-baseline)')
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline written to {args.baseline}')
+    if regressions:
+        sys.exit(1)
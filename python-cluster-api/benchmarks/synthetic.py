@@ -0,0 +1,82 @@
+"""
+Synthetic Student Records
+=========================
+Records shaped like the backend's normalizeStudentData output
+(backend/services/clusteringService.js): attendance and submission counts and
+nested assessment_scores_by_ilo (transmuted scores weighted like the
+backend's). A few values are null and a few optional fields are left out
+entirely, so the default-filling paths are exercised.
+"""
+import random
+
+
+# Fields the backend can leave out (no sessions/assessments recorded yet)
+OPTIONAL_FIELDS = (
+    'attendance_late_count',
+    'attendance_total_sessions',
+    'submission_late_count',
+    'submission_total_assessments',
+    'average_submission_status_score'
+)
+
+
+def generate_records(n_students, seed=42, n_ilos=4, assessments_per_ilo=3, missing_field_rate=0.02):
+    """
+    Generate n_students /api/cluster records.
+
+    Students are drawn from three behaviour profiles (strong, average,
+    struggling) so the clustering has structure to find. Each of
+    OPTIONAL_FIELDS is dropped from a record with probability missing_field_rate.
+    """
+    rng = random.Random(seed)
+    profiles = [
+        # attendance, score, ontime share, missing share
+        (0.95, 90.0, 0.90, 0.02),
+        (0.80, 78.0, 0.65, 0.10),
+        (0.60, 62.0, 0.35, 0.30),
+    ]
+    records = []
+    for idx in range(n_students):
+        attendance, score, ontime_share, missing_share = rng.choice(profiles)
+        total_sessions = rng.choice([20, 30, 40])
+        present = min(total_sessions, max(0, int(rng.gauss(attendance, 0.08) * total_sessions)))
+        late = rng.randint(0, total_sessions - present)
+        total_assessments = n_ilos * assessments_per_ilo
+        missing = min(total_assessments, max(0, int(rng.gauss(missing_share, 0.05) * total_assessments)))
+        ontime = min(total_assessments - missing, max(0, int(rng.gauss(ontime_share, 0.1) * total_assessments)))
+        late_submissions = total_assessments - missing - ontime
+
+        ilos = []
+        for ilo in range(n_ilos):
+            assessments = [
+                {
+                    'assessment_id': ilo * assessments_per_ilo + a + 1,
+                    'transmuted_score': None if rng.random() < missing_share else round(
+                        min(100.0, max(0.0, rng.gauss(score, 8.0))) / 100 * 25, 2),
+                    'weight_percentage': 25.0
+                }
+                for a in range(assessments_per_ilo)
+            ]
+            ilos.append({'ilo_id': ilo + 1, 'ilo_code': f'ILO{ilo + 1}', 'assessments': assessments})
+
+        record = {
+            'student_id': idx + 1,
+            'attendance_percentage': round(100.0 * (present + late) / total_sessions, 2),
+            'attendance_present_count': present,
+            'attendance_absent_count': total_sessions - present - late,
+            'attendance_late_count': late,
+            'attendance_total_sessions': total_sessions,
+            'average_score': None if rng.random() < 0.03 else round(min(100.0, max(0.0, rng.gauss(score, 6.0))), 2),
+            'assessment_scores_by_ilo': ilos if rng.random() > 0.05 else None,
+            'submission_rate': round((ontime + late_submissions) / total_assessments, 4),
+            'submission_ontime_count': ontime,
+            'submission_late_count': late_submissions,
+            'submission_missing_count': missing,
+            'submission_total_assessments': total_assessments,
+            'average_submission_status_score': round(rng.uniform(0.5, 2.0), 3)
+        }
+        for field in OPTIONAL_FIELDS:
+            if rng.random() < missing_field_rate:
+                del record[field]
+        records.append(record)
+    return records
@@ -0,0 +1,258 @@
+"""
+Columnar Feature Engine
+=======================
+Whole-column versions of calculate_attendance_features,
+calculate_submission_features and calculate_score_features, the row-wise
+functions cluster_records used to apply per student (kept in
+tests/rowwise_features.py as the reference for tests/test_features.py).
+
+Instead of building a Python dict per student through df.apply(..., axis=1),
+every feature is computed once per column with NumPy. The fallbacks are the
+same as the row-wise functions:
+- attendance_percentage defaults to 75% when no attendance data is sent
+- percentage-only attendance is split 85% present / 15% late
+- students with zero assessments get missing_rate=1.0 and zero scores
+- average_score defaults to 50 when missing
+"""
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_ATTENDANCE_PERCENTAGE = 75.0
+ESTIMATED_PRESENT_SHARE = 0.85  # Share of attendance assumed to be "present"
+ESTIMATED_LATE_SHARE = 0.15     # Share of attendance assumed to be "late"
+DEFAULT_AVERAGE_SCORE = 50.0
+
+
+def _column(df, name, default):
+    """
+    Return a column as a float64 array.
+    Missing columns are filled with `default`, unparseable values become NaN
+    (same as row.get(name, default) followed by float()).
+    """
+    if name not in df.columns:
+        return np.full(len(df), default, dtype=float)
+    return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+
+def _fill_nan(values, default):
+    """Replace NaN with `default` (inf is kept, like pd.notna)."""
+    return np.where(np.isnan(values), default, values)
+
+
+def _divide_where(numerator, denominator, mask, default):
+    """numerator / denominator where mask is True, `default` elsewhere."""
+    safe_denominator = np.where(mask, denominator, 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(mask, numerator / safe_denominator, default)
+
+
+def compute_attendance_features(df):
+    """
+    Columnar calculate_attendance_features.
+    Uses detailed counts when present_count and total_sessions are both set,
+    otherwise estimates rates from attendance_percentage.
+    """
+    present = _column(df, 'attendance_present_count', np.nan)
+    total = _column(df, 'attendance_total_sessions', np.nan)
+    absent = _column(df, 'attendance_absent_count', 0.0)
+    late = _column(df, 'attendance_late_count', 0.0)
+
+    detailed = ~np.isnan(present) & ~np.isnan(total)
+    has_sessions = detailed & (total > 0)
+
+    # Detailed counts (late counts as half present)
+    detailed_percentage = _divide_where(present + late * 0.5, total, has_sessions, 0.0) * 100
+    detailed_present_rate = _divide_where(present, total, has_sessions, 0.0)
+    detailed_absent_rate = _divide_where(absent, total, has_sessions, 0.0)
+    detailed_late_rate = _divide_where(late, total, has_sessions, 0.0)
+
+    # Fallback: estimate rates from the percentage
+    percentage = _column(df, 'attendance_percentage', DEFAULT_ATTENDANCE_PERCENTAGE)
+    estimated_present_rate = percentage / 100 * ESTIMATED_PRESENT_SHARE
+    estimated_absent_rate = (100 - percentage) / 100
+    estimated_late_rate = percentage / 100 * ESTIMATED_LATE_SHARE
+
+    return {
+        'attendance_percentage': np.where(detailed, detailed_percentage, percentage),
+        'attendance_present_rate': np.where(detailed, detailed_present_rate, estimated_present_rate),
+        'attendance_absent_rate': np.where(detailed, detailed_absent_rate, estimated_absent_rate),
+        'attendance_late_rate': np.where(detailed, detailed_late_rate, estimated_late_rate)
+    }
+
+
+def compute_submission_features(df):
+    """
+    Columnar calculate_submission_features.
+    Missing counts are treated as 0; students without assessments get
+    missing_rate=1.0 and zero rates/scores.
+    """
+    ontime_count = _fill_nan(_column(df, 'submission_ontime_count', np.nan), 0.0)
+    late_count = _fill_nan(_column(df, 'submission_late_count', np.nan), 0.0)
+    missing_count = _fill_nan(_column(df, 'submission_missing_count', np.nan), 0.0)
+    total_assessments = _fill_nan(_column(df, 'submission_total_assessments', np.nan), 0.0)
+
+    has_assessments = total_assessments > 0
+    total_submissions = ontime_count + late_count
+    # ontime=2, late=1, missing=0 (higher is better), same formula for status and quality;
+    # an infinite missing count gives NaN like the row-wise path (inf * 0), without the warning
+    with np.errstate(invalid='ignore'):
+        weighted_status = ontime_count * 2.0 + late_count * 1.0 + missing_count * 0.0
+    status_score = _divide_where(weighted_status, total_assessments, has_assessments, 0.0)
+
+    return {
+        'submission_ontime_count': ontime_count,
+        'submission_late_count': late_count,
+        'submission_missing_count': missing_count,
+        'submission_total_assessments': total_assessments,
+        'submission_rate': _divide_where(total_submissions, total_assessments, has_assessments, 0.0),
+        'submission_ontime_rate': _divide_where(ontime_count, total_assessments, has_assessments, 0.0),
+        'submission_late_rate': _divide_where(late_count, total_assessments, has_assessments, 0.0),
+        'submission_missing_rate': _divide_where(missing_count, total_assessments, has_assessments, 1.0),
+        'submission_status_score': status_score,
+        'submission_quality_score': status_score.copy(),
+        'submission_ontime_priority_score': _divide_where(ontime_count, total_assessments, has_assessments, 0.0) * 100.0
+    }
+
+
+def _as_float(value, default):
+    """float(value), or `default` when the value cannot be converted."""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def flatten_ilo_assessments(payloads):
+    """
+    Explode every student's assessment_scores_by_ilo into flat arrays in one pass.
+
+    Args:
+        payloads: Iterable of assessment_scores_by_ilo values, one per student
+                  (list of ILO dicts, a single ILO dict, or anything else = no data)
+
+    Returns:
+        dict of equal-length arrays, one element per assessment:
+        - student: row position of the student
+        - entry: position of the ILO entry the assessment belongs to
+        - ilo_key: output column name ('ilo_{ilo_id}_score')
+        - transmuted_score: float, NaN when missing or not numeric
+    weight_percentage is not read: the ILO average is a simple average of the
+    transmuted scores (which already carry the weights).
+    """
+    students, entries, keys, scores = [], [], [], []
+    entry = 0
+    for student, payload in enumerate(payloads):
+        if not isinstance(payload, (list, dict)) or not payload:
+            continue
+        for ilo_data in (payload if isinstance(payload, list) else [payload]):
+            if not isinstance(ilo_data, dict):
+                continue
+            ilo_id = ilo_data.get('ilo_id')
+            assessments = ilo_data.get('assessments', [])
+            if not ilo_id or not isinstance(assessments, (list, tuple)):
+                continue
+            key = f'ilo_{ilo_id}_score'
+            for assessment in assessments:
+                if not isinstance(assessment, dict):
+                    continue
+                students.append(student)
+                entries.append(entry)
+                keys.append(key)
+                scores.append(_as_float(assessment.get('transmuted_score'), np.nan))
+            entry += 1
+
+    return {
+        'student': np.array(students, dtype=np.intp),
+        'entry': np.array(entries, dtype=np.intp),
+        'ilo_key': np.array(keys, dtype=object),
+        'transmuted_score': np.array(scores, dtype=float)
+    }
+
+
+def ilo_score_matrix(flat, n_students):
+    """
+    Average transmuted score per student and ILO from flattened assessments.
+
+    Only non-negative scores count. When a student lists the same ILO twice,
+    the column keeps its first position and the last entry's average (same as
+    updating a per-student dict).
+
+    Returns:
+        columns: ilo_*_score column names in first-seen order
+        matrix: (n_students, len(columns)) float array, NaN where a student has no score
+        groups: (student, column, average) arrays ordered by each student's first-seen ILO order
+    """
+    valid = flat['transmuted_score'] >= 0  # False for NaN
+    if not valid.any():
+        empty = np.array([], dtype=np.intp)
+        return [], np.empty((n_students, 0)), (empty, empty, np.array([], dtype=float))
+
+    entry = flat['entry'][valid]
+    scores = flat['transmuted_score'][valid]
+    codes, columns = pd.factorize(flat['ilo_key'][valid])
+
+    # Per-entry averages (only entries with at least one valid score)
+    scored_entries, first = np.unique(entry, return_index=True)
+    n_entries = scored_entries[-1] + 1
+    sums = np.bincount(entry, weights=scores, minlength=n_entries)[scored_entries]
+    counts = np.bincount(entry, minlength=n_entries)[scored_entries]
+    averages = sums / counts
+    entry_student = flat['student'][valid][first]
+    entry_code = codes[first]
+
+    # One value per (student, ILO): first entry fixes the order, last entry wins
+    group = entry_student * len(columns) + entry_code
+    _, first_pos = np.unique(group, return_index=True)
+    _, reversed_pos = np.unique(group[::-1], return_index=True)
+    last_pos = len(group) - 1 - reversed_pos
+    order = np.argsort(first_pos, kind='stable')
+    group_student = entry_student[first_pos][order]
+    group_code = entry_code[first_pos][order]
+    group_average = averages[last_pos][order]
+
+    matrix = np.full((n_students, len(columns)), np.nan)
+    matrix[group_student, group_code] = group_average
+    return list(columns), matrix, (group_student, group_code, group_average)
+
+
+def compute_score_features(df):
+    """
+    Columnar calculate_score_features.
+    final_score is the mean of positive ILO averages when available,
+    otherwise the syllabus-weighted average_score (default 50).
+    """
+    n_students = len(df)
+    average_score = _fill_nan(_column(df, 'average_score', np.nan), DEFAULT_AVERAGE_SCORE)
+
+    payloads = df['assessment_scores_by_ilo'] if 'assessment_scores_by_ilo' in df.columns else []
+    ilo_columns, ilo_matrix, (group_student, _, group_average) = ilo_score_matrix(
+        flatten_ilo_assessments(payloads), n_students
+    )
+
+    # ILO-based score: mean of each student's positive ILO averages
+    positive = group_average > 0
+    ilo_sum = np.bincount(group_student[positive], weights=group_average[positive], minlength=n_students)
+    ilo_count = np.bincount(group_student[positive], minlength=n_students)
+    ilo_based_score = _divide_where(ilo_sum, ilo_count, ilo_count > 0, average_score)
+
+    result = {
+        'average_score': average_score,
+        'final_score': ilo_based_score.copy(),
+        'ilo_based_score': ilo_based_score
+    }
+    for idx, col in enumerate(ilo_columns):
+        result[col] = ilo_matrix[:, idx]
+    return result
+
+
+def compute_features(df):
+    """
+    Compute all attendance, submission and score features for `df`.
+    Returns a DataFrame aligned with df.index, one column per feature.
+    """
+    features = {}
+    features.update(compute_attendance_features(df))
+    features.update(compute_submission_features(df))
+    features.update(compute_score_features(df))
+    return pd.DataFrame(features, index=df.index)
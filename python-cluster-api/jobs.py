@@ -0,0 +1,258 @@
+"""
+Clustering Jobs
+===============
+Background runs of /api/cluster for payloads that outlive the caller's
+request timeout: POST /api/cluster/jobs answers at once with a job id, the
+clustering runs on a bounded thread pool, and GET /api/cluster/jobs/<id>
+reports its status, progress stage and, once done, the result. A caller
+whose own deadline passed comes back for the result instead of recomputing.
+
+A job is a dict:
+- id, status: queued | running | done | failed
+- stage: last pipeline stage completed (stage names as in Server-Timing)
+- student_count, created_at / started_at / finished_at (UTC ISO), elapsed_ms
+- error: set when the job failed
+Its result, the response bytes and headers, is kept next to it.
+
+Jobs are kept in the memory of the worker that accepted them until
+JOBS_TTL_SECONDS after they finish. Results in memory are capped at
+JOBS_MAX_RESULT_BYTES: over it the finished jobs whose results were read
+least recently are dropped early (like response_cache evicts). With JOBS_DIR
+set each job and its result are also written to <JOBS_DIR>/<id>.json and
+<id>.body, so any gunicorn worker can answer for them, dropped ones included
+(the stage of a running job is then only current on the worker running it).
+Without JOBS_DIR a dropped job is gone (404), and a job whose result alone is
+over the cap fails.
+
+Environment variables:
+- JOBS_MAX_WORKERS: jobs clustered at a time per worker (default 1)
+- JOBS_TTL_SECONDS: how long finished jobs and their results are kept (default 900)
+- JOBS_MAX_RESULT_BYTES: memory cap for the results of finished jobs (default 64 MB)
+- JOBS_DIR: directory shared by the gunicorn workers (unset: jobs are per worker)
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import metrics
+
+
+logger = logging.getLogger('cluster_api.jobs')
+
+JOBS_MAX_WORKERS = int(os.environ.get('JOBS_MAX_WORKERS', '1'))
+JOBS_TTL_SECONDS = float(os.environ.get('JOBS_TTL_SECONDS', '900'))
+JOBS_MAX_RESULT_BYTES = int(os.environ.get('JOBS_MAX_RESULT_BYTES', str(64 * 1024 * 1024)))
+JOBS_DIR = os.environ.get('JOBS_DIR')
+
+FINISHED = ('done', 'failed')
+
+# Job ids are uuid4 hex; anything else is never looked up on disk
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+_jobs = {}  # id -> job dict
+_results = OrderedDict()  # id -> (body bytes, headers) of finished jobs, least recently read first
+_result_bytes = 0
+_timings = {}  # id -> stage timings of running jobs
+_expires = {}  # id -> time.monotonic() after which a finished job is dropped
+_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=JOBS_MAX_WORKERS, thread_name_prefix='cluster-job')
+        return _pool
+
+
+def _path(job_id, suffix):
+    return os.path.join(JOBS_DIR, f'{job_id}{suffix}')
+
+
+def _persist(job, result=None):
+    """Write the job (and its result) to JOBS_DIR (no-op when unset)."""
+    if not JOBS_DIR:
+        return
+    try:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        entry = dict(job)
+        if result is not None:
+            body, entry['headers'] = result
+            with open(_path(job['id'], '.body.tmp'), 'wb') as f:
+                f.write(body)
+            os.replace(_path(job['id'], '.body.tmp'), _path(job['id'], '.body'))
+        with open(_path(job['id'], '.json.tmp'), 'w') as f:
+            json.dump(entry, f)
+        os.replace(_path(job['id'], '.json.tmp'), _path(job['id'], '.json'))
+    except OSError as e:
+        logger.warning('Could not persist job %s: %s', job['id'], e)
+
+
+def _load(job_id):
+    """(job, result) from JOBS_DIR, or (None, None) when absent or expired."""
+    if not JOBS_DIR or not _JOB_ID.match(job_id) or not os.path.exists(_path(job_id, '.json')):
+        return None, None
+    try:
+        with open(_path(job_id, '.json')) as f:
+            job = json.load(f)
+        headers = job.pop('headers', None)
+        if job['status'] not in FINISHED:
+            return job, None
+        if time.time() - os.path.getmtime(_path(job_id, '.json')) > JOBS_TTL_SECONDS:
+            return None, None
+        if headers is None:
+            return job, None
+        with open(_path(job_id, '.body'), 'rb') as f:
+            return job, (f.read(), headers)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning('Could not read job %s from %s: %s', job_id, JOBS_DIR, e)
+        return None, None
+
+
+def _forget(job_id):
+    """Drop a finished job from memory (called with _lock held)."""
+    global _result_bytes
+    _jobs.pop(job_id, None)
+    _expires.pop(job_id, None)
+    result = _results.pop(job_id, None)
+    if result is not None:
+        _result_bytes -= len(result[0])
+
+
+def _keep_result(job_id, result):
+    """
+    Hold a finished job's result in memory, dropping the least recently read
+    finished jobs over JOBS_MAX_RESULT_BYTES (called with _lock held).
+    """
+    global _result_bytes
+    if len(result[0]) > JOBS_MAX_RESULT_BYTES:
+        # Only on disk (JOBS_DIR): get() reads it from there
+        _forget(job_id)
+        return
+    _results[job_id] = result
+    _result_bytes += len(result[0])
+    while _result_bytes > JOBS_MAX_RESULT_BYTES:
+        evicted = next(iter(_results))
+        _forget(evicted)
+        logger.info('Dropped clustering job %s from memory (JOBS_MAX_RESULT_BYTES)', evicted)
+
+
+def purge():
+    """Drop finished jobs older than JOBS_TTL_SECONDS (memory, and files in JOBS_DIR)."""
+    now = time.monotonic()
+    with _lock:
+        for job_id in [job_id for job_id, expires in _expires.items() if expires <= now]:
+            _forget(job_id)
+    if JOBS_DIR and os.path.isdir(JOBS_DIR):
+        cutoff = time.time() - JOBS_TTL_SECONDS
+        for entry in os.scandir(JOBS_DIR):
+            try:
+                # A running job's file is rewritten when it finishes, so only finished jobs get this old
+                if entry.name.endswith(('.json', '.body')) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def _too_large(result):
+    """Error for a result over JOBS_MAX_RESULT_BYTES with nowhere else to keep it (no JOBS_DIR), else None."""
+    if JOBS_DIR or len(result[0]) <= JOBS_MAX_RESULT_BYTES:
+        return None
+    return f'Result of {len(result[0])} bytes is over JOBS_MAX_RESULT_BYTES ({JOBS_MAX_RESULT_BYTES})'
+
+
+def _run(job, fn):
+    start = time.perf_counter()
+    timings = metrics.start_timings()
+    with _lock:
+        job.update(status='running', started_at=_now())
+        _timings[job['id']] = timings
+    _persist(job)
+    result, error = None, None
+    try:
+        result = fn(timings)
+    except Exception as e:
+        logger.exception('Clustering job %s failed: %s', job['id'], e)
+        error = str(e)
+    finally:
+        metrics.stop_timings()
+    if result is not None:
+        error = _too_large(result)
+        if error:
+            logger.error('Clustering job %s failed: %s', job['id'], error)
+            result = None
+    with _lock:
+        job.update(status='failed' if error else 'done', stage=list(timings)[-1] if timings else None,
+                   finished_at=_now(), elapsed_ms=round((time.perf_counter() - start) * 1000, 1), error=error)
+        del _timings[job['id']]
+        _expires[job['id']] = time.monotonic() + JOBS_TTL_SECONDS
+        finished = dict(job)
+        if result is not None:
+            _keep_result(job['id'], result)
+    _persist(finished, result)
+    metrics.schedule_flush()
+    logger.info('Clustering job %s %s in %.0f ms', job['id'], job['status'], job['elapsed_ms'])
+
+
+def submit(fn, student_count, cached=None):
+    """
+    Queue fn(timings) on the job pool; it returns the result (body bytes, headers)
+    and records its stages in `timings`. With `cached` (an existing result) the
+    job is stored as done right away. Returns a copy of the job dict.
+    """
+    purge()
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': 'queued',
+        'stage': None,
+        'student_count': student_count,
+        'created_at': _now(),
+        'started_at': None,
+        'finished_at': None,
+        'elapsed_ms': None,
+        'error': None
+    }
+    error = _too_large(cached) if cached is not None else None
+    with _lock:
+        _jobs[job['id']] = job
+        if cached is not None:
+            job.update(status='failed' if error else 'done', started_at=job['created_at'],
+                       finished_at=job['created_at'], elapsed_ms=0.0, error=error)
+            _expires[job['id']] = time.monotonic() + JOBS_TTL_SECONDS
+            if not error:
+                _keep_result(job['id'], cached)
+        submitted = dict(job)
+    _persist(submitted, None if error else cached)
+    if cached is None:
+        _get_pool().submit(_run, job, fn)
+    return submitted
+
+
+def get(job_id):
+    """(job dict, result) for a job; result is (body bytes, headers) once done. (None, None) if unknown or expired."""
+    purge()
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job = dict(job)
+            timings = _timings.get(job_id)
+            if timings:
+                job['stage'] = list(timings)[-1]
+            if job_id in _results:
+                _results.move_to_end(job_id)
+            return job, _results.get(job_id)
+    return _load(job_id)
+
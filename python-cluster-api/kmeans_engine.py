@@ -0,0 +1,70 @@
+"""
+KMeans Engines
+==============
+Full-batch KMeans is fine for one section but slow for term-wide or
+program-wide runs (no section_course_id). Above KMEANS_MINIBATCH_THRESHOLD
+rows the clustering switches to MiniBatchKMeans, which reports inertia_,
+labels_ and cluster_centers_ the same way.
+
+Environment variables:
+- KMEANS_ENGINE: auto (default), kmeans or minibatch
+- KMEANS_MINIBATCH_THRESHOLD: rows above which auto uses minibatch (default 10000)
+- KMEANS_MINIBATCH_BATCH_SIZE: mini-batch size (default 2048)
+- KMEANS_MINIBATCH_N_INIT: number of restarts for minibatch (default 3)
+"""
+import os
+
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+
+KMEANS_ENGINE = os.environ.get('KMEANS_ENGINE', 'auto').strip().lower()
+KMEANS_MINIBATCH_THRESHOLD = int(os.environ.get('KMEANS_MINIBATCH_THRESHOLD', '10000'))
+KMEANS_MINIBATCH_BATCH_SIZE = int(os.environ.get('KMEANS_MINIBATCH_BATCH_SIZE', '2048'))
+KMEANS_MINIBATCH_N_INIT = int(os.environ.get('KMEANS_MINIBATCH_N_INIT', '3'))
+
+ENGINES = ('kmeans', 'minibatch')
+
+
+def choose_engine(n_samples, engine=None):
+    """
+    Pick the KMeans engine for n_samples.
+    An explicit engine (argument or KMEANS_ENGINE) wins over the row threshold.
+    """
+    engine = (engine or KMEANS_ENGINE or 'auto').strip().lower()
+    if engine in ENGINES:
+        return engine
+    return 'minibatch' if n_samples > KMEANS_MINIBATCH_THRESHOLD else 'kmeans'
+
+
+def build_kmeans(n_clusters, engine='kmeans', random_state=42, init=None):
+    """
+    Unfitted estimator for the given engine, with k-means++ initialization.
+
+    Args:
+        n_clusters: Number of clusters
+        engine: 'kmeans' (full batch, 10 restarts) or 'minibatch'
+        random_state: Seed (default: 42)
+        init: Initial centers for a warm start (single restart instead of k-means++)
+    """
+    if init is not None:
+        if engine == 'minibatch':
+            return MiniBatchKMeans(n_clusters=n_clusters, init=init, n_init=1,
+                                   batch_size=KMEANS_MINIBATCH_BATCH_SIZE, max_iter=100,
+                                   random_state=random_state)
+        return KMeans(n_clusters=n_clusters, init=init, n_init=1, max_iter=300, random_state=random_state)
+    if engine == 'minibatch':
+        return MiniBatchKMeans(
+            n_clusters=n_clusters,
+            init='k-means++',
+            n_init=KMEANS_MINIBATCH_N_INIT,
+            batch_size=KMEANS_MINIBATCH_BATCH_SIZE,
+            max_iter=100,
+            random_state=random_state
+        )
+    return KMeans(
+        n_clusters=n_clusters,
+        init='k-means++',      # Better initialization than random
+        n_init=10,             # Run 10 times, pick best result
+        max_iter=300,
+        random_state=random_state
+    )
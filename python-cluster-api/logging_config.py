@@ -0,0 +1,60 @@
+"""
+Logging
+=======
+Leveled logging for the clustering API (replaces print()).
+
+- INFO: one line per request milestone (received, k chosen, clustered, cache hit)
+- WARNING / ERROR: data problems, fallbacks and failures (with tracebacks)
+- DEBUG: diagnostics (k sweep scores, per-feature variance, cluster
+  explanations, merge checks, sample input). Code that computes them is
+  guarded with logger.isEnabledFor(logging.DEBUG), so they cost nothing at INFO.
+
+Environment variables:
+- LOG_LEVEL: DEBUG, INFO (default), WARNING or ERROR
+- LOG_FORMAT: text (default) or json (one JSON object per line; `extra=` fields are included)
+"""
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').strip().upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').strip().lower()
+
+# Parent logger of the service; modules log to children such as 'cluster_api.model_store'
+LOGGER_NAME = 'cluster_api'
+
+# Attributes every LogRecord has; anything else was passed with extra= and goes into the JSON line
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, message, extra fields, exc_info."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Attach a stdout handler with the LOG_FORMAT formatter to the service logger (idempotent)."""
+    logger = logging.getLogger(LOGGER_NAME)
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s [Python API] %(levelname)s %(message)s'))
+    logger.handlers[:] = [handler]
+    logger.setLevel(LOG_LEVEL if LOG_LEVEL in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL') else 'INFO')
+    logger.propagate = False
+    return logger
@@ -0,0 +1,426 @@
+"""
+Metrics
+=======
+Prometheus metrics for the clustering API, served in text format on GET /metrics.
+
+- cluster_stage_duration_seconds{stage}: time per pipeline stage (parse,
+  validation, features, scaling, pca, warm_start, k_sweep, final_fit,
+  silhouette, labeling, cluster_quality, model_save, merge, serialization)
+- cluster_k_sweep_fit_duration_seconds{k}: KMeans fit time per k in the k sweep
+- cluster_http_request_duration_seconds{endpoint} and cluster_http_requests_total{endpoint,status}
+- cluster_students_processed_total, cluster_chosen_k_total{k}, cluster_errors_total{endpoint}
+- cluster_coalesced_requests_total{via}: requests served by an identical run in flight (see single_flight.py)
+- cluster_admission_in_flight, cluster_admission_queue_depth, cluster_admission_wait_seconds and
+  cluster_admission_rejected_total{reason}: concurrency governor (see admission.py)
+
+Stage durations of the current request are also collected per thread
+(start_timings) for the Server-Timing header and the ?meta=1 block.
+
+Values are plain dicts behind a lock (no client library), so recording one
+costs a dict update. Every process keeps its own values: batch pool processes
+hand theirs to the parent with each scope's result, and gunicorn workers share
+theirs through METRICS_DIR. With METRICS_DIR set each worker writes its values
+to <METRICS_DIR>/<pid>-<token>.json from a background thread, at most every
+METRICS_FLUSH_SECONDS after requests recorded something (and once more at
+exit), and /metrics adds up all files, so whichever worker answers reports
+for all of them (the other workers' values up to METRICS_FLUSH_SECONDS old).
+/metrics also folds the files of exited workers into <METRICS_DIR>/_exited.json
+and removes them: their counters and histograms keep counting, so totals
+never go backwards, while their gauges are dropped. Point METRICS_DIR at a
+directory that starts empty on every deploy (e.g. under /tmp).
+
+Environment variables:
+- METRICS_ENABLED: 1 (default) or 0
+- METRICS_DIR: directory shared by the gunicorn workers (unset: /metrics covers this process only)
+- METRICS_FLUSH_SECONDS: how often a worker writes its values to METRICS_DIR (default 5)
+"""
+import atexit
+import bisect
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+logger = logging.getLogger('cluster_api.metrics')
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') not in ('0', 'false')
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '5'))
+
+# Values of exited processes in METRICS_DIR, and the lock held while folding or reading the files
+EXITED_FILE = '_exited.json'
+LOCK_FILE = '_exited.lock'
+_PROCESS_FILE = re.compile(r'^\d+-[0-9a-f]{8}\.json$')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Histogram bucket upper bounds in seconds (+Inf is implicit)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = 'cluster_stage_duration_seconds'
+K_FIT_SECONDS = 'cluster_k_sweep_fit_duration_seconds'
+REQUEST_SECONDS = 'cluster_http_request_duration_seconds'
+REQUESTS = 'cluster_http_requests_total'
+STUDENTS_PROCESSED = 'cluster_students_processed_total'
+CHOSEN_K = 'cluster_chosen_k_total'
+ERRORS = 'cluster_errors_total'
+COALESCED = 'cluster_coalesced_requests_total'
+ADMISSION_IN_FLIGHT = 'cluster_admission_in_flight'
+ADMISSION_QUEUE_DEPTH = 'cluster_admission_queue_depth'
+ADMISSION_WAIT_SECONDS = 'cluster_admission_wait_seconds'
+ADMISSION_REJECTED = 'cluster_admission_rejected_total'
+
+# name -> (type, help), in /metrics order
+METRICS = {
+    STAGE_SECONDS: ('histogram', 'Time spent in each clustering pipeline stage.'),
+    K_FIT_SECONDS: ('histogram', 'KMeans fit time per number of clusters tried in the k sweep.'),
+    REQUEST_SECONDS: ('histogram', 'Request latency per endpoint.'),
+    REQUESTS: ('counter', 'Requests per endpoint and status code.'),
+    STUDENTS_PROCESSED: ('counter', 'Students clustered.'),
+    CHOSEN_K: ('counter', 'Clustering runs per chosen number of clusters.'),
+    ERRORS: ('counter', 'Clustering failures per endpoint.'),
+    COALESCED: ('counter', 'Requests that waited for an identical clustering run instead of starting one.'),
+    ADMISSION_IN_FLIGHT: ('gauge', 'Clustering runs holding an admission slot.'),
+    ADMISSION_QUEUE_DEPTH: ('gauge', 'Clustering requests waiting for an admission slot.'),
+    ADMISSION_WAIT_SECONDS: ('histogram', 'Time clustering requests waited for an admission slot.'),
+    ADMISSION_REJECTED: ('counter', 'Clustering requests answered 429 per reason (queue_full, timeout).')
+}
+
+_histograms = {}  # (name, labels) -> [per-bucket counts (last is +Inf), sum]
+_counters = {}  # (name, labels) -> value
+_gauges = {}  # (name, labels) -> current value
+_lock = threading.Lock()
+_process_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+_dirty = False  # values recorded since the last flush
+_flusher = None  # background thread writing to METRICS_DIR, started by schedule_flush
+_flusher_lock = threading.Lock()
+_local = threading.local()  # .timings: {stage: seconds} and .notes: {name: description} of the request handled by this thread
+
+
+def _key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in histogram `name`."""
+    if not METRICS_ENABLED:
+        return
+    bucket = bisect.bisect_left(BUCKETS, seconds)
+    key = _key(name, labels)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+        entry[0][bucket] += 1
+        entry[1] += seconds
+
+
+def inc(name, amount=1, **labels):
+    """Add `amount` to counter `name`."""
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    """Set gauge `name` to `value`."""
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def record_stage(stage, seconds):
+    """Record a pipeline stage duration (histogram, and the current request's timings when collected)."""
+    observe(STAGE_SECONDS, seconds, stage=stage)
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def start_timings():
+    """Collect the stage durations this thread records from now on; returns the {stage: seconds} dict."""
+    _local.timings = {}
+    _local.notes = {}
+    return _local.timings
+
+
+def stop_timings():
+    _local.timings = None
+    _local.notes = None
+
+
+def note(name, description):
+    """Add a Server-Timing entry without a duration (e.g. threads) to the current request's timings."""
+    notes = getattr(_local, 'notes', None)
+    if notes is not None:
+        notes[name] = description
+
+
+def server_timing(timings, total=None):
+    """
+    Server-Timing header value in ms, e.g. 'parse;dur=1.2, validation;dur=3.4, total;dur=250.1',
+    followed by the notes recorded on this thread (e.g. 'threads;desc="budget=2 concurrent=1 blas=2 openmp=2"').
+    """
+    entries = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in timings.items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.1f}')
+    notes = getattr(_local, 'notes', None) or {}
+    entries.extend(f'{name};desc="{description}"' for name, description in notes.items())
+    return ', '.join(entries)
+
+
+@contextmanager
+def timed(stage):
+    """Record the duration of the with-block as pipeline stage `stage` (not recorded if it raises)."""
+    start = time.perf_counter()
+    yield
+    record_stage(stage, time.perf_counter() - start)
+
+
+class StageTimer:
+    """
+    Times consecutive pipeline stages: lap(stage) records the time since the
+    previous lap (or since creation / restart) as `stage`.
+    """
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        record_stage(stage, now - self._last)
+        self._last = now
+
+    def restart(self):
+        """Start the next stage now without recording (the time in between is timed elsewhere)."""
+        self._last = time.perf_counter()
+
+
+def _snapshot():
+    return {
+        'histograms': [[name, dict(labels), list(entry[0]), entry[1]] for (name, labels), entry in _histograms.items()],
+        'counters': [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+        'gauges': [[name, dict(labels), value] for (name, labels), value in _gauges.items()]
+    }
+
+
+def _merge_into(histograms, counters, snapshot):
+    for name, labels, buckets, total in snapshot['histograms']:
+        entry = histograms.setdefault(_key(name, labels), [[0] * (len(BUCKETS) + 1), 0.0])
+        entry[0] = [count + added for count, added in zip(entry[0], buckets)]
+        entry[1] += total
+    # Gauges are summed like counters (e.g. queue depth over all workers)
+    for name, labels, value in snapshot['counters'] + snapshot.get('gauges', []):
+        key = _key(name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+
+def snapshot():
+    """JSON-serializable copy of this process's values."""
+    with _lock:
+        return _snapshot()
+
+
+def drain():
+    """Snapshot this process's values and reset them (pool processes return them to the parent)."""
+    with _lock:
+        values = _snapshot()
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+    return values
+
+
+def merge(values):
+    """Add values from another process (see drain) to this process's values."""
+    if not METRICS_ENABLED or not values:
+        return
+    with _lock:
+        # A pool process's gauges describe that process only, they are not added up here
+        _merge_into(_histograms, _counters, dict(values, gauges=[]))
+
+
+def flush():
+    """Write this process's values to METRICS_DIR now (no-op when unset)."""
+    global _dirty
+    if not METRICS_ENABLED or not METRICS_DIR:
+        return
+    _dirty = False
+    path = os.path.join(METRICS_DIR, f'{_process_id}.json')
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning('Could not write metrics to %s: %s', METRICS_DIR, e)
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        if _dirty:
+            flush()
+
+
+def schedule_flush():
+    """Have this process's values written to METRICS_DIR within METRICS_FLUSH_SECONDS (after a request or job)."""
+    global _dirty, _flusher
+    if not METRICS_ENABLED or not METRICS_DIR:
+        return
+    _dirty = True
+    if _flusher is None:
+        with _flusher_lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_periodically, name='metrics-flush', daemon=True)
+                _flusher.start()
+
+
+def _flush_at_exit():
+    if _dirty:
+        flush()
+
+
+atexit.register(_flush_at_exit)
+
+
+def _process_alive(filename):
+    """Whether the process that wrote <pid>-<token>.json is still running."""
+    try:
+        os.kill(int(filename.split('-', 1)[0]), 0)
+    except PermissionError:
+        return True  # running under another user
+    except (ValueError, ProcessLookupError):
+        return False
+    return True
+
+
+def _read_values(filename):
+    """Values in a METRICS_DIR file, or None when it is gone or unreadable."""
+    try:
+        with open(os.path.join(METRICS_DIR, filename)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning('Could not read metrics file %s: %s', filename, e)
+        return None
+
+
+def _fold_exited(filenames):
+    """
+    Add the counters and histograms of exited processes' files to EXITED_FILE
+    and remove the files (called with LOCK_FILE held). EXITED_FILE lists the
+    files it holds until they are gone, so one whose removal failed is not added twice.
+    """
+    archive = _read_values(EXITED_FILE) or {'histograms': [], 'counters': [], 'folded': []}
+    folded = [name for name in archive.get('folded', []) if os.path.exists(os.path.join(METRICS_DIR, name))]
+    histograms, counters = {}, {}
+    _merge_into(histograms, counters, dict(archive, gauges=[]))
+    for filename in filenames:
+        values = None if filename in folded else _read_values(filename)
+        if values is None:
+            continue
+        _merge_into(histograms, counters, dict(values, gauges=[]))
+        folded.append(filename)
+    archive = {
+        'histograms': [[name, dict(labels), entry[0], entry[1]] for (name, labels), entry in histograms.items()],
+        'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        'folded': folded
+    }
+    path = os.path.join(METRICS_DIR, EXITED_FILE)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(archive, f)
+    os.replace(tmp_path, path)
+    for filename in folded:
+        try:
+            os.remove(os.path.join(METRICS_DIR, filename))
+        except FileNotFoundError:
+            pass
+
+
+def collect():
+    """
+    (histograms, counters) of this process plus every other process that wrote to METRICS_DIR
+    (exited ones through EXITED_FILE, without their gauges).
+    """
+    histograms, counters = {}, {}
+    _merge_into(histograms, counters, snapshot())
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return histograms, counters
+    own_file = f'{_process_id}.json'
+    try:
+        with open(os.path.join(METRICS_DIR, LOCK_FILE), 'a') as lock_file:
+            # Folding and reading under one lock: each file is counted either on its own or in EXITED_FILE
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            filenames = [name for name in os.listdir(METRICS_DIR) if _PROCESS_FILE.match(name) and name != own_file]
+            exited = [name for name in filenames if not _process_alive(name)]
+            if exited:
+                _fold_exited(exited)
+            for filename in [EXITED_FILE] + [name for name in filenames if name not in exited]:
+                values = _read_values(filename)
+                if values is not None:
+                    _merge_into(histograms, counters, values)
+    except OSError as e:
+        logger.warning('Could not read metrics from %s: %s', METRICS_DIR, e)
+    return histograms, counters
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    histograms, counters = collect()
+    bounds = [repr(bound) for bound in BUCKETS] + ['+Inf']
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            series = sorted((key[1], entry) for key, entry in histograms.items() if key[0] == name)
+            for labels, (buckets, total) in series:
+                cumulative = 0
+                for bound, count in zip(bounds, buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {total!r}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        else:
+            for labels, value in sorted((key[1], value) for key, value in counters.items() if key[0] == name):
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _reset_after_fork():
+    # A forked child (gunicorn --preload worker, batch pool process) starts from zero under its
+    # own file name, without the parent's flush thread; the parent's locks may have been held at fork time
+    global _lock, _process_id, _dirty, _flusher, _flusher_lock
+    _lock = threading.Lock()
+    _flusher_lock = threading.Lock()
+    _flusher = None
+    _dirty = False
+    _histograms.clear()
+    _counters.clear()
+    _gauges.clear()
+    _process_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,173 @@
+"""
+Clustering Model Store
+======================
+Keeps the fitted clustering model of a scope (term / section / ILO filter)
+so later requests can warm-start from it or assign students without refitting.
+
+A model is a JSON-serializable dict:
+- features: feature list chosen by variance filtering
+- scaler_mean / scaler_scale: StandardScaler statistics
+- pca_mean / pca_components / pca_variance: 2-component PCA projection
+- centers: KMeans centers in scaled feature space
+- labels / explanations: cluster id (as string) -> label / explanation text
+- n_clusters, engine, inertia, silhouette_score, n_samples
+- baseline_silhouette / baseline_inertia_per_sample: quality of the last full sweep
+- scope, created_at
+
+Models are kept in memory and, when MODEL_STORE_DIR is set, written to
+<MODEL_STORE_DIR>/<scope>.json so every gunicorn worker can read them. The
+in-memory copies are an LRU of MODEL_STORE_MAX_MODELS scopes; with
+MODEL_STORE_DIR set a copy is read again when the file has been rewritten
+since (e.g. another worker fitted a newer model for the scope). Without
+MODEL_STORE_DIR an evicted model is gone.
+
+Environment variables:
+- MODEL_STORE_DIR: directory shared by the gunicorn workers (unset: in memory only)
+- MODEL_STORE_MAX_MODELS: models kept in memory per worker (default 256)
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+logger = logging.getLogger('cluster_api.model_store')
+
+MODEL_STORE_DIR = os.environ.get('MODEL_STORE_DIR')
+MODEL_STORE_MAX_MODELS = max(1, int(os.environ.get('MODEL_STORE_MAX_MODELS', '256')))
+
+# Query parameters that identify a clustering scope (same filters the backend caches by)
+SCOPE_PARAMS = ('term_id', 'section_course_id', 'ilo_id', 'standard_type', 'standard_id')
+
+_models = OrderedDict()  # scope -> (model, st_mtime_ns of its file when read or written, None if not on disk)
+_lock = threading.Lock()
+
+
+def scope_key(args):
+    """
+    Build a scope key from request args, e.g. 'term_id=12|section_course_id=40'.
+    An explicit `scope` argument is used as-is. Returns None when no scope is given.
+    """
+    if args.get('scope'):
+        return str(args.get('scope'))
+    parts = [f'{name}={args.get(name)}' for name in SCOPE_PARAMS if args.get(name) not in (None, '')]
+    return '|'.join(parts) if parts else None
+
+
+def _model_path(scope):
+    safe_name = re.sub(r'[^A-Za-z0-9_.=-]+', '_', scope)
+    return os.path.join(MODEL_STORE_DIR, f'{safe_name}.json')
+
+
+def _remember(scope, model, mtime):
+    with _lock:
+        _models[scope] = (model, mtime)
+        _models.move_to_end(scope)
+        while len(_models) > MODEL_STORE_MAX_MODELS:
+            _models.popitem(last=False)
+
+
+def _file_mtime(scope):
+    try:
+        return os.stat(_model_path(scope)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def save_model(scope, model):
+    """Store a model for `scope` (in memory, and on disk when MODEL_STORE_DIR is set)."""
+    mtime = None
+    if MODEL_STORE_DIR:
+        try:
+            os.makedirs(MODEL_STORE_DIR, exist_ok=True)
+            # One temporary file per writer: workers (and threads) saving the same scope must not share it
+            tmp_path = f'{_model_path(scope)}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(model, f)
+            # Taken before the rename (which keeps it) so a concurrent save by another worker is not mistaken for ours
+            mtime = os.stat(tmp_path).st_mtime_ns
+            os.replace(tmp_path, _model_path(scope))
+        except OSError as e:
+            logger.warning('Could not persist model for scope %s: %s', scope, e)
+    _remember(scope, model, mtime)
+
+
+def load_model(scope):
+    """Return the stored model for `scope` (re-read when its file changed since), or None."""
+    if not scope:
+        return None
+    with _lock:
+        model, mtime = _models.get(scope, (None, None))
+        if model is not None:
+            _models.move_to_end(scope)
+    if not MODEL_STORE_DIR:
+        return model
+    file_mtime = _file_mtime(scope)
+    if file_mtime is None or file_mtime == mtime:
+        return model
+    try:
+        with open(_model_path(scope)) as f:
+            model = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning('Could not read model for scope %s: %s', scope, e)
+        return model
+    _remember(scope, model, file_mtime)
+    return model
+
+
+def build_model(scope, features, scaler_mean, scaler_scale, pca_mean, pca_components, pca_variance,
+                kmeans, labels, explanations, silhouette_score, n_samples, engine,
+                baseline_silhouette=None, baseline_inertia_per_sample=None):
+    """Assemble a JSON-serializable model from a finished clustering run."""
+    def to_list(values):
+        return None if values is None else np.asarray(values, dtype=float).tolist()
+
+    inertia = float(kmeans.inertia_)
+    return {
+        'scope': scope,
+        'features': list(features),
+        'scaler_mean': to_list(scaler_mean),
+        'scaler_scale': to_list(scaler_scale),
+        'pca_mean': to_list(pca_mean),
+        'pca_components': to_list(pca_components),
+        'pca_variance': to_list(pca_variance),
+        'centers': to_list(kmeans.cluster_centers_),
+        'n_clusters': int(len(kmeans.cluster_centers_)),
+        'labels': {str(cluster_id): label for cluster_id, label in labels.items()},
+        'explanations': {str(cluster_id): text for cluster_id, text in explanations.items()},
+        'engine': engine,
+        'inertia': inertia,
+        'silhouette_score': None if silhouette_score is None else float(silhouette_score),
+        'n_samples': int(n_samples),
+        'baseline_silhouette': (
+            baseline_silhouette if baseline_silhouette is not None
+            else (None if silhouette_score is None else float(silhouette_score))
+        ),
+        'baseline_inertia_per_sample': (
+            baseline_inertia_per_sample if baseline_inertia_per_sample is not None
+            else inertia / max(int(n_samples), 1)
+        ),
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def transform(model, frame):
+    """Scale frame[model features] with the model's StandardScaler statistics."""
+    values = frame[model['features']].to_numpy(dtype=float)
+    return (values - np.asarray(model['scaler_mean'])) / np.asarray(model['scaler_scale'])
+
+
+def project(model, X_scaled):
+    """
+    Project scaled features onto the model's PCA components.
+    Returns (X_pca, pca_variance), or (None, None) if the model has no PCA.
+    """
+    if not model.get('pca_components'):
+        return None, None
+    X_pca = (X_scaled - np.asarray(model['pca_mean'])) @ np.asarray(model['pca_components']).T
+    return X_pca, model.get('pca_variance')
@@ -0,0 +1,97 @@
+"""
+Request Formats
+===============
+/api/cluster accepts student data as (by Content-Type):
+
+- application/json: a list of per-student records (original format), or
+  column-oriented {"student_id": [...], "attendance_percentage": [...], ...}
+- application/msgpack (also application/x-msgpack): the same two shapes
+  encoded as MessagePack (needs the `msgpack` package)
+- application/vnd.apache.arrow.stream: an Arrow IPC stream with one row per
+  student (needs the `pyarrow` package)
+
+Both packages are in requirements.txt; without one of them its format is
+answered with 415.
+
+Column-oriented payloads are turned into a DataFrame one column at a time, so
+numeric columns become typed arrays without building a dict per student.
+Both shapes can also be wrapped in the {"records": ..., "model": ...} envelope,
+which is why a column-oriented payload cannot have a column named "records".
+"""
+import hashlib
+
+import pandas as pd
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional dependency
+    pa = None
+
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+class UnsupportedFormat(ValueError):
+    """Request Content-Type cannot be decoded (unknown type or optional package missing)."""
+
+
+def read_body(request):
+    """
+    Decode the request body by Content-Type.
+    Returns a list, dict (records/columns/envelope) or, for Arrow, a DataFrame.
+    Raises UnsupportedFormat (415) or ValueError (400) for undecodable bodies.
+    """
+    mimetype = request.mimetype
+    if mimetype in MSGPACK_MIMETYPES:
+        if msgpack is None:
+            raise UnsupportedFormat('MessagePack requests need the msgpack package')
+        try:
+            return msgpack.unpackb(request.get_data(), raw=False)
+        except Exception as e:
+            raise ValueError(f'Invalid MessagePack body: {e}')
+    if mimetype == ARROW_STREAM_MIMETYPE:
+        if pa is None:
+            raise UnsupportedFormat('Arrow IPC requests need the pyarrow package')
+        try:
+            return arrow_frame(request.get_data())
+        except pa.ArrowException as e:
+            raise ValueError(f'Invalid Arrow IPC stream: {e}')
+    return request.get_json()
+
+
+def arrow_frame(body):
+    """DataFrame from an Arrow IPC stream; nested columns (ILO arrays) become Python lists/dicts."""
+    table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_nested(column.type):
+            columns[name] = pd.Series(column.to_pylist(), dtype=object)
+        else:
+            columns[name] = column.to_pandas()
+    return pd.DataFrame(columns)
+
+
+def is_columnar(data):
+    """True for a {column: [values]} payload (every value a list, all the same length)."""
+    if not isinstance(data, dict) or not data:
+        return False
+    values = list(data.values())
+    return all(isinstance(value, list) for value in values) and len({len(value) for value in values}) == 1
+
+
+def columns_frame(data):
+    """DataFrame from a {column: [values]} payload, built column by column."""
+    return pd.DataFrame(data)
+
+
+def body_digest(request):
+    """SHA-256 of the raw body and Content-Type (cache key material for non-row payloads)."""
+    digest = hashlib.sha256(request.mimetype.encode('utf-8'))
+    digest.update(request.get_data())
+    return digest.hexdigest()
@@ -0,0 +1,106 @@
+"""
+Clustering Response Cache
+=========================
+In-process LRU cache of serialized /api/cluster responses.
+
+Dashboards refresh often and several faculty open the same section, so
+identical payloads are common. Entries are keyed by a SHA-256 of the
+canonical (key-sorted) JSON of the request records plus the options that
+change the result, and hold the response bytes (and the headers that
+describe them) so a hit skips pandas and sklearn entirely.
+
+Environment variables:
+- RESPONSE_CACHE_ENABLED: 1 (default) or 0
+- RESPONSE_CACHE_TTL_SECONDS: entry lifetime (default 300)
+- RESPONSE_CACHE_MAX_BYTES: memory cap for cached bodies (default 64 MB)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') not in ('0', 'false')
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '300'))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Request header that forces a recompute (the fresh result replaces the cached one)
+BYPASS_HEADER = 'X-Cache-Bypass'
+
+_entries = OrderedDict()  # key -> (expires_at, body, headers)
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'bypasses': 0, 'evictions': 0, 'bytes': 0}
+
+
+def cache_key(records, options=None):
+    """SHA-256 of the canonical JSON of the records and result-affecting options."""
+    canonical = json.dumps([records, options or {}], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def should_bypass(headers):
+    """True when the request asks for a forced refresh."""
+    if headers.get(BYPASS_HEADER, '').lower() in ('1', 'true'):
+        return True
+    return 'no-cache' in headers.get('Cache-Control', '').lower()
+
+
+def get(key):
+    """Cached (response bytes, headers) for `key`, or None (counts a hit or miss)."""
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] > now:
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return entry[1], entry[2]
+        if entry is not None:
+            _remove(key)
+        _stats['misses'] += 1
+        return None
+
+
+def put(key, body, headers=None):
+    """Cache response bytes (and headers to replay) under `key`, evicting least recently used entries over the cap."""
+    if not RESPONSE_CACHE_ENABLED or len(body) > RESPONSE_CACHE_MAX_BYTES:
+        return
+    with _lock:
+        if key in _entries:
+            _remove(key)
+        _entries[key] = (time.monotonic() + RESPONSE_CACHE_TTL_SECONDS, body, dict(headers or {}))
+        _stats['bytes'] += len(body)
+        while _stats['bytes'] > RESPONSE_CACHE_MAX_BYTES and _entries:
+            _remove(next(iter(_entries)))
+            _stats['evictions'] += 1
+
+
+def record_bypass():
+    with _lock:
+        _stats['bypasses'] += 1
+
+
+def _remove(key):
+    _, body, _ = _entries.pop(key)
+    _stats['bytes'] -= len(body)
+
+
+def stats():
+    """Hit/miss counters and current size."""
+    with _lock:
+        return dict(
+            _stats,
+            entries=len(_entries),
+            enabled=RESPONSE_CACHE_ENABLED,
+            max_bytes=RESPONSE_CACHE_MAX_BYTES,
+            ttl_seconds=RESPONSE_CACHE_TTL_SECONDS
+        )
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _stats['bytes'] = 0
@@ -0,0 +1,147 @@
+"""
+Response Serialization
+======================
+Turns the clustering output DataFrame into records and records into JSON bytes.
+
+frame_to_records works per column instead of per cell:
+- float columns: NaN/inf masked to None with one np.isfinite call
+- integer/bool columns: converted with tolist()
+- other columns (Int64 student_id, names, labels, nested
+  assessment_scores_by_ilo): missing scalars masked to None with one isna call;
+  nested values are passed through untouched
+
+encode_json writes the bytes. With orjson installed it encodes NumPy scalars
+and arrays natively and maps NaN/inf (also inside nested values) and pandas
+NA to null, so no cleaning pass is needed. Without orjson the stdlib encoder
+is used, cleaning the payload only when it actually contains NaN/inf.
+Both write compact, key-sorted JSON. The stdlib encoder escapes non-ASCII
+characters like jsonify did ("Pe\\u00f1a"), so its bytes are the jsonify bytes.
+orjson has no such option and writes them as raw UTF-8 ("Peña"): equivalent
+JSON, but a student name with an accent or ñ changes the response bytes
+(JSON_ENCODER=stdlib restores them). Otherwise the two encoders differ only in
+the (equivalent) exponent notation of floats below 1e-4 or from 1e16 in
+magnitude. tests/test_serialization.py checks both against jsonify.
+
+Environment variables:
+- JSON_ENCODER: auto (default, orjson when installed), orjson or stdlib
+"""
+import json
+import logging
+import math
+import os
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+logger = logging.getLogger('cluster_api.serialization')
+
+JSON_ENCODER = os.environ.get('JSON_ENCODER', 'auto').strip().lower()
+if JSON_ENCODER == 'orjson' and orjson is None:
+    logger.warning('JSON_ENCODER=orjson but orjson is not installed, using stdlib json')
+
+ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def encoder_name():
+    """'orjson' or 'stdlib', whichever encode_json uses."""
+    return 'orjson' if orjson is not None and JSON_ENCODER != 'stdlib' else 'stdlib'
+
+
+def clean_value(value):
+    """JSON-safe copy of one value (scalars, lists, tuples, arrays, dicts)."""
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, dict):
+        return {key: clean_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray, pd.Series)):
+        return [clean_value(item) for item in value]
+    if isinstance(value, np.generic):
+        return clean_value(value.item())
+    if value is pd.NA or value is pd.NaT:
+        return None
+    return value
+
+
+def default(value):
+    """Types neither encoder handles natively (pandas NA, object arrays, Series, Flask's defaults)."""
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (np.ndarray, pd.Series)):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return DefaultJSONProvider.default(value)
+
+
+def encode_json(obj):
+    """
+    Compact, key-sorted JSON bytes for obj, with NaN/inf written as null
+    (non-ASCII characters: raw UTF-8 with orjson, \\uXXXX escapes with stdlib).
+    """
+    if encoder_name() == 'orjson':
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+    options = {'default': default, 'sort_keys': True, 'separators': (',', ':'),
+               'ensure_ascii': True, 'allow_nan': False}
+    try:
+        return json.dumps(obj, **options).encode('utf-8')
+    except ValueError:
+        # NaN/inf somewhere in the payload: clean it, then encode
+        return json.dumps(clean_value(obj), **options).encode('utf-8')
+
+
+def decode_json(data):
+    """Python objects for JSON bytes (orjson when installed, whichever encoder wrote them)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that writes responses with encode_json (jsonify, app.json.dumps)."""
+
+    def dumps(self, obj, **kwargs):
+        return encode_json(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encode_json(obj) + b'\n', mimetype=self.mimetype)
+
+
+def column_values(series):
+    """Python list of one column's values, missing scalars as None."""
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind == 'f':
+        values = series.to_numpy()
+        result = values.tolist()
+        for idx in np.flatnonzero(~np.isfinite(values)):
+            result[idx] = None
+        return result
+    if isinstance(dtype, np.dtype) and dtype.kind in 'iub':
+        return series.to_numpy().tolist()
+    # isna only flags scalars, so list/dict cells are left alone
+    mask = series.isna().to_numpy()
+    result = series.to_numpy(dtype=object).tolist()
+    for idx in np.flatnonzero(mask):
+        result[idx] = None
+    return result
+
+
+def frame_to_records(frame):
+    """
+    List of dicts, one per row (same keys and order as frame.to_dict(orient='records')),
+    ready for encode_json.
+    """
+    columns = list(frame.columns)
+    values = [column_values(frame.iloc[:, idx]) for idx in range(len(columns))]
+    return [dict(zip(columns, row)) for row in zip(*values)]
@@ -0,0 +1,118 @@
+"""
+Silhouette Strategies
+=====================
+sklearn's silhouette_score is O(n^2) in time and memory, so it is only used
+as-is for small cohorts. The strategy is picked from the number of students:
+
+- exact:      n <= SILHOUETTE_EXACT_MAX_N, full silhouette_score
+- sampled:    n <= SILHOUETTE_SAMPLED_MAX_N, silhouette_score on a stratified
+              sample (per-cluster proportional, fixed seed)
+- simplified: larger n, centroid-based simplified silhouette in O(n*k)
+              (a = distance to own centroid, b = distance to nearest other centroid)
+
+Set SILHOUETTE_STRATEGY to exact/sampled/simplified to force one strategy.
+"""
+import os
+
+import numpy as np
+from sklearn.metrics import silhouette_score
+
+
+SILHOUETTE_STRATEGY = os.environ.get('SILHOUETTE_STRATEGY', 'auto').strip().lower()
+SILHOUETTE_EXACT_MAX_N = int(os.environ.get('SILHOUETTE_EXACT_MAX_N', '3000'))
+SILHOUETTE_SAMPLED_MAX_N = int(os.environ.get('SILHOUETTE_SAMPLED_MAX_N', '50000'))
+SILHOUETTE_SAMPLE_SIZE = int(os.environ.get('SILHOUETTE_SAMPLE_SIZE', '3000'))
+SILHOUETTE_SEED = int(os.environ.get('SILHOUETTE_SEED', '42'))
+
+STRATEGIES = ('exact', 'sampled', 'simplified')
+
+
+def choose_silhouette_strategy(n_samples, strategy=None):
+    """
+    Pick the silhouette strategy for n_samples.
+    An explicit strategy (argument or SILHOUETTE_STRATEGY) wins over the size thresholds.
+    """
+    strategy = strategy or SILHOUETTE_STRATEGY
+    if strategy in STRATEGIES:
+        return strategy
+    if n_samples <= SILHOUETTE_EXACT_MAX_N:
+        return 'exact'
+    if n_samples <= SILHOUETTE_SAMPLED_MAX_N:
+        return 'sampled'
+    return 'simplified'
+
+
+def stratified_sample(labels, sample_size, seed=SILHOUETTE_SEED):
+    """
+    Indices of a per-cluster proportional sample of `labels` (at least 2 per
+    cluster when the cluster has them). Sorted, deterministic for a given seed.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = len(labels)
+    cluster_ids, counts = np.unique(labels, return_counts=True)
+    picked = []
+    for cluster_id, count in zip(cluster_ids, counts):
+        members = np.flatnonzero(labels == cluster_id)
+        take = min(count, max(2, int(round(sample_size * count / n_samples))))
+        picked.append(rng.choice(members, size=take, replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def simplified_silhouette(X, labels, centers=None):
+    """
+    Centroid-based simplified silhouette, O(n*k).
+    Students in single-member clusters score 0, as in sklearn.
+    """
+    X = np.asarray(X, dtype=float)
+    cluster_ids, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    if centers is None:
+        centers = np.vstack([X[inverse == idx].mean(axis=0) for idx in range(len(cluster_ids))])
+    else:
+        centers = np.asarray(centers, dtype=float)[cluster_ids]
+
+    # (n, k) distances to every centroid, one column at a time to keep memory O(n*k)
+    distances = np.empty((len(X), len(centers)))
+    for idx, center in enumerate(centers):
+        distances[:, idx] = np.sqrt(((X - center) ** 2).sum(axis=1))
+    rows = np.arange(len(X))
+    a = distances[rows, inverse]
+    distances[rows, inverse] = np.inf
+    b = distances.min(axis=1)
+
+    denominator = np.maximum(a, b)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(denominator > 0, (b - a) / denominator, 0.0)
+    scores[counts[inverse] == 1] = 0.0
+    return float(scores.mean())
+
+
+def compute_silhouette(X, labels, centers=None, strategy=None, sample_size=None):
+    """
+    Silhouette score using the strategy for len(X).
+
+    Args:
+        X: Scaled feature matrix
+        labels: Cluster labels
+        centers: Cluster centers (used by the simplified strategy, computed if not given)
+        strategy: Force 'exact', 'sampled' or 'simplified' (default: by size)
+        sample_size: Sample size for the sampled strategy (default: SILHOUETTE_SAMPLE_SIZE)
+
+    Returns:
+        score: Silhouette score (float)
+        info: {'strategy': ..., 'sample_size': number of students the score was computed on}
+    """
+    n_samples = len(X)
+    strategy = choose_silhouette_strategy(n_samples, strategy)
+
+    if strategy == 'simplified':
+        return simplified_silhouette(X, labels, centers), {'strategy': strategy, 'sample_size': n_samples}
+
+    if strategy == 'sampled':
+        sample_size = sample_size or SILHOUETTE_SAMPLE_SIZE
+        if sample_size < n_samples:
+            idx = stratified_sample(np.asarray(labels), sample_size)
+            score = silhouette_score(np.asarray(X)[idx], np.asarray(labels)[idx])
+            return float(score), {'strategy': strategy, 'sample_size': len(idx)}
+        strategy = 'exact'
+
+    return float(silhouette_score(X, labels)), {'strategy': strategy, 'sample_size': n_samples}
@@ -0,0 +1,173 @@
+"""
+Single-Flight Requests
+======================
+Coalesces concurrent identical clustering runs. When a dashboard loads,
+several tabs or faculty members often request the same section at the same
+moment; without coalescing each request clusters the same payload while
+competing for the same cores.
+
+run(key, fn) runs fn() for the first caller of a key (the payload hash,
+scope and options, i.e. the response cache key); callers arriving while it
+runs wait for that run and get the same result (response bytes and
+headers). Requests that arrive after it finished are served by the response
+cache instead.
+
+Within a worker the waiters share a Future. With SINGLE_FLIGHT_DIR set,
+workers on the same host coalesce too: the running worker holds an flock on
+<SINGLE_FLIGHT_DIR>/<key>.lock and writes the result to <key>.result before
+releasing it; a worker that had to wait for the lock reads that result
+instead of clustering again. Files older than SINGLE_FLIGHT_FILE_SECONDS are
+removed, a lock file only while no worker holds it (a worker that waited for
+a lock file removed meanwhile locks the new one instead).
+
+Coalesced requests are counted in cluster_coalesced_requests_total{via}
+(via: memory or lock_file).
+
+Environment variables:
+- SINGLE_FLIGHT_ENABLED: 1 (default) or 0
+- SINGLE_FLIGHT_DIR: local directory shared by the gunicorn workers (unset: per worker only)
+- SINGLE_FLIGHT_FILE_SECONDS: age after which lock and result files are removed (default 300)
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+
+logger = logging.getLogger('cluster_api.single_flight')
+
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', '1') not in ('0', 'false')
+SINGLE_FLIGHT_DIR = os.environ.get('SINGLE_FLIGHT_DIR')
+SINGLE_FLIGHT_FILE_SECONDS = float(os.environ.get('SINGLE_FLIGHT_FILE_SECONDS', '300'))
+
+_flights = {}  # key -> Future of the run in progress in this worker
+_lock = threading.Lock()
+
+
+def _path(key, suffix):
+    return os.path.join(SINGLE_FLIGHT_DIR, f'{key}{suffix}')
+
+
+def _write_result(key, result):
+    """<key>.result: the headers as one JSON line, then the body bytes."""
+    body, headers = result
+    tmp_path = _path(key, f'.result.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(json.dumps(headers).encode('utf-8') + b'\n')
+        f.write(body)
+    os.replace(tmp_path, _path(key, '.result'))
+
+
+def _read_result(key, since):
+    """Result written to <key>.result at or after `since` (time.time()), else None."""
+    try:
+        if os.path.getmtime(_path(key, '.result')) < since:
+            return None
+        with open(_path(key, '.result'), 'rb') as f:
+            headers, _, body = f.read().partition(b'\n')
+        return body, json.loads(headers)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_lock_file(path):
+    """Remove an idle lock file; one held by a worker (a run longer than SINGLE_FLIGHT_FILE_SECONDS) is kept."""
+    with open(path, 'rb') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        os.remove(path)
+
+
+def _is_current(lock_file, path):
+    """Whether the open lock file is still the one at `path` (not removed by _remove_lock_file)."""
+    try:
+        return os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def _purge_files():
+    cutoff = time.time() - SINGLE_FLIGHT_FILE_SECONDS
+    for entry in os.scandir(SINGLE_FLIGHT_DIR):
+        try:
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            if entry.name.endswith('.lock'):
+                _remove_lock_file(entry.path)
+            else:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _run_across_workers(key, fn):
+    """fn() under the key's lock file, or the result of the worker that held it. Returns (result, coalesced)."""
+    os.makedirs(SINGLE_FLIGHT_DIR, exist_ok=True)
+    started = time.time()
+    lock_path = _path(key, '.lock')
+    while True:
+        lock_file = open(lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another worker is clustering this payload: wait for it and take its result
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            result = _read_result(key, started)
+            if result is not None:
+                lock_file.close()
+                metrics.inc(metrics.COALESCED, via='lock_file')
+                return result, True
+        if _is_current(lock_file, lock_path):
+            break
+        # Purged by another worker before we held it: newcomers lock the new file, so lock that one too
+        lock_file.close()
+    with lock_file:
+        try:
+            os.utime(lock_path)
+            _purge_files()
+            result = fn()
+            try:
+                _write_result(key, result)
+            except OSError as e:
+                logger.warning('Could not share result %s in %s: %s', key[:12], SINGLE_FLIGHT_DIR, e)
+            return result, False
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run(key, fn):
+    """
+    fn() for the first caller of `key`; concurrent callers with the same key
+    wait for that run and get its result (or exception).
+    fn returns (body bytes, headers). Returns (result, coalesced).
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        return fn(), False
+    with _lock:
+        future = _flights.get(key)
+        leader = future is None
+        if leader:
+            future = _flights[key] = Future()
+    if not leader:
+        metrics.inc(metrics.COALESCED, via='memory')
+        return future.result(), True
+    try:
+        if SINGLE_FLIGHT_DIR:
+            result, coalesced = _run_across_workers(key, fn)
+        else:
+            result, coalesced = fn(), False
+        future.set_result(result)
+        return result, coalesced
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            del _flights[key]
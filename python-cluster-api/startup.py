@@ -0,0 +1,214 @@
+"""
+Startup
+=======
+App factory for fast cold starts: gunicorn 'startup:create_app()'.
+
+Importing app.py loads pandas, NumPy and scikit-learn (about 2.5 s on a cold
+free-tier instance), and the first clustering run also pays BLAS/OpenMP
+initialization. create_app() returns a small front application instead:
+
+- GET /, /health and /ready are answered without importing app.py, so the
+  port is bound and platform health checks pass while the worker boots.
+- A background thread imports app.py and runs cluster_records on a small
+  synthetic cohort (the warm-up), so the first real request finds every
+  import, code path and thread pool initialized. Metrics it records are
+  discarded.
+- Every other request is handed to app.app. A request that arrives before
+  the warm-up has finished waits for it.
+
+GET /ready answers 200 once the worker is warm and 503 while it is cold or
+warming (a cold worker starts warming when asked) or when importing app.py
+failed, with the import and warm-up durations. A failed warm-up clustering
+run alone still answers 200: app.py is loaded and serves requests. Run directly (python app.py) or as gunicorn app:app, the
+warm-up does not run and /ready reports 200 with warm false.
+
+Environment variables:
+- WARMUP: 1 (default) warms up at boot; 0 imports app.py on the first request (or /ready) instead
+- WARMUP_STUDENTS: students in the synthetic warm-up cohort (default 30, 0 imports only)
+"""
+import logging
+import os
+import threading
+import time
+
+from flask import Blueprint, Flask, jsonify
+from flask_cors import CORS
+
+from logging_config import configure_logging
+
+
+WARMUP = os.environ.get('WARMUP', '1') not in ('0', 'false')
+WARMUP_STUDENTS = int(os.environ.get('WARMUP_STUDENTS', '30'))
+
+# Paths the front application answers itself until app.py is loaded
+HEALTH_PATHS = ('/', '/health', '/ready')
+
+logger = logging.getLogger('cluster_api.startup')
+
+health_routes = Blueprint('health', __name__)
+
+_state = {
+    'status': 'cold',  # cold -> warming -> warm | failed
+    'import_seconds': None,
+    'warmup_seconds': None,
+    'error': None
+}
+_app = None  # app.app once imported through load_app / warm_up
+_front = None  # Front application built by create_app
+_lock = threading.Lock()
+_warmup_thread = None
+
+
+@health_routes.route("/", methods=["GET"])
+def health():
+    """Healthcheck endpoint for deployment platforms"""
+    return jsonify({
+        "status": "healthy",
+        "service": "Enhanced KMeans Clustering API",
+        "version": "2.0",
+        "features": [
+            "Detailed attendance analysis (present, absent, late)",
+            "ILO-weighted scoring",
+            "Submission behavior tracking",
+            "Silhouette score calculation",
+            "Cluster explanations"
+        ]
+    }), 200
+
+
+@health_routes.route("/health", methods=["GET"])
+def health_check():
+    """Alternative healthcheck endpoint"""
+    return jsonify({
+        "status": "healthy",
+        "service": "Enhanced KMeans Clustering API",
+        "version": "2.0"
+    }), 200
+
+
+@health_routes.route("/ready", methods=["GET"])
+def readiness():
+    """
+    Readiness: 200 when this worker can serve (or was not started through create_app),
+    503 while cold or warming, or when app.py could not be imported.
+    """
+    if _state['status'] == 'cold' and _front is not None:
+        start_warmup()
+    status = _state['status'] if _front is not None else 'ready'
+    return jsonify({
+        'status': status,
+        'warm': status == 'warm',
+        'pid': os.getpid(),
+        'import_seconds': _state['import_seconds'],
+        'warmup_seconds': _state['warmup_seconds'],
+        'error': _state['error']
+    }), 503 if status in ('cold', 'warming') or (status == 'failed' and _app is None) else 200
+
+
+def warmup_records(n_students):
+    """Synthetic cohort in three behaviour profiles, shaped like the backend's records."""
+    profiles = ((0.95, 90.0, 0.90), (0.80, 76.0, 0.60), (0.60, 60.0, 0.30))  # attendance, score, on-time share
+    sessions, assessments = 30, 12
+    records = []
+    for idx in range(n_students):
+        attendance, score, ontime_share = profiles[idx % len(profiles)]
+        jitter = (idx % 5) / 50
+        present = int(sessions * (attendance - jitter))
+        late = min(2, sessions - present)
+        ontime = int(assessments * (ontime_share - jitter))
+        missing = int(assessments * (1 - ontime_share) / 2)
+        student_score = round(score - jitter * 100, 2)
+        records.append({
+            'student_id': idx + 1,
+            'attendance_percentage': round(present / sessions * 100, 2),
+            'attendance_present_count': present,
+            'attendance_late_count': late,
+            'attendance_absent_count': sessions - present - late,
+            'attendance_total_sessions': sessions,
+            'submission_ontime_count': ontime,
+            'submission_late_count': assessments - ontime - missing,
+            'submission_missing_count': missing,
+            'submission_total_assessments': assessments,
+            'average_score': student_score,
+            'assessment_scores_by_ilo': [{
+                'ilo_id': ilo,
+                'ilo_code': f'ILO{ilo}',
+                'assessments': [{'assessment_id': ilo, 'transmuted_score': student_score, 'weight_percentage': 25.0}]
+            } for ilo in range(1, 5)]
+        })
+    return records
+
+
+def warm_up():
+    """Import app.py and run the warm-up cohort through cluster_records (once per process; later callers wait)."""
+    global _app
+    with _lock:
+        if _app is not None:
+            return
+        _state['status'] = 'warming'
+        start = time.perf_counter()
+        try:
+            import app
+        except Exception as e:
+            _state.update(status='failed', error=f'import app: {e}')
+            logger.exception('Importing app.py failed')
+            return
+        _state['import_seconds'] = round(time.perf_counter() - start, 3)
+
+        if WARMUP_STUDENTS > 0:
+            start = time.perf_counter()
+            try:
+                app.cluster_records(warmup_records(WARMUP_STUDENTS))
+            except Exception as e:
+                _state.update(status='failed', error=f'warm-up: {e}')
+                logger.exception('Warm-up clustering failed; serving without it')
+            _state['warmup_seconds'] = round(time.perf_counter() - start, 3)
+            # Nothing but the warm-up has run in this process yet
+            app.metrics.drain()
+        if _state['status'] == 'warming':
+            _state['status'] = 'warm'
+        _app = app.app
+        logger.info('Worker %s %s: import %.2fs, warm-up %ss', os.getpid(), _state['status'],
+                    _state['import_seconds'], _state['warmup_seconds'])
+
+
+def start_warmup():
+    """Run warm_up in a background thread (no-op when it already ran or is running)."""
+    global _warmup_thread
+    with _lock:
+        if _app is not None or (_warmup_thread is not None and _warmup_thread.is_alive()):
+            return
+        _state['status'] = 'warming'
+        _warmup_thread = threading.Thread(target=warm_up, name='warmup', daemon=True)
+        _warmup_thread.start()
+
+
+def load_app():
+    """app.app, importing app.py and warming up first when that has not happened yet."""
+    if _app is None:
+        warm_up()
+    if _app is None:
+        raise RuntimeError(f'Clustering app unavailable ({_state["error"]})')
+    return _app
+
+
+def _dispatch(environ, start_response):
+    if _app is None and environ.get('PATH_INFO', '/') in HEALTH_PATHS:
+        return _front(environ, start_response)
+    return load_app()(environ, start_response)
+
+
+def create_app():
+    """
+    WSGI application for gunicorn: health routes answered by a small front
+    app until app.py is loaded, everything else by app.app (see module docstring).
+    """
+    global _front
+    configure_logging()
+    if _front is None:
+        _front = Flask(__name__)
+        CORS(_front)
+        _front.register_blueprint(health_routes)
+    if WARMUP:
+        start_warmup()
+    return _dispatch
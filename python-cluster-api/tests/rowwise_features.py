@@ -0,0 +1,219 @@
+"""
+Row-wise feature functions that cluster_records applied per student
+(df.apply(..., axis=1)) before the columnar engine in features.py replaced
+them. Kept unchanged as the reference for tests/test_features.py.
+"""
+import pandas as pd
+
+
+def calculate_attendance_features(row):
+    """
+    Calculate attendance features from detailed attendance data.
+    Falls back to percentage if detailed counts are not available.
+    """
+    # If detailed attendance data is available
+    if pd.notna(row.get('attendance_present_count')) and pd.notna(row.get('attendance_total_sessions')):
+        present = float(row.get('attendance_present_count', 0))
+        absent = float(row.get('attendance_absent_count', 0))
+        late = float(row.get('attendance_late_count', 0))
+        total = float(row.get('attendance_total_sessions', 1))
+        
+        if total > 0:
+            present_rate = present / total
+            absent_rate = absent / total
+            late_rate = late / total
+            attendance_percentage = (present + late * 0.5) / total * 100  # Late counts as half present
+        else:
+            present_rate = 0.0
+            absent_rate = 0.0
+            late_rate = 0.0
+            attendance_percentage = 0.0
+    else:
+        # Fallback to percentage if detailed data not available
+        attendance_percentage = float(row.get('attendance_percentage', 75.0))
+        # Estimate counts from percentage (rough approximation)
+        present_rate = attendance_percentage / 100 * 0.85  # Assume 85% of attendance is present, 15% is late
+        absent_rate = (100 - attendance_percentage) / 100
+        late_rate = attendance_percentage / 100 * 0.15
+    
+    return {
+        'attendance_percentage': attendance_percentage,
+        'attendance_present_rate': present_rate,
+        'attendance_absent_rate': absent_rate,
+        'attendance_late_rate': late_rate
+    }
+
+
+def calculate_submission_features(row):
+    """
+    Calculate submission features based on status counts (ontime, late, missing).
+    Uses numerical values derived directly from submission status counts.
+    No deadline calculations - purely status-based.
+    """
+    # Get submission status counts (these are the core numerical values)
+    ontime_count = float(row.get('submission_ontime_count', 0)) if pd.notna(row.get('submission_ontime_count')) else 0.0
+    late_count = float(row.get('submission_late_count', 0)) if pd.notna(row.get('submission_late_count')) else 0.0
+    missing_count = float(row.get('submission_missing_count', 0)) if pd.notna(row.get('submission_missing_count')) else 0.0
+    total_assessments = float(row.get('submission_total_assessments', 0)) if pd.notna(row.get('submission_total_assessments')) else 0.0
+    
+    # Calculate total submissions (ontime + late, excluding missing)
+    total_submissions = ontime_count + late_count
+    
+    # Calculate rates (proportions) from status counts
+    if total_assessments > 0:
+        ontime_rate = ontime_count / total_assessments
+        late_rate = late_count / total_assessments
+        missing_rate = missing_count / total_assessments
+        submission_rate = total_submissions / total_assessments  # Overall submission rate
+    else:
+        # Default values if no assessments
+        ontime_rate = 0.0
+        late_rate = 0.0
+        missing_rate = 1.0
+        submission_rate = 0.0
+    
+    # Calculate numerical status score based on status distribution
+    # Score range: 0.0-2.0, HIGHER IS BETTER (normalized to match quality_score direction)
+    # Formula: (ontime Ã— 2 + late Ã— 1 + missing Ã— 0) / total
+    # This gives a weighted average where:
+    # - ontime = 2 (best)
+    # - late = 1 (moderate)
+    # - missing = 0 (worst)
+    # NOTE: Same as quality_score for consistency - both use 0, 1, 2 weights with higher=better
+    if total_assessments > 0:
+        submission_status_score = (ontime_count * 2.0 + late_count * 1.0 + missing_count * 0.0) / total_assessments
+    else:
+        submission_status_score = 0.0  # Worst case if no data
+    
+    # Calculate submission quality score (0.0-2.0 scale, HIGHER IS BETTER)
+    # Uses weighted scoring: ontime=2, late=1, missing=0
+    # Formula: (ontime_count Ã— 2 + late_count Ã— 1 + missing_count Ã— 0) / total_assessments
+    # - 2.0 = all ontime (BEST)
+    # - 1.0 = all late (moderate)
+    # - 0.0 = all missing (WORST)
+    if total_assessments > 0:
+        # Quality score using 0, 1, 2 weights (same as status_score for consistency)
+        # Higher value = better (same as status_score)
+        quality_score = ((ontime_count * 2.0) + (late_count * 1.0) + (missing_count * 0.0)) / total_assessments
+    else:
+        quality_score = 0.0
+    
+    # Calculate ontime priority score (0-100 scale, higher is better)
+    # Specifically measures how much of student's work is submitted on time
+    # This is a direct measure of timeliness priority
+    if total_assessments > 0:
+        ontime_priority_score = (ontime_count / total_assessments) * 100.0
+    else:
+        ontime_priority_score = 0.0
+    
+    return {
+        # Raw counts (numerical values from status)
+        'submission_ontime_count': ontime_count,
+        'submission_late_count': late_count,
+        'submission_missing_count': missing_count,
+        'submission_total_assessments': total_assessments,
+        # Rates (proportions 0.0-1.0)
+        'submission_rate': submission_rate,
+        'submission_ontime_rate': ontime_rate,  # PRIORITIZED: Higher weight in clustering
+        'submission_late_rate': late_rate,
+        'submission_missing_rate': missing_rate,
+        # Computed scores
+        'submission_status_score': submission_status_score,  # 0.0-2.0, higher is better (ontime=2, late=1, missing=0)
+        'submission_quality_score': quality_score,  # 0.0-2.0, higher is better (ontime=2, late=1, missing=0)
+        'submission_ontime_priority_score': ontime_priority_score  # 0.0-100.0, direct ontime percentage
+    }
+
+
+def calculate_score_features(row):
+    """
+    Calculate score features using new grading computation system.
+    Uses pre-calculated transmuted scores from database which follow:
+
+    
+    1. Raw Score â†’ Adjusted Score (raw - penalty)
+    2. Adjusted Score â†’ Actual Score: (adjusted / max) Ã— 62.5 + 37.5 (non-zero based, min 37.5)
+    3. Actual Score â†’ Transmuted Score: actual Ã— (weight_percentage / 100)
+    4. Final Grade = SUM(transmuted_score) per course, then averaged across courses
+    
+    NEW: Also processes assessment-level transmuted scores grouped by ILO mapping.
+    This allows for ILO-specific performance analysis.
+    """
+    # Use pre-calculated average_score from database (sum of transmuted scores per course, averaged)
+    # This follows the new grading computation: Raw â†’ Adjusted â†’ Actual â†’ Transmuted
+    syllabus_weighted_score = float(row.get('average_score', 50.0)) if pd.notna(row.get('average_score')) else 50.0
+    
+    # Process assessment-level transmuted scores grouped by ILO (NEW)
+    assessment_scores_by_ilo = row.get('assessment_scores_by_ilo')
+    ilo_specific_scores = {}
+    ilo_average_scores = {}
+    
+    if assessment_scores_by_ilo and isinstance(assessment_scores_by_ilo, (list, dict)):
+        # Handle both JSON array and dict formats
+        ilo_data_list = assessment_scores_by_ilo if isinstance(assessment_scores_by_ilo, list) else [assessment_scores_by_ilo]
+        
+        for ilo_data in ilo_data_list:
+            if isinstance(ilo_data, dict):
+                ilo_id = ilo_data.get('ilo_id')
+                ilo_code = ilo_data.get('ilo_code', f'ILO_{ilo_id}')
+                assessments = ilo_data.get('assessments', [])
+                
+                if ilo_id and assessments:
+                    # Calculate average transmuted score for this ILO
+                    transmuted_scores = []
+                    total_weight = 0.0
+                    
+                    for assessment in assessments:
+                        if isinstance(assessment, dict):
+                            transmuted = assessment.get('transmuted_score')
+                            weight = assessment.get('weight_percentage', 0) or 0
+                            
+                            if transmuted is not None and not (isinstance(transmuted, float) and (transmuted != transmuted)):  # Check for NaN
+                                try:
+                                    transmuted_float = float(transmuted)
+                                    if transmuted_float >= 0:
+                                        transmuted_scores.append(transmuted_float)
+                                        total_weight += float(weight) if weight else 0
+                                except (ValueError, TypeError):
+                                    pass
+                    
+                    if transmuted_scores:
+                        # Calculate weighted average for this ILO
+                        if total_weight > 0:
+                            weighted_sum = sum(transmuted_scores)
+                            ilo_average = weighted_sum / len(transmuted_scores)  # Simple average for now
+                        else:
+                            ilo_average = sum(transmuted_scores) / len(transmuted_scores)
+                        
+                        ilo_specific_scores[f'ilo_{ilo_id}_score'] = ilo_average
+                        ilo_average_scores[ilo_id] = {
+                            'ilo_code': ilo_code,
+                            'average_score': ilo_average,
+                            'assessment_count': len(transmuted_scores),
+                            'total_weight': total_weight
+                        }
+    
+    # Calculate overall ILO-based score (average of all ILO scores if available)
+    ilo_based_final_score = syllabus_weighted_score
+    if ilo_specific_scores:
+        ilo_scores_list = [score for score in ilo_specific_scores.values() if score > 0]
+        if ilo_scores_list:
+            # Use weighted average of ILO scores, or simple average
+            ilo_based_final_score = sum(ilo_scores_list) / len(ilo_scores_list)
+            # Prefer ILO-based score if available
+            final_score = ilo_based_final_score
+        else:
+            final_score = syllabus_weighted_score
+    else:
+        # Use syllabus-weighted score as final_score
+        final_score = syllabus_weighted_score
+    
+    result = {
+        'average_score': syllabus_weighted_score,  # Final grade using new computation (transmuted scores)
+        'final_score': final_score,  # Primary score for clustering (syllabus or ILO-based)
+        'ilo_based_score': ilo_based_final_score  # Score calculated from ILO-specific assessments
+    }
+    
+    # Add ILO-specific scores to result
+    result.update(ilo_specific_scores)
+    
+    return result
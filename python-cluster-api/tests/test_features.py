@@ -0,0 +1,161 @@
+"""
+Parity of the columnar feature engine (features.compute_features) with the
+row-wise functions it replaced (tests/rowwise_features.py).
+
+    cd python-cluster-api
+    python -m pytest tests
+"""
+import math
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_records
+from features import compute_features
+from tests.rowwise_features import (
+    calculate_attendance_features,
+    calculate_score_features,
+    calculate_submission_features
+)
+
+
+def rowwise_features(df):
+    """Feature columns as the row-wise path built them (one dict per student, then one column per key)."""
+    features = {}
+    for function in (calculate_attendance_features, calculate_submission_features, calculate_score_features):
+        rows = df.apply(function, axis=1)
+        if len(rows) > 0:
+            frame = pd.DataFrame(rows.tolist())
+            for col in frame.columns:
+                features[col] = frame[col].to_numpy(dtype=float)
+    return features
+
+
+def assert_parity(records):
+    df = pd.DataFrame(records)
+    expected = rowwise_features(df)
+    actual = compute_features(df)
+    assert set(actual.columns) == set(expected)
+    for col, values in expected.items():
+        np.testing.assert_allclose(actual[col].to_numpy(dtype=float), values, rtol=1e-12, atol=0,
+                                   equal_nan=True, err_msg=col)
+
+
+def assessment(score, weight=25.0):
+    return {'assessment_id': 1, 'transmuted_score': score, 'weight_percentage': weight}
+
+
+def student(**fields):
+    record = {
+        'student_id': 1,
+        'attendance_percentage': 88.0,
+        'attendance_present_count': 20,
+        'attendance_absent_count': 2,
+        'attendance_late_count': 3,
+        'attendance_total_sessions': 25,
+        'submission_ontime_count': 8,
+        'submission_late_count': 1,
+        'submission_missing_count': 1,
+        'submission_total_assessments': 10,
+        'average_score': 81.5,
+        'assessment_scores_by_ilo': [
+            {'ilo_id': 1, 'ilo_code': 'ILO1', 'assessments': [assessment(80.0), assessment(90.0)]},
+            {'ilo_id': 2, 'ilo_code': 'ILO2', 'assessments': [assessment(70.0)]}
+        ]
+    }
+    record.update(fields)
+    return record
+
+
+EDGE_CASES = {
+    'complete': [student()],
+    'zero_sessions': [student(attendance_present_count=0, attendance_absent_count=0,
+                              attendance_late_count=0, attendance_total_sessions=0)],
+    'percentage_only_attendance': [student(attendance_present_count=None, attendance_total_sessions=None),
+                                   student(attendance_present_count=5, attendance_total_sessions=None)],
+    'no_attendance': [{k: v for k, v in student().items() if not k.startswith('attendance_')}],
+    'nan_counts': [student(attendance_absent_count=float('nan'), submission_late_count=float('nan'))],
+    'zero_assessments': [student(submission_ontime_count=0, submission_late_count=0,
+                                 submission_missing_count=0, submission_total_assessments=0)],
+    'missing_submission_counts': [student(submission_ontime_count=None, submission_total_assessments=None)],
+    'missing_average_score': [student(average_score=None, assessment_scores_by_ilo=None)],
+    'nan_and_invalid_transmuted_scores': [student(assessment_scores_by_ilo=[
+        {'ilo_id': 1, 'assessments': [assessment(float('nan')), assessment(None), assessment('abc'),
+                                      assessment(-5.0), assessment('72.5'), assessment(True)]},
+        {'ilo_id': 2, 'assessments': [assessment(float('nan'))]},
+        {'ilo_id': 3, 'assessments': [assessment(0.0)]},
+        {'ilo_id': 4, 'assessments': [assessment(60.0, weight='heavy'), assessment(70.0, weight=None)]}
+    ])],
+    'duplicate_ilo_ids': [student(assessment_scores_by_ilo=[
+        {'ilo_id': 1, 'assessments': [assessment(80.0)]},
+        {'ilo_id': 2, 'assessments': [assessment(70.0)]},
+        {'ilo_id': 1, 'assessments': [assessment(60.0), assessment(50.0)]},
+        {'ilo_id': 1, 'assessments': [assessment('bad')]}
+    ])],
+    'dict_shaped_payload': [student(assessment_scores_by_ilo={
+        'ilo_id': 7, 'ilo_code': 'ILO7', 'assessments': [assessment(66.0), assessment(74.0)]
+    })],
+    'malformed_payloads': [
+        student(assessment_scores_by_ilo=[]),
+        student(assessment_scores_by_ilo={}),
+        student(assessment_scores_by_ilo='ILO1: 80'),
+        student(assessment_scores_by_ilo=[None, 'x', {'ilo_id': None, 'assessments': [assessment(90.0)]},
+                                          {'ilo_id': 0, 'assessments': [assessment(90.0)]},
+                                          {'ilo_id': 5, 'assessments': []},
+                                          {'ilo_id': 6, 'assessments': [None, assessment(55.0)]}])
+    ],
+    'string_numbers': [student(attendance_present_count='20', attendance_total_sessions='25',
+                               submission_total_assessments='10', average_score='81.5')]
+}
+
+
+@pytest.mark.parametrize('case', sorted(EDGE_CASES))
+def test_edge_cases(case):
+    assert_parity(EDGE_CASES[case])
+
+
+def test_edge_cases_together():
+    # Different students in one frame: ILO columns are unions, absent ones NaN
+    assert_parity([record for case in sorted(EDGE_CASES) for record in EDGE_CASES[case]])
+
+
+def test_unparseable_numbers():
+    # The row-wise path raised (the whole request fell back to error_results);
+    # the columnar engine treats such values as missing
+    df = pd.DataFrame([student(attendance_percentage='n/a', attendance_present_count=None,
+                               average_score='n/a', submission_ontime_count='?')])
+    with pytest.raises(ValueError):
+        rowwise_features(df)
+    actual = compute_features(df)
+    assert math.isnan(actual.loc[0, 'attendance_percentage'])
+    assert actual.loc[0, 'submission_ontime_count'] == 0.0
+    assert actual.loc[0, 'average_score'] == 50.0
+
+
+def test_synthetic_cohort():
+    assert_parity(generate_records(2000, seed=7))
+
+
+def test_randomized_records():
+    rng = random.Random(11)
+    # Only values the row-wise path accepted (see test_unparseable_numbers)
+    values = [None, float('nan'), 0, 1, 3, 12, 40, -2, math.inf]
+    scores = [None, float('nan'), 'abc', -1.0, 0.0, 35.5, 78.25, '90', 100.0]
+    records = []
+    for idx in range(500):
+        record = student(student_id=idx)
+        for key in list(record):
+            if key.endswith(('_count', '_sessions', '_assessments')) and rng.random() < 0.4:
+                record[key] = rng.choice(values)
+        if rng.random() < 0.3:
+            record['attendance_percentage'] = rng.choice(values + [55.5, 100])
+        if rng.random() < 0.5:
+            record['assessment_scores_by_ilo'] = [
+                {'ilo_id': rng.choice([1, 2, 3, 3, 0, None]),
+                 'assessments': [assessment(rng.choice(scores)) for _ in range(rng.randint(0, 3))]}
+                for _ in range(rng.randint(0, 4))
+            ]
+        records.append(record)
+    assert_parity(records)
@@ -0,0 +1,71 @@
+"""
+Memory cap of finished job results (JOBS_MAX_RESULT_BYTES), with and
+without JOBS_DIR.
+
+    cd python-cluster-api
+    python -m pytest tests
+"""
+import time
+from collections import OrderedDict
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture(autouse=True)
+def fresh_jobs(monkeypatch):
+    for name, value in (('_jobs', {}), ('_results', OrderedDict()), ('_timings', {}), ('_expires', {}),
+                        ('_result_bytes', 0), ('JOBS_DIR', None), ('JOBS_MAX_RESULT_BYTES', 100)):
+        monkeypatch.setattr(jobs, name, value)
+
+
+def result(size):
+    return b'x' * size, {}
+
+
+def wait(job_id):
+    for _ in range(200):
+        job, job_result = jobs.get(job_id)
+        if job is None or job['status'] in jobs.FINISHED:
+            return job, job_result
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def test_least_recently_read_results_dropped_over_cap():
+    first, second = (jobs.submit(None, 1, cached=result(40))['id'] for _ in range(2))
+    jobs.get(first)
+    third = jobs.submit(None, 1, cached=result(40))['id']
+    assert jobs.get(second) == (None, None)
+    assert jobs.get(first)[1] == result(40)
+    assert jobs.get(third)[1] == result(40)
+    assert jobs._result_bytes == 80
+
+
+def test_ran_job_result_counted():
+    job = jobs.submit(lambda timings: result(60), 1)
+    assert wait(job['id'])[1] == result(60)
+    jobs.submit(None, 1, cached=result(60))
+    assert jobs.get(job['id']) == (None, None)
+    assert jobs._result_bytes == 60
+
+
+def test_result_over_cap_fails_without_jobs_dir():
+    job, job_result = wait(jobs.submit(lambda timings: result(101), 1)['id'])
+    assert job['status'] == 'failed' and 'JOBS_MAX_RESULT_BYTES' in job['error']
+    assert job_result is None
+    cached = jobs.submit(None, 1, cached=result(101))
+    assert cached['status'] == 'failed'
+    assert jobs._result_bytes == 0
+
+
+def test_dropped_results_read_from_jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOBS_DIR', str(tmp_path))
+    large = wait(jobs.submit(lambda timings: result(101), 1)['id'])
+    assert large[0]['status'] == 'done' and large[1] == result(101)
+    assert jobs._results == {}
+    first = jobs.submit(None, 1, cached=result(60))['id']
+    jobs.submit(None, 1, cached=result(60))
+    assert first not in jobs._results
+    assert jobs.get(first)[1] == result(60)
@@ -0,0 +1,93 @@
+"""
+Metrics shared through METRICS_DIR: files of exited workers folded into one
+file (counters kept, gauges dropped, nothing counted twice) and the
+background flush.
+
+    cd python-cluster-api
+    python -m pytest tests
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', True)
+    # This process's own values are set aside and put back afterwards
+    saved = metrics.drain()
+    yield tmp_path
+    metrics.drain()
+    metrics.merge(saved)
+
+
+def exited_pid():
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return proc.pid
+
+
+def write_values(directory, pid, requests, in_flight):
+    path = directory / f'{pid}-0123abcd.json'
+    path.write_text(json.dumps({
+        'histograms': [[metrics.STAGE_SECONDS, {'stage': 'parse'}, [1] + [0] * len(metrics.BUCKETS), 0.001]],
+        'counters': [[metrics.REQUESTS, {'endpoint': '/api/cluster', 'status': 200}, requests]],
+        'gauges': [[metrics.ADMISSION_IN_FLIGHT, {}, in_flight]]
+    }))
+    return path
+
+
+def totals():
+    histograms, counters = metrics.collect()
+    requests = counters.get(metrics._key(metrics.REQUESTS, {'endpoint': '/api/cluster', 'status': 200}), 0)
+    in_flight = counters.get(metrics._key(metrics.ADMISSION_IN_FLIGHT, {}), 0)
+    parse = histograms.get(metrics._key(metrics.STAGE_SECONDS, {'stage': 'parse'}), [[0], 0.0])
+    return requests, in_flight, sum(parse[0])
+
+
+def test_exited_workers_folded(metrics_dir):
+    first = write_values(metrics_dir, exited_pid(), 3, 1)
+    second = write_values(metrics_dir, exited_pid(), 4, 1)
+    live = write_values(metrics_dir, os.getppid(), 5, 2)
+    # Counters and histograms of exited workers still count, their gauges do not
+    assert totals() == (12, 2, 3)
+    assert not first.exists() and not second.exists() and live.exists()
+    assert (metrics_dir / metrics.EXITED_FILE).exists()
+    # Folded once: later scrapes report the same totals
+    assert totals() == (12, 2, 3)
+    third = write_values(metrics_dir, exited_pid(), 1, 1)
+    assert totals() == (13, 2, 4)
+    assert not third.exists()
+
+
+def test_failed_removal_not_counted_twice(metrics_dir, monkeypatch):
+    path = write_values(metrics_dir, exited_pid(), 3, 0)
+    with monkeypatch.context() as patch:
+        patch.setattr(metrics.os, 'remove', lambda path: None)
+        assert totals()[0] == 3
+        assert path.exists()
+        assert totals()[0] == 3
+    # Removed by the next scrape, still counted once
+    assert totals()[0] == 3
+    assert not path.exists()
+
+
+def test_schedule_flush_writes_in_background(metrics_dir, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_FLUSH_SECONDS', 0.05)
+    monkeypatch.setattr(metrics, '_flusher', None)
+    own_file = metrics_dir / f'{metrics._process_id}.json'
+    metrics.inc(metrics.STUDENTS_PROCESSED, 7)
+    metrics.schedule_flush()
+    assert not own_file.exists()
+    for _ in range(100):
+        if own_file.exists():
+            break
+        time.sleep(0.02)
+    assert [metrics.STUDENTS_PROCESSED, {}, 7] in json.loads(own_file.read_text())['counters']
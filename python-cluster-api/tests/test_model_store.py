@@ -0,0 +1,63 @@
+"""
+model_store with MODEL_STORE_DIR: concurrent saves of one scope, reloads of
+models saved elsewhere, and the in-memory LRU.
+
+    cd python-cluster-api
+    python -m pytest tests
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import pytest
+
+import model_store
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_store, 'MODEL_STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(model_store, '_models', OrderedDict())
+    return tmp_path
+
+
+def test_concurrent_saves_of_one_scope(store_dir, caplog):
+    # Each writer has its own temporary file, so no save fails and the file is always one whole model
+    models = [{'scope': 'section-1', 'writer': writer, 'centers': [[float(i)] * 50 for i in range(50)]}
+              for writer in range(8)]
+    barrier = threading.Barrier(len(models))
+
+    def save(model):
+        barrier.wait()
+        for _ in range(20):
+            model_store.save_model('section-1', model)
+
+    threads = [threading.Thread(target=save, args=(model,)) for model in models]
+    with caplog.at_level(logging.WARNING, logger='cluster_api.model_store'):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert not caplog.records
+    with open(store_dir / 'section-1.json') as f:
+        assert json.load(f) in models
+    assert os.listdir(store_dir) == ['section-1.json']
+
+
+def test_reloads_model_saved_elsewhere(store_dir):
+    model_store.save_model('section-1', {'version': 1})
+    path = store_dir / 'section-1.json'
+    path.write_text(json.dumps({'version': 2}))
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    assert model_store.load_model('section-1') == {'version': 2}
+
+
+def test_lru_limit(store_dir, monkeypatch):
+    monkeypatch.setattr(model_store, 'MODEL_STORE_MAX_MODELS', 2)
+    for scope in ('a', 'b', 'c'):
+        model_store.save_model(scope, {'scope': scope})
+    assert list(model_store._models) == ['b', 'c']
+    # Dropped from memory, still on disk
+    assert model_store.load_model('a') == {'scope': 'a'}
@@ -0,0 +1,25 @@
+"""
+profiling.py is shared with python-ilo-clustering-api, which keeps a copy
+(each service is built from its own directory): the copy must not drift.
+
+    cd python-cluster-api
+    python -m pytest tests
+"""
+import os
+
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COPY_PATH = os.path.join(os.path.dirname(PACKAGE_DIR), 'python-ilo-clustering-api', 'profiling.py')
+
+
+def test_ilo_copy_matches():
+    with open(os.path.join(PACKAGE_DIR, 'profiling.py')) as f:
+        source = f.read()
+    with open(COPY_PATH) as f:
+        lines = f.read().splitlines(keepends=True)
+    header = 0
+    while header < len(lines) and lines[header].startswith('#'):
+        header += 1
+    assert header, f'{COPY_PATH} lost its header naming python-cluster-api/profiling.py as the source'
+    assert ''.join(lines[header:]) == source, \
+        f'{COPY_PATH} differs from python-cluster-api/profiling.py: copy the source below its header'
@@ -0,0 +1,39 @@
+"""
+replayed_body: responses served from the response cache or a coalesced run
+mark their _meta block, with either JSON encoder, and leave other bodies alone.
+
+    cd python-cluster-api
+    python -m pytest tests
+"""
+import pytest
+
+import serialization
+from app import replayed_body
+from serialization import decode_json, encode_json
+
+
+META = {'row_count': 2, 'chosen_k': 2, 'timings_ms': {'parse': 1.5, 'k_sweep': 20.0}}
+STUDENTS = [{'student_id': 1, 'full_name': 'Peña', 'cluster': 0}, {'student_id': 2, 'full_name': 'Zoë', 'cluster': 1}]
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson' and serialization.orjson is None:
+        pytest.skip('orjson not installed')
+    monkeypatch.setattr(serialization, 'JSON_ENCODER', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('body', [
+    {'students': STUDENTS, '_meta': META},
+    {'students': STUDENTS, 'clusters': [], 'validation': None, '_meta': META}
+])
+def test_meta_marked(encoder, body):
+    replayed = replayed_body(encode_json(body) + b'\n', 'HIT', True)
+    assert replayed.endswith(b'\n')
+    assert decode_json(replayed) == dict(body, _meta=dict(META, cache='HIT'))
+
+
+def test_without_meta_unchanged(encoder):
+    stored = encode_json(STUDENTS) + b'\n'
+    assert replayed_body(stored, 'COALESCED', False) is stored
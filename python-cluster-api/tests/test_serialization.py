@@ -0,0 +1,93 @@
+"""
+encode_json against Flask's jsonify, with non-ASCII student names: the stdlib
+encoder writes the jsonify bytes; orjson writes the same JSON with those
+characters as raw UTF-8 instead of \\uXXXX escapes (see serialization.py).
+
+    cd python-cluster-api
+    python -m pytest tests
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask
+
+import serialization
+from serialization import FastJSONProvider, encode_json, frame_to_records
+
+
+NAMES = ['Peña', 'José Ñuñez', 'Zoë Müller', 'Łukasz Żółć', 'Nguyễn Văn An', '李小龍', 'Ana 🎓', 'O\'Brien "Jr"\\']
+
+# ISO dates and plain floats only: floats below 1e-4 or from 1e16 are written in another
+# (equivalent) exponent notation by orjson (see serialization.py)
+RECORDS = [{
+    'student_id': idx + 1,
+    'full_name': name,
+    'section': 'BSIT 3-A — Turno Mañana',
+    'attendance_percentage': 87.5 + idx,
+    'silhouette_score': 0.4123456789,
+    'cluster': idx % 3,
+    'cluster_label': 'Excellent Performance',
+    'flags': [True, False, None],
+    'assessment_scores_by_ilo': [{'ilo_id': 1, 'ilo_code': 'ILO1 – Análisis', 'assessments': []}]
+} for idx, name in enumerate(NAMES)]
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson' and serialization.orjson is None:
+        pytest.skip('orjson not installed')
+    monkeypatch.setattr(serialization, 'JSON_ENCODER', request.param)
+    return request.param
+
+
+def jsonify_bytes(obj, encoder='stdlib'):
+    """
+    Response bytes of Flask's default jsonify; for orjson with the non-ASCII
+    characters unescaped, the only difference between the two.
+    """
+    app = Flask(__name__)
+    if encoder == 'orjson':
+        app.json.ensure_ascii = False
+    with app.app_context():
+        return app.json.response(obj).get_data()
+
+
+def test_same_bytes_as_jsonify(encoder):
+    assert encode_json(RECORDS) + b'\n' == jsonify_bytes(RECORDS, encoder)
+
+
+def test_ascii_payload_same_bytes_as_jsonify(encoder):
+    records = [dict(record, full_name=f'Student {idx}', section='BSIT 3-A',
+                    assessment_scores_by_ilo=[]) for idx, record in enumerate(RECORDS)]
+    assert encode_json(records) + b'\n' == jsonify_bytes(records)
+
+
+def test_non_ascii_names(encoder):
+    body = encode_json({'full_name': 'Peña', 'emoji': '🎓'})
+    if encoder == 'stdlib':
+        assert body == b'{"emoji":"\\ud83c\\udf93","full_name":"Pe\\u00f1a"}'
+    else:
+        assert body == '{"emoji":"🎓","full_name":"Peña"}'.encode('utf-8')
+    assert json.loads(body) == {'full_name': 'Peña', 'emoji': '🎓'}
+
+
+def test_provider_same_bytes_as_jsonify(encoder):
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    with app.app_context():
+        assert app.json.response(RECORDS).get_data() == jsonify_bytes(RECORDS, encoder)
+
+
+def test_frame_records_same_bytes_as_jsonify(encoder):
+    # NaN/inf and NumPy types as in the clustering output; jsonify got them cleaned to None
+    frame = pd.DataFrame(RECORDS)
+    frame['silhouette_score'] = [np.nan, np.inf] + [0.25] * (len(frame) - 2)
+    frame['student_id'] = frame['student_id'].astype('Int64')
+    frame.loc[2, 'student_id'] = pd.NA
+    expected = [{key: (None if isinstance(value, float) and not np.isfinite(value) else value)
+                 for key, value in record.items()} for record in frame.to_dict(orient='records')]
+    for record in expected:
+        record['student_id'] = None if pd.isna(record['student_id']) else int(record['student_id'])
+    assert encode_json(frame_to_records(frame)) + b'\n' == jsonify_bytes(expected, encoder)
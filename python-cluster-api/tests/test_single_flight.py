@@ -0,0 +1,88 @@
+"""
+single_flight across workers (SINGLE_FLIGHT_DIR): results shared through the
+lock file, and the purge of old files leaving lock files in use alone.
+
+    cd python-cluster-api
+    python -m pytest tests
+"""
+import fcntl
+import os
+import threading
+import time
+
+import pytest
+
+import single_flight
+
+
+@pytest.fixture
+def flight_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(single_flight, 'SINGLE_FLIGHT_DIR', str(tmp_path))
+    return tmp_path
+
+
+def make_old(path):
+    past = time.time() - single_flight.SINGLE_FLIGHT_FILE_SECONDS - 60
+    os.utime(path, (past, past))
+
+
+def test_result_shared_through_lock_file(flight_dir):
+    result, coalesced = single_flight.run('a' * 64, lambda: (b'[1]\n', {'X-Validation-Report': 'null'}))
+    assert (result, coalesced) == ((b'[1]\n', {'X-Validation-Report': 'null'}), False)
+    assert single_flight._read_result('a' * 64, 0) == result
+
+
+def test_waiting_worker_takes_result(flight_dir):
+    # A second open file description conflicts like another worker's would
+    key = 'b' * 64
+    holder = open(flight_dir / f'{key}.lock', 'a')
+    fcntl.flock(holder, fcntl.LOCK_EX)
+    outcome = []
+    waiter = threading.Thread(target=lambda: outcome.append(
+        single_flight._run_across_workers(key, lambda: (b'recomputed', {}))))
+    waiter.start()
+    time.sleep(0.2)
+    single_flight._write_result(key, (b'shared', {}))
+    fcntl.flock(holder, fcntl.LOCK_UN)
+    holder.close()
+    waiter.join()
+    assert outcome == [((b'shared', {}), True)]
+
+
+def test_purge_keeps_held_lock_files(flight_dir):
+    held = flight_dir / f'{"c" * 64}.lock'
+    idle = flight_dir / f'{"d" * 64}.lock'
+    result = flight_dir / f'{"d" * 64}.result'
+    for path in (held, idle, result):
+        path.write_bytes(b'')
+        make_old(path)
+    with open(held, 'a') as holder:
+        fcntl.flock(holder, fcntl.LOCK_EX)
+        single_flight._purge_files()
+        assert held.exists()
+    assert not idle.exists()
+    assert not result.exists()
+
+
+def test_purged_lock_file_is_replaced(flight_dir):
+    # A worker that waited for a lock file removed meanwhile must lock the file newcomers use
+    key = 'e' * 64
+    lock_path = flight_dir / f'{key}.lock'
+    holder = open(lock_path, 'a')
+    fcntl.flock(holder, fcntl.LOCK_EX)
+    locked_inodes = []
+
+    def run():
+        locked_inodes.append(os.stat(lock_path).st_ino)
+        return b'ran', {}
+
+    waiter = threading.Thread(target=lambda: single_flight._run_across_workers(key, run))
+    waiter.start()
+    time.sleep(0.2)
+    os.remove(lock_path)
+    fcntl.flock(holder, fcntl.LOCK_UN)
+    holder.close()
+    waiter.join()
+    # run() found the lock file in place: the waiter did not run on the removed one
+    assert len(locked_inodes) == 1
+    assert single_flight._read_result(key, 0) == (b'ran', {})
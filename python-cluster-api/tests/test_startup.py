@@ -0,0 +1,59 @@
+"""
+GET /ready of the startup front application while app.py loads, fails to
+import, or imports but fails the warm-up run.
+
+    cd python-cluster-api
+    python -m pytest tests
+"""
+import sys
+import types
+
+import pytest
+from flask import Flask
+from werkzeug.test import Client
+
+import startup
+
+
+@pytest.fixture
+def front(monkeypatch):
+    monkeypatch.setattr(startup, '_state', {'status': 'cold', 'import_seconds': None,
+                                            'warmup_seconds': None, 'error': None})
+    monkeypatch.setattr(startup, '_app', None)
+    monkeypatch.setattr(startup, '_front', None)
+    monkeypatch.setattr(startup, '_warmup_thread', None)
+    monkeypatch.setattr(startup, 'WARMUP', False)
+    return Client(startup.create_app())
+
+
+def ready(client):
+    response = client.get('/ready')
+    if response.get_json()['status'] == 'warming':
+        startup._warmup_thread.join()
+        response = client.get('/ready')
+    return response
+
+
+def test_import_failure_not_ready(front, monkeypatch):
+    # None in sys.modules makes `import app` raise ImportError
+    monkeypatch.setitem(sys.modules, 'app', None)
+    response = ready(front)
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'failed'
+    assert response.get_json()['error'].startswith('import app')
+
+
+def test_warmup_failure_still_ready(front, monkeypatch):
+    def cluster_records(records):
+        raise ValueError('warm-up')
+
+    # app.py serves the health routes itself once loaded
+    flask_app = Flask('fake')
+    flask_app.register_blueprint(startup.health_routes)
+    fake_app = types.SimpleNamespace(app=flask_app, cluster_records=cluster_records,
+                                     metrics=types.SimpleNamespace(drain=lambda: None))
+    monkeypatch.setitem(sys.modules, 'app', fake_app)
+    response = ready(front)
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'failed'
+    assert response.get_json()['error'] == 'warm-up: warm-up'
@@ -0,0 +1,109 @@
+"""
+Thread Budget
+=============
+Caps the native threads of the scikit-learn calls in cluster_frame (PCA,
+KMeans, silhouette). OpenBLAS/MKL and OpenMP each start one thread per core
+by default, so with several gunicorn workers and several clustering runs per
+worker the box runs many times more threads than cores and spends the
+difference on context switches.
+
+Each run gets a budget of
+
+    max(1, THREAD_BUDGET_CPUS // (WEB_CONCURRENCY * runs in progress in this process))
+
+threads, applied with threadpoolctl for the duration of the run. OpenMP
+limits (the KMeans loops) are per thread and hold the budget computed when
+the run started. The BLAS limit (PCA, silhouette distances) is process-wide:
+it is recomputed whenever a run starts or finishes, and the original limit is
+restored once no run is in progress. Batch pool processes divide their share
+by the pool size (see set_process_share).
+
+The effective counts are reported per run as threads in the _meta block
+(?meta=1) and as a threads entry of Server-Timing.
+
+Environment variables:
+- THREAD_BUDGET_ENABLED: 1 (default) or 0
+- THREAD_BUDGET_CPUS: cores to share (default: CPU count)
+- WEB_CONCURRENCY: gunicorn workers on the box (default 1; gunicorn reads it for --workers too)
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from threadpoolctl import ThreadpoolController
+
+import metrics
+
+
+THREAD_BUDGET_ENABLED = os.environ.get('THREAD_BUDGET_ENABLED', '1') not in ('0', 'false')
+THREAD_BUDGET_CPUS = max(1, int(os.environ.get('THREAD_BUDGET_CPUS', str(os.cpu_count() or 1))))
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+
+_controller = None  # created on first use, once NumPy and scikit-learn have loaded their libraries
+_blas_limiter = None  # first BLAS limit of the current busy period; restores the original limit
+_active = 0
+_process_share = 1
+_lock = threading.Lock()
+
+
+def set_process_share(processes):
+    """Divide this process's budget by `processes` (batch pool initializer: the pool shares the worker's cores)."""
+    global _process_share
+    _process_share = max(1, processes)
+
+
+def budget(active=None):
+    """Threads per run with `active` runs in progress in this process (default: the current count)."""
+    runs = max(1, _active if active is None else active)
+    return max(1, THREAD_BUDGET_CPUS // (WEB_CONCURRENCY * _process_share * runs))
+
+
+def _num_threads(user_api):
+    counts = [lib.num_threads for lib in _controller.lib_controllers if lib.user_api == user_api]
+    return min(counts) if counts else None
+
+
+def _limit_blas():
+    # Called with _lock held
+    global _blas_limiter
+    limiter = _controller.limit(limits=budget(), user_api='blas')
+    if _blas_limiter is None:
+        _blas_limiter = limiter
+
+
+@contextmanager
+def limit():
+    """
+    Run the with-block under this run's thread budget. Yields the effective
+    counts {"budget", "concurrent", "blas", "openmp"} (None when disabled).
+    """
+    global _controller, _active, _blas_limiter
+    if not THREAD_BUDGET_ENABLED:
+        yield None
+        return
+    with _lock:
+        if _controller is None:
+            _controller = ThreadpoolController()
+        _active += 1
+        threads = budget()
+        concurrent = _active
+        _limit_blas()
+    openmp_limiter = _controller.limit(limits=threads, user_api='openmp')
+    effective = {
+        'budget': threads,
+        'concurrent': concurrent,
+        'blas': _num_threads('blas'),
+        'openmp': _num_threads('openmp')
+    }
+    metrics.note('threads', ' '.join(f'{key}={value}' for key, value in effective.items()))
+    try:
+        yield effective
+    finally:
+        openmp_limiter.restore_original_limits()
+        with _lock:
+            _active -= 1
+            if _active:
+                _limit_blas()
+            else:
+                _blas_limiter.restore_original_limits()
+                _blas_limiter = None
@@ -5,7 +5,7 @@ Flask API wrapper for ILO-based student clustering analysis script.
 Deployed on Railway to handle clustering requests from the Node.js backend.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import sys
 import os
@@ -15,6 +15,8 @@ from pathlib import Path
 from datetime import datetime
 import tempfile
 
+import profiling
+
 app = Flask(__name__)
 CORS(app)
 
@@ -60,6 +62,7 @@ def health():
 
 
 @app.route("/api/ilo-clustering", methods=["POST", "OPTIONS"])
+@profiling.profiled
 def cluster_ilo():
     """
     ILO-based clustering endpoint.
@@ -167,6 +170,12 @@ def cluster_ilo():
         if cdio_id:
             cmd.extend(['--cdio_id', str(cdio_id)])
         
+        # Profiled request: run the script under the sampler too (its stacks join the request profile)
+        profile = profiling.current()
+        script_profile = output_dir / 'script.folded'
+        if profile is not None:
+            cmd[1:1] = [profiling.PROFILER_SCRIPT, '--output', str(script_profile)]
+        
         print(f"[ILO CLUSTERING API] Executing: {' '.join(cmd)}")
         
         # Run the script
@@ -177,6 +186,9 @@ def cluster_ilo():
             timeout=300  # 5 minute timeout
         )
         
+        if profile is not None and script_profile.exists():
+            profile.add_folded(script_profile, root=f'[subprocess] {script_path.name}')
+        
         if result.returncode != 0:
             error_msg = result.stderr or result.stdout or "Unknown error"
             print(f"[ILO CLUSTERING API] Script failed with code {result.returncode}")
@@ -300,6 +312,15 @@ def cluster_ilo():
         }), 500
 
 
+@app.route("/api/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """Folded stacks of a profiled request (X-Profile-Id); needs the same X-Profile header"""
+    path = profiling.profile_path(profile_id) if profiling.authorized(request) else None
+    if path is None or not os.path.exists(path):
+        return jsonify({"success": False, "error": "Profile not found"}), 404
+    return send_file(path, mimetype='text/plain')
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10001))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,206 @@
+# Vendored copy of python-cluster-api/profiling.py: each service is built from its own
+# directory. Edit that file and copy it over everything below this header;
+# python-cluster-api/tests/test_profiling.py fails while the two differ.
+"""
+Request Profiling
+=================
+Opt-in sampling profiler for requests that are slow in production.
+
+Profiling is on only when PROFILING_TOKEN is set, and then only for requests
+whose X-Profile header carries that token. Such a request runs while a
+background thread records the handler thread's Python stack every
+PROFILING_INTERVAL_MS. The profile is stored in PROFILING_DIR as folded
+stacks (one "root;caller;callee count" line per distinct stack, the input
+of flamegraph.pl, inferno and speedscope) and the response names it in
+X-Profile-Id; GET /api/profiles/<id> (same header) downloads it.
+
+- No overhead when off: without PROFILING_TOKEN, profiled(view) returns the
+  view itself, so nothing runs per request.
+- At most PROFILING_MAX_CONCURRENT requests per process are profiled at a
+  time; further profiling requests run normally with X-Profile-Status: busy.
+- Only the handler is sampled (a streamed body is produced after it returns).
+  Work a handler starts in a subprocess can be profiled by running the
+  subprocess through this module and adding its stacks with add_folded:
+
+    python profiling.py --output script.folded script.py [script args...]
+
+python-ilo-clustering-api/profiling.py is a copy of this file (each service
+is built from its own directory); tests/test_profiling.py fails until a change
+here is copied there too.
+
+Environment variables:
+- PROFILING_TOKEN: secret the X-Profile header must match (unset: profiling off)
+- PROFILING_DIR: where profiles are stored (default: <tmp>/request-profiles)
+- PROFILING_INTERVAL_MS: sampling interval (default 5)
+- PROFILING_MAX_CONCURRENT: requests profiled at a time per process (default 1)
+- PROFILING_KEEP: most recent profiles kept in PROFILING_DIR (default 50)
+"""
+import argparse
+import functools
+import hmac
+import os
+import re
+import runpy
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import make_response, request
+
+
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILING_DIR = os.environ.get('PROFILING_DIR') or os.path.join(tempfile.gettempdir(), 'request-profiles')
+PROFILING_INTERVAL_MS = float(os.environ.get('PROFILING_INTERVAL_MS', '5'))
+PROFILING_MAX_CONCURRENT = int(os.environ.get('PROFILING_MAX_CONCURRENT', '1'))
+PROFILING_KEEP = int(os.environ.get('PROFILING_KEEP', '50'))
+
+PROFILE_HEADER = 'X-Profile'
+PROFILER_SCRIPT = os.path.abspath(__file__)
+
+# Profile ids are generated here; anything else (e.g. '../') is rejected
+_PROFILE_ID = re.compile(r'^[0-9A-Za-z_-]+$')
+
+_slots = threading.BoundedSemaphore(max(1, PROFILING_MAX_CONCURRENT))
+_local = threading.local()  # .sampler: the Sampler profiling this thread's request
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """Counts the stacks of one thread, sampled every `interval` seconds from a background thread."""
+
+    def __init__(self, thread_id=None, interval=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = (PROFILING_INTERVAL_MS if interval is None else interval) / 1000
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def add_folded(self, path, root):
+        """Add the stacks of a folded file (e.g. a profiled subprocess) under the frame `root`."""
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    self.stacks[f'{root};{stack}'] += int(count)
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def authorized(req):
+    """True when profiling is on and the request's X-Profile header matches PROFILING_TOKEN."""
+    token = req.headers.get(PROFILE_HEADER)
+    return bool(PROFILING_TOKEN and token) and hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode())
+
+
+def current():
+    """Sampler profiling the current request, or None."""
+    return getattr(_local, 'sampler', None)
+
+
+def profile_path(profile_id):
+    """Path of a stored profile, or None for ids this module could not have generated."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    return os.path.join(PROFILING_DIR, f'{profile_id}.folded')
+
+
+def save(sampler, name):
+    """Store the sampler's folded stacks in PROFILING_DIR (keeping the newest PROFILING_KEEP); returns the id."""
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    profile_id = f'{time.strftime("%Y%m%dT%H%M%S")}-{name}-{uuid.uuid4().hex[:8]}'
+    with open(profile_path(profile_id), 'w') as f:
+        f.write(sampler.folded())
+    stored = sorted((entry for entry in os.scandir(PROFILING_DIR) if entry.name.endswith('.folded')),
+                    key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in stored[PROFILING_KEEP:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return profile_id
+
+
+def profiled(view):
+    """
+    Profile the requests to a Flask view that carry X-Profile: <PROFILING_TOKEN>.
+    Returns the view itself when profiling is off.
+    """
+    if not PROFILING_TOKEN:
+        return view
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not authorized(request):
+            return view(*args, **kwargs)
+        if not _slots.acquire(blocking=False):
+            response = make_response(view(*args, **kwargs))
+            response.headers['X-Profile-Status'] = 'busy'
+            return response
+        try:
+            sampler = _local.sampler = Sampler().start()
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                _local.sampler = None
+                sampler.stop()
+            try:
+                response.headers['X-Profile-Id'] = save(sampler, request.endpoint or 'request')
+                response.headers['X-Profile-Samples'] = str(sum(sampler.stacks.values()))
+                response.headers['X-Profile-Status'] = 'ok'
+            except OSError:
+                response.headers['X-Profile-Status'] = 'error'
+            return response
+        finally:
+            _slots.release()
+
+    return wrapper
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a Python script under the sampling profiler')
+    parser.add_argument('--output', required=True, help='Folded stacks file to write')
+    parser.add_argument('--interval-ms', type=float, default=PROFILING_INTERVAL_MS, help='Sampling interval')
+    parser.add_argument('script', help='Script to run')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Script arguments')
+    args = parser.parse_args()
+
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    sampler = Sampler(interval=args.interval_ms).start()
+    try:
+        runpy.run_path(args.script, run_name='__main__')
+    finally:
+        sampler.stop()
+        with open(args.output, 'w') as f:
+            f.write(sampler.folded())
+
+
+if __name__ == '__main__':
+    main()